@@ -1,8 +1,13 @@
 # Import the scan part.
 from .scan import *
+from .async_scan import async_scan, async_scanner
 from .scan_parameters import *
 from .scan_actions import *
 from .scanner import *
+from .estimator import *
+from .scheduler import *
+from .replay import record_scan, replay_scan, read_recording
+from .metrics import ProgressReporter, ScanMetrics, SCAN_METRICS
 
 # Import DALs
 from .dal.epics_dal import *
@@ -16,3 +21,11 @@ from .positioner.area import *
 from .positioner.compound import *
 from .positioner.time import *
 from .positioner.static import *
+from .positioner.adaptive import *
+from .positioner.search import *
+
+# Import data processors.
+from .processor.columnar import *
+from .processor.memory_map import *
+from .processor.shaped import *
+from .processor.statistics import *
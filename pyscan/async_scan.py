@@ -0,0 +1,244 @@
+import asyncio
+from collections import OrderedDict
+from time import time
+
+from pyscan import config
+from pyscan.dal import epics_dal, bsread_dal, function_dal
+from pyscan.scan import _merge_readables_values
+from pyscan.scanner import AsyncScanner
+from pyscan.scan_parameters import EPICS_PV, EPICS_CONDITION, BS_PROPERTY, BS_CONDITION, scan_settings, convert_input, \
+    FUNCTION_VALUE, FUNCTION_CONDITION, convert_conditions, CUSTOM_SOURCE_TYPES
+from pyscan.utils import convert_to_list, SimpleDataProcessor, AsyncActionExecutor, compare_channel_value
+
+# Instances to use.
+EPICS_WRITER = epics_dal.AsyncWriteGroupInterface
+EPICS_READER = epics_dal.AsyncReadGroupInterface
+EPICS_MONITOR = epics_dal.AsyncMonitorGroupInterface
+BS_READER = bsread_dal.AsyncReadGroupInterface
+FUNCTION_PROXY = function_dal.AsyncFunctionProxy
+DATA_PROCESSOR = SimpleDataProcessor
+ACTION_EXECUTOR = AsyncActionExecutor
+
+
+async def async_scan(positioner, readables, writables=None, conditions=None, before_read=None, after_read=None,
+                     initialization=None, finalization=None, settings=None, data_processor=None, before_move=None,
+                     after_move=None):
+    """
+    Perform a scan in the asyncio event loop. Same parameters as scan().
+    Function readables, writables, conditions and actions can be plain functions or coroutine functions.
+    Cancelling the task running the scan aborts the scan.
+    :return: Data of the scan.
+    """
+    scanner_instance = async_scanner(positioner, readables, writables, conditions, before_read, after_read,
+                                     initialization, finalization, settings, data_processor, before_move, after_move)
+
+    return await scanner_instance.discrete_scan()
+
+
+def async_scanner(positioner, readables, writables=None, conditions=None, before_read=None, after_read=None,
+                  initialization=None, finalization=None, settings=None, data_processor=None,
+                  before_move=None, after_move=None):
+    # Allow a list or a single value to be passed. Initialize None values.
+    writables = convert_input(convert_to_list(writables) or [])
+    readables = convert_input(convert_to_list(readables) or [])
+    conditions = convert_conditions(convert_to_list(conditions) or [])
+    before_read = convert_to_list(before_read) or []
+    after_read = convert_to_list(after_read) or []
+    before_move = convert_to_list(before_move) or []
+    after_move = convert_to_list(after_move) or []
+    initialization = convert_to_list(initialization) or []
+    finalization = convert_to_list(finalization) or []
+    settings = settings or scan_settings()
+
+    if settings.settling_band is not None:
+        raise ValueError("Adaptive settling is not supported by the async scan. Use a fixed settling_time.")
+
+    # The groups of custom sources are synchronous, they would block the event loop.
+    custom_sources = [x.identifier for x in writables + readables + conditions if type(x) in CUSTOM_SOURCE_TYPES]
+    if custom_sources:
+        raise ValueError("Custom sources are not supported by the async scan, but %s were provided." % custom_sources)
+
+    bs_readables = [x for x in readables if isinstance(x, BS_PROPERTY)]
+    bs_conditions = [x for x in conditions if isinstance(x, BS_CONDITION)]
+    bs_reader = None
+    if bs_readables or bs_conditions:
+        bs_reader = BS_READER(properties=bs_readables, conditions=bs_conditions,
+                              filter_function=settings.bs_read_filter)
+
+    epics_writables = [x for x in writables if isinstance(x, EPICS_PV)]
+    epics_writer = None
+    if epics_writables:
+        epics_writer = EPICS_WRITER(pv_names=[pv.pv_name for pv in epics_writables],
+                                    readback_pv_names=[pv.readback_pv_name for pv in epics_writables],
+                                    tolerances=[pv.tolerance for pv in epics_writables],
+                                    timeout=settings.write_timeout)
+
+    epics_readables_pv_names = [x.pv_name for x in readables if isinstance(x, EPICS_PV)]
+    epics_pv_reader = EPICS_READER(pv_names=epics_readables_pv_names) if epics_readables_pv_names else None
+
+    # Conditions we need to wait for are monitored.
+    epics_conditions = [x for x in conditions if isinstance(x, EPICS_CONDITION)]
+    epics_conditions_pv_names = [x.pv_name for x in epics_conditions]
+    epics_condition_reader = None
+    if any(x.action != "Abort" for x in epics_conditions):
+        epics_condition_reader = EPICS_MONITOR(pv_names=epics_conditions_pv_names)
+    elif epics_conditions_pv_names:
+        epics_condition_reader = EPICS_READER(pv_names=epics_conditions_pv_names)
+
+    function_writer = FUNCTION_PROXY([x for x in writables if isinstance(x, FUNCTION_VALUE)])
+    function_reader = FUNCTION_PROXY([x for x in readables if isinstance(x, FUNCTION_VALUE)])
+    function_condition = FUNCTION_PROXY([x for x in conditions if isinstance(x, FUNCTION_CONDITION)])
+
+    writables_order = [type(writable) for writable in writables]
+
+    # The epics and function writables are moved at the same time.
+    async def write_data(positions):
+        positions = convert_to_list(positions)
+        pv_values = [x for x, source in zip(positions, writables_order) if source == EPICS_PV]
+        function_values = [x for x, source in zip(positions, writables_order) if source == FUNCTION_VALUE]
+
+        writes = [function_writer.write(function_values)]
+        if epics_writer:
+            writes.append(epics_writer.set_and_match(pv_values))
+
+        await asyncio.gather(*writes)
+
+    readables_order = [type(readable) for readable in readables]
+
+    async def read_sources(sources_readers):
+        values = await asyncio.gather(*[reader.read() for reader in sources_readers.values()])
+        return dict(zip(sources_readers.keys(), values))
+
+    # All the sources are read at the same time.
+    async def read_data():
+        sources_readers = OrderedDict(((BS_PROPERTY, bs_reader), (EPICS_PV, epics_pv_reader),
+                                       (FUNCTION_VALUE, function_reader)))
+        sources_readers = OrderedDict((source, reader) for source, reader in sources_readers.items() if reader)
+
+        return _merge_readables_values(readables_order, await read_sources(sources_readers))
+
+    conditions_order = [type(condition) for condition in conditions]
+    condition_failures = OrderedDict((condition.identifier, 0) for condition in conditions)
+    # Indexes of the conditions, with a wait action, that were not met in the last validation.
+    conditions_to_wait_for = []
+    epics_conditions_indexes = [index for index, source in enumerate(conditions_order) if source == EPICS_CONDITION]
+    function_conditions_indexes = [index for index, source in enumerate(conditions_order)
+                                   if source == FUNCTION_CONDITION]
+
+    # Validate the conditions of the provided sources. The epics and function conditions are read at the same time.
+    async def validate_conditions(sources):
+        sources_readers = OrderedDict(((EPICS_CONDITION, epics_condition_reader),
+                                       (FUNCTION_CONDITION, function_condition)))
+        sources_readers = OrderedDict((source, reader) for source, reader in sources_readers.items()
+                                      if reader and source in sources)
+        source_values = await read_sources(sources_readers)
+
+        bs_values = iter(bs_reader.read_cached_conditions() if bs_reader and BS_CONDITION in sources else [])
+        epics_values = iter(source_values.get(EPICS_CONDITION, []))
+        function_values = iter(source_values.get(FUNCTION_CONDITION, []))
+
+        del conditions_to_wait_for[:]
+
+        for index, (condition, source) in enumerate(zip(conditions, conditions_order)):
+            # Conditions of this source are verified at another time.
+            if source not in sources:
+                continue
+
+            if source == BS_CONDITION:
+                value = next(bs_values)
+            elif source == EPICS_CONDITION:
+                value = next(epics_values)
+            elif source == FUNCTION_CONDITION:
+                value = next(function_values)
+            else:
+                raise ValueError("Unknown type of condition %s used." % source)
+
+            if source == FUNCTION_CONDITION:
+                if value:
+                    continue
+                error_message = "Function condition %s returned False." % condition.identifier
+            else:
+                if compare_channel_value(value, condition.value, condition.tolerance):
+                    continue
+                error_message = "Condition %s, expected value %s, actual value %s, tolerance %s." % \
+                                (condition.identifier, condition.value, value, condition.tolerance)
+
+            condition_failures[condition.identifier] += 1
+
+            if condition.action == "Abort":
+                raise ValueError(error_message)
+
+            conditions_to_wait_for.append(index)
+
+        return not conditions_to_wait_for
+
+    # Wait until the conditions that were not met are met again. BS conditions cannot be waited for.
+    async def wait_for_conditions(current_position):
+        if all(conditions_order[index] == BS_CONDITION for index in conditions_to_wait_for):
+            return False
+
+        timeout_timestamp = time() + settings.condition_wait_timeout
+
+        # Epics conditions are monitored - we are notified as soon as their values change.
+        epics_conditions = [(epics_conditions_indexes.index(index), conditions[index])
+                            for index in conditions_to_wait_for if conditions_order[index] == EPICS_CONDITION]
+        if epics_conditions:
+            def epics_conditions_met(values):
+                return all(compare_channel_value(values[value_index], condition.value, condition.tolerance)
+                           for value_index, condition in epics_conditions)
+
+            conditions_met = await epics_condition_reader.wait_for(epics_conditions_met, timeout_timestamp - time())
+        else:
+            conditions_met = True
+
+        # Function conditions can only be polled.
+        waited_function_conditions = [function_conditions_indexes.index(index) for index in conditions_to_wait_for
+                                      if conditions_order[index] == FUNCTION_CONDITION]
+        while conditions_met and waited_function_conditions:
+            values = await function_condition.read()
+            if all(values[value_index] for value_index in waited_function_conditions):
+                break
+
+            if time() > timeout_timestamp:
+                conditions_met = False
+                break
+            await asyncio.sleep(config.scan_condition_wait_poll_interval)
+
+        # The scan continues only for conditions with the 'Wait' action.
+        if not conditions_met:
+            abort_conditions = [conditions[index].identifier for index in conditions_to_wait_for
+                                if conditions[index].action == "WaitAndAbort"]
+            if abort_conditions:
+                raise ValueError("Conditions %s were not met within %s seconds." %
+                                 (abort_conditions, settings.condition_wait_timeout))
+
+        return True
+
+    # BS conditions belong to the same message as the data, they can be verified only after the read.
+    if settings.conditions_first:
+        before_read_conditions = (EPICS_CONDITION, FUNCTION_CONDITION)
+        after_read_conditions = (BS_CONDITION,)
+    else:
+        before_read_conditions = ()
+        after_read_conditions = (BS_CONDITION, EPICS_CONDITION, FUNCTION_CONDITION)
+
+    async def validate_data(current_position, data):
+        return await validate_conditions(after_read_conditions)
+
+    async def validate_before_read(current_position):
+        return await validate_conditions(before_read_conditions)
+
+    if not data_processor:
+        data_processor = DATA_PROCESSOR()
+
+    def get_executor(actions):
+        return ACTION_EXECUTOR(actions).execute if actions else None
+
+    return AsyncScanner(positioner=positioner, data_processor=data_processor, reader=read_data, writer=write_data,
+                        before_measurement_executor=get_executor(before_read),
+                        after_measurement_executor=get_executor(after_read),
+                        initialization_executor=get_executor(initialization),
+                        finalization_executor=get_executor(finalization), data_validator=validate_data,
+                        settings=settings, before_move_executor=get_executor(before_move),
+                        after_move_executor=get_executor(after_move), conditions_validator=validate_before_read,
+                        condition_failures=condition_failures, conditions_waiter=wait_for_conditions)
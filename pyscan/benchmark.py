@@ -0,0 +1,282 @@
+"""
+Benchmark the pyscan overhead, with simulated in-process epics, bsread and function sources.
+
+Run the benchmark and store the results:
+    python -m pyscan.benchmark --output results.json
+Compare the results to a previous run:
+    python -m pyscan.benchmark --compare results.json
+"""
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from time import perf_counter
+
+import numpy as np
+
+from pyscan.positioner.area import AreaPositioner
+from pyscan.positioner.static import StaticPositioner
+from pyscan.scan import iter_scan
+from pyscan.scan_parameters import scan_settings, epics_pv, bs_property, function_value
+from pyscan.utils import convert_to_list
+
+# The scan function shadows the scan module in the pyscan package.
+scan_module = sys.modules["pyscan.scan"]
+
+BENCHMARK_SCENARIO = namedtuple("BENCHMARK_SCENARIO", ["name", "create_positioner", "readables", "writables",
+                                                       "n_measurements"])
+
+# Latency percentiles to report for each phase.
+latency_percentiles = [50, 90, 99]
+# Relative drop of points/s, compared to the baseline, reported as a regression.
+default_regression_tolerance = 0.2
+
+
+class _SimulatedEpicsGroup(object):
+    """
+    In-process replacement for the epics read and write groups.
+    """
+
+    def __init__(self, pv_names, readback_pv_names=None, tolerances=None, timeout=None):
+        self.pv_names = convert_to_list(pv_names)
+        self.values = [0.0] * len(self.pv_names)
+
+    def read(self):
+        return list(self.values)
+
+    def set_and_match(self, values, tolerances=None, timeout=None):
+        self.values = list(convert_to_list(values))
+
+    def wait_for(self, predicate, timeout):
+        return predicate(self.read())
+
+    def close(self):
+        pass
+
+
+class _SimulatedBsGroup(object):
+    """
+    In-process replacement for the bsread read group.
+    """
+
+    def __init__(self, properties, conditions=None, filter_function=None, stream_pool=None):
+        self.properties = convert_to_list(properties)
+        self.conditions = convert_to_list(conditions) or []
+        self.pulse_id = 0
+
+    def read(self):
+        self.pulse_id += 1
+        return [float(self.pulse_id)] * len(self.properties)
+
+    def read_cached_conditions(self):
+        return [condition.value for condition in self.conditions]
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def simulated_dals():
+    """
+    Replace the epics and bsread DALs of the scan with in-process simulations.
+    """
+    original_dals = (scan_module.EPICS_WRITER, scan_module.EPICS_READER, scan_module.EPICS_MONITOR,
+                     scan_module.BS_READER)
+
+    scan_module.EPICS_WRITER = _SimulatedEpicsGroup
+    scan_module.EPICS_READER = _SimulatedEpicsGroup
+    scan_module.EPICS_MONITOR = _SimulatedEpicsGroup
+    scan_module.BS_READER = _SimulatedBsGroup
+
+    try:
+        yield
+    finally:
+        scan_module.EPICS_WRITER, scan_module.EPICS_READER, scan_module.EPICS_MONITOR, scan_module.BS_READER = \
+            original_dals
+
+
+def _read_function_value():
+    return 1.0
+
+
+def _create_image_reader(shape):
+    image = np.zeros(shape, dtype=np.uint16)
+
+    def read_image():
+        return image.copy()
+
+    return read_image
+
+
+def get_scenarios(quick=False):
+    """
+    Scenarios to benchmark.
+    :param quick: Reduced number of points and sizes, for a quick check.
+    :return: List of BENCHMARK_SCENARIO.
+    """
+    n_points = 100 if quick else 1000
+    n_readables = [1, 10, 100] if quick else [1, 10, 100, 1000]
+    n_measurements = [1, 10, 100] if quick else [1, 10, 100, 1000]
+    image_shape = (256, 256) if quick else (1024, 1024)
+
+    scenarios = []
+
+    for n in n_readables:
+        scenarios.append(BENCHMARK_SCENARIO("function_readables_%d" % n, lambda: StaticPositioner(n_points),
+                                            [function_value(_read_function_value, "F%d" % i) for i in range(n)],
+                                            None, 1))
+        scenarios.append(BENCHMARK_SCENARIO("epics_readables_%d" % n, lambda: StaticPositioner(n_points),
+                                            [epics_pv("PYSCAN:BENCHMARK:PV%d" % i) for i in range(n)], None, 1))
+        scenarios.append(BENCHMARK_SCENARIO("bs_readables_%d" % n, lambda: StaticPositioner(n_points),
+                                            [bs_property("PYSCAN:BENCHMARK:BS%d" % i) for i in range(n)], None, 1))
+
+    for n_dimensions in range(1, 5):
+        # About n_points positions in total.
+        n_steps = max(int(round(n_points ** (1.0 / n_dimensions))) - 1, 1)
+
+        def create_area_positioner(n_dimensions=n_dimensions, n_steps=n_steps):
+            return AreaPositioner(start=[0.0] * n_dimensions, end=[1.0] * n_dimensions,
+                                  n_steps=[n_steps] * n_dimensions)
+
+        scenarios.append(BENCHMARK_SCENARIO("dimensions_%d" % n_dimensions, create_area_positioner,
+                                            [epics_pv("PYSCAN:BENCHMARK:PV0")],
+                                            [epics_pv("PYSCAN:BENCHMARK:MOTOR%d" % i) for i in range(n_dimensions)],
+                                            1))
+
+    for n in n_measurements:
+        # Keep the number of measurements in the scan constant.
+        scenarios.append(BENCHMARK_SCENARIO("n_measurements_%d" % n,
+                                            lambda n=n: StaticPositioner(max(n_points // n, 1)),
+                                            [function_value(_read_function_value, "F0")], None, n))
+
+    scenarios.append(BENCHMARK_SCENARIO("image_readables", lambda: StaticPositioner(max(n_points // 10, 1)),
+                                        [function_value(_create_image_reader(image_shape), "IMAGE")], None, 1))
+
+    return scenarios
+
+
+def _get_percentiles(values):
+    return OrderedDict(("p%d" % percentile, float(np.percentile(values, percentile)) if values else 0.0)
+                       for percentile in latency_percentiles)
+
+
+def run_scenario(scenario):
+    """
+    Run the scenario with simulated DALs.
+    :return: Dictionary with the points per second, the latency percentiles of each phase and the peak memory.
+    """
+    settings = scan_settings(n_measurements=scenario.n_measurements,
+                             progress_callback=lambda current_position, total_positions: None)
+
+    def run_scan():
+        return list(iter_scan(scenario.create_positioner(), scenario.readables, scenario.writables,
+                              settings=settings))
+
+    with simulated_dals():
+        start_time = perf_counter()
+        records = run_scan()
+        scan_time = perf_counter() - start_time
+
+        # Tracing the memory allocations slows down the scan, so the memory is measured in a separate run.
+        tracemalloc.start()
+        try:
+            run_scan()
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return OrderedDict((("n_points", len(records)),
+                        ("n_measurements", scenario.n_measurements),
+                        ("scan_time", scan_time),
+                        ("points_per_second", len(records) / scan_time if scan_time else 0.0),
+                        ("latency", OrderedDict((
+                            ("move", _get_percentiles([record.timing.move_time for record in records])),
+                            ("settle", _get_percentiles([record.timing.settle_time for record in records])),
+                            ("read", _get_percentiles([record.timing.read_time for record in records]))))),
+                        ("peak_memory", peak_memory)))
+
+
+def run_benchmark(quick=False, scenario_filter=None):
+    """
+    Run all the benchmark scenarios.
+    :param quick: Reduced number of points and sizes, for a quick check.
+    :param scenario_filter: Run only the scenarios with this string in the name.
+    :return: Dictionary with the environment and the results of each scenario.
+    """
+    results = OrderedDict()
+    for scenario in get_scenarios(quick):
+        if scenario_filter and scenario_filter not in scenario.name:
+            continue
+        results[scenario.name] = run_scenario(scenario)
+
+    return OrderedDict((("python", platform.python_version()),
+                        ("platform", platform.platform()),
+                        ("quick", quick),
+                        ("scenarios", results)))
+
+
+def compare_results(baseline, results, tolerance=None):
+    """
+    Compare the points per second of the results to the baseline.
+    :param baseline: Results of a previous benchmark run.
+    :param results: Results of the current benchmark run.
+    :param tolerance: Relative drop of points per second reported as a regression.
+    :return: List of regression descriptions. Empty if there are no regressions.
+    """
+    if tolerance is None:
+        tolerance = default_regression_tolerance
+
+    regressions = []
+    for name, result in results["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+
+        baseline_rate = baseline["scenarios"][name]["points_per_second"]
+        current_rate = result["points_per_second"]
+
+        if current_rate < baseline_rate * (1 - tolerance):
+            regressions.append("Scenario %s: %.1f points/s, baseline %.1f points/s (%.1f %% slower)." %
+                               (name, current_rate, baseline_rate, 100.0 * (1 - current_rate / baseline_rate)))
+
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pyscan overhead with simulated sources.")
+    parser.add_argument("--output", help="File to store the results in, as JSON.")
+    parser.add_argument("--compare", help="Results of a previous run (JSON) to compare to.")
+    parser.add_argument("--tolerance", type=float, default=default_regression_tolerance,
+                        help="Relative drop of points/s reported as a regression.")
+    parser.add_argument("--filter", help="Run only the scenarios with this string in the name.")
+    parser.add_argument("--quick", action="store_true", help="Reduced number of points and sizes.")
+    arguments = parser.parse_args(arguments)
+
+    results = run_benchmark(arguments.quick, arguments.filter)
+
+    for name, result in results["scenarios"].items():
+        print("%-24s %10.1f points/s  read p50 %8.1f us  p99 %8.1f us  peak memory %8.1f kB" %
+              (name, result["points_per_second"], result["latency"]["read"]["p50"] * 1e6,
+               result["latency"]["read"]["p99"] * 1e6, result["peak_memory"] / 1024.0))
+
+    if arguments.output:
+        with open(arguments.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as baseline_file:
+            regressions = compare_results(json.load(baseline_file), results, arguments.tolerance)
+
+        for regression in regressions:
+            print(regression)
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,8 @@
 max_float_tolerance = 0.00001
 # 1ms time tolerance for time critical measurements.
 max_time_tolerance = 0.05
+# Time positioner spins (instead of sleeping) for the last part of the wait before each tick, for better accuracy.
+time_positioner_spin_time = 0.002
 
 ######################
 # Scan configuration #
@@ -21,6 +23,23 @@ scan_pause_sleep_interval = 0.1
 scan_acquisition_retry_limit = 3
 # Delay between acquisition retries.
 scan_acquisition_retry_delay = 1
+# Factor by which the delay between acquisition retries grows after each retry.
+scan_acquisition_retry_backoff = 1
+# Maximum time to wait for conditions with the 'Wait' or 'WaitAndAbort' action to be met again.
+scan_default_condition_wait_timeout = 10
+# Interval to poll function conditions while waiting for them to be met again.
+scan_condition_wait_poll_interval = 0.1
+# Minimum time between the reports of the default progress callback.
+scan_progress_report_interval = 1
+
+#########################
+# Metrics configuration #
+#########################
+
+# Upper bounds, in seconds, of the buckets of the move, settle and read latency histograms.
+metrics_latency_buckets = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10]
+# Minimum time between the writes of the metrics file.
+metrics_export_interval = 1
 
 ############################
 # BSREAD DAL configuration #
@@ -50,3 +69,20 @@ bs_default_missing_property_value = Exception
 epics_default_set_and_match_timeout = 3
 # After all motors have reached their destination (set_and_match), extra time to wait.
 epics_default_settling_time = 0
+# With adaptive settling, how long the monitored values have to stay within the settling band.
+epics_default_settling_window = 0.1
+# With adaptive settling, maximum time to wait for the monitored values to settle.
+epics_default_max_settling_time = 10
+# Connect the epics PVs to the simulation in pyscan.dal.sim_dal instead of channel access.
+epics_simulation = False
+
+#############################
+# HDF5 writer configuration #
+#############################
+
+# Number of points in each chunk of the HDF5 datasets.
+hdf5_default_chunk_size = 100
+# Interval, in seconds, at which the written data is flushed to disk.
+hdf5_default_flush_interval = 1
+# Maximum number of points waiting to be written to disk. When the queue is full, the scan waits for the writer.
+hdf5_queue_size = 100
@@ -1,8 +1,8 @@
+import asyncio
 import math
+from threading import Lock
 from time import time
 
-from bsread import Source, mflow
-
 from pyscan import config
 from pyscan.utils import convert_to_list
 
@@ -12,18 +12,20 @@ class ReadGroupInterface(object):
     Provide a beam synchronous acquisition for PV data.
     """
 
-    def __init__(self, properties, conditions=None, host=None, port=None, filter_function=None):
+    def __init__(self, properties, conditions=None, host=None, port=None, filter_function=None, stream_pool=None):
         """
         Create the bsread group read interface.
         :param properties: List of PVs to read for processing.
         :param conditions: List of PVs to read as conditions.
         :param filter_function: Filter the BS stream with a custom function.
+        :param stream_pool: StreamPool to share the stream with other read groups. None: use a dedicated stream.
         """
         self.host = host
         self.port = port
         self.properties = convert_to_list(properties)
         self.conditions = convert_to_list(conditions)
         self.filter = filter_function
+        self.stream_pool = stream_pool
 
         self._message_cache = None
         self._message_cache_timestamp = None
@@ -31,25 +33,37 @@ class ReadGroupInterface(object):
         self._connect_bsread(config.bs_default_host, config.bs_default_port)
 
     def _connect_bsread(self, host, port):
+        # Imported on first use, so scans without bs properties do not need bsread (and zmq).
+        from bsread import Source, mflow
+
         # Configure the connection type.
         if config.bs_connection_mode.lower() == "sub":
             mode = mflow.SUB
         elif config.bs_connection_mode.lower() == "pull":
             mode = mflow.PULL
 
-        if host and port:
-            self.stream = Source(host=host,
-                                 port=port,
-                                 queue_size=config.bs_queue_size,
-                                 receive_timeout=config.bs_receive_timeout,
-                                 mode=mode)
+        channels = [x.identifier for x in self.properties] + [x.identifier for x in self.conditions]
+
+        def create_stream():
+            if host and port:
+                return Source(host=host,
+                              port=port,
+                              queue_size=config.bs_queue_size,
+                              receive_timeout=config.bs_receive_timeout,
+                              mode=mode)
+            else:
+                return Source(channels=channels,
+                              queue_size=config.bs_queue_size,
+                              receive_timeout=config.bs_receive_timeout,
+                              mode=mode)
+
+        if self.stream_pool is not None:
+            # Streams with the same connection parameters are shared.
+            stream_key = (host, port, mode) if host and port else (tuple(sorted(set(channels))), mode)
+            self.stream = self.stream_pool.get_stream(stream_key, create_stream)
         else:
-            channels = [x.identifier for x in self.properties] + [x.identifier for x in self.conditions]
-            self.stream = Source(channels=channels,
-                                 queue_size=config.bs_queue_size,
-                                 receive_timeout=config.bs_receive_timeout,
-                                 mode=mode)
-        self.stream.connect()
+            self.stream = create_stream()
+            self.stream.connect()
 
     @staticmethod
     def is_message_after_timestamp(message, timestamp):
@@ -142,6 +156,89 @@ class ReadGroupInterface(object):
         """
         if self.stream:
             self.stream.disconnect()
+            # Shared streams count their users: disconnect only once.
+            self.stream = None
 
         self._message_cache = None
         self._message_cache_timestamp = None
+
+
+class StreamPool(object):
+    """
+    Share bs streams between read groups with the same connection parameters.
+    Each read receives the first message after the read timestamp, so the read groups can take turns on the stream.
+    """
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = Lock()
+
+    def get_stream(self, stream_key, create_stream):
+        """
+        Get the shared stream for the connection parameters. The stream is created and connected on the first request.
+        :param stream_key: Connection parameters of the stream.
+        :param create_stream: Function to create the stream, if it does not exist yet.
+        :return: SharedStream, to be disconnected when not needed anymore.
+        """
+        with self._lock:
+            if stream_key not in self._streams:
+                stream = create_stream()
+                stream.connect()
+                self._streams[stream_key] = SharedStream(self, stream_key, stream)
+
+            shared_stream = self._streams[stream_key]
+            shared_stream.n_users += 1
+
+            return shared_stream
+
+    def release_stream(self, shared_stream):
+        """
+        Disconnect the stream once it is not used by any read group anymore.
+        """
+        with self._lock:
+            shared_stream.n_users -= 1
+
+            if shared_stream.n_users == 0:
+                del self._streams[shared_stream.stream_key]
+                shared_stream.stream.disconnect()
+
+    def get_n_streams(self):
+        return len(self._streams)
+
+
+class SharedStream(object):
+    """
+    Stream shared between read groups. Only one read group at the time can receive from the stream.
+    """
+
+    def __init__(self, stream_pool, stream_key, stream):
+        self.stream_pool = stream_pool
+        self.stream_key = stream_key
+        self.stream = stream
+        self.n_users = 0
+        self._receive_lock = Lock()
+
+    def connect(self):
+        # The stream is connected by the pool.
+        pass
+
+    def receive(self, filter=None):
+        with self._receive_lock:
+            return self.stream.receive(filter=filter)
+
+    def disconnect(self):
+        self.stream_pool.release_stream(self)
+
+
+class AsyncReadGroupInterface(ReadGroupInterface):
+    """
+    Beam synchronous acquisition from an asyncio event loop. The stream is received in the default executor, so the
+    event loop is not blocked while waiting for the message.
+    """
+
+    async def read(self):
+        """
+        Reads the PV values from BSread. It uses the first PVs data sampled after the invocation of this method.
+        :return: List of values for read pvs. Note: Condition PVs are excluded.
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, super(AsyncReadGroupInterface, self).read)
@@ -1,5 +1,7 @@
+import asyncio
 import time
 from itertools import count
+from threading import Condition
 
 from pyscan import config
 from pyscan.utils import convert_to_list, validate_lists_length, connect_to_pv, compare_channel_value
@@ -104,6 +106,28 @@ class WriteGroupInterface(object):
         :param timeout: Timeout, single value, to wait until the value is reached.
         :raise ValueError if any position cannot be reached.
         """
+        values, tolerances, timeout = self._prepare_set_and_match(values, tolerances, timeout)
+
+        # Write all the PV values.
+        for pv, value in zip(self.pvs, values):
+            pv.put(value)
+
+        # Boolean array to represent which PVs have reached their target value.s
+        within_tolerance = [False] * len(self.pvs)
+        initial_timestamp = time.time()
+
+        # Read values until all PVs have reached the desired value or time has run out.
+        while (not all(within_tolerance)) and (time.time() - initial_timestamp < timeout):
+            self._update_within_tolerance(values, tolerances, within_tolerance)
+            time.sleep(self.default_get_sleep)
+
+        self._verify_within_tolerance(values, tolerances, within_tolerance)
+
+    def _prepare_set_and_match(self, values, tolerances, timeout):
+        """
+        Validate the set_and_match parameters and substitute the defaults.
+        :return: Values, tolerances and timeout to use.
+        """
         values = convert_to_list(values)
         if not tolerances:
             tolerances = self.tolerances
@@ -120,29 +144,26 @@ class WriteGroupInterface(object):
         if not isinstance(timeout, (int, float)):
             raise ValueError("Timeout must be int or float, but %s was provided." % timeout)
 
-        # Write all the PV values.
-        for pv, value in zip(self.pvs, values):
-            pv.put(value)
+        return values, tolerances, timeout
 
-        # Boolean array to represent which PVs have reached their target value.s
-        within_tolerance = [False] * len(self.pvs)
-        initial_timestamp = time.time()
-
-        # Read values until all PVs have reached the desired value or time has run out.
-        while (not all(within_tolerance)) and (time.time() - initial_timestamp < timeout):
-            # Get only the PVs that have not yet reached the final position.
-            for index, pv, tolerance in ((index, pv, tolerance) for index, pv, tolerance, values_reached
-                                         in zip(count(), self.readback_pvs, tolerances, within_tolerance)
-                                         if not values_reached):
-
-                current_value = pv.get()
-                expected_value = values[index]
+    def _update_within_tolerance(self, values, tolerances, within_tolerance):
+        """
+        Check the readbacks of the PVs that have not yet reached the final position.
+        """
+        for index, pv, tolerance in ((index, pv, tolerance) for index, pv, tolerance, values_reached
+                                     in zip(count(), self.readback_pvs, tolerances, within_tolerance)
+                                     if not values_reached):
 
-                if compare_channel_value(current_value, expected_value, tolerance):
-                    within_tolerance[index] = True
+            current_value = pv.get()
+            expected_value = values[index]
 
-            time.sleep(self.default_get_sleep)
+            if compare_channel_value(current_value, expected_value, tolerance):
+                within_tolerance[index] = True
 
+    def _verify_within_tolerance(self, values, tolerances, within_tolerance):
+        """
+        :raise ValueError if any PV did not reach the value.
+        """
         if not all(within_tolerance):
             error_message = ""
             # Get the indexes that did not reach the supposed values.
@@ -204,3 +225,163 @@ class ReadGroupInterface(object):
             pv.disconnect()
 
 
+class MonitorGroupInterface(ReadGroupInterface):
+    """
+    Manage a group of read PVs, with notifications on value changes.
+    """
+
+    def __init__(self, pv_names):
+        """
+        Initialize the group.
+        :param pv_names: PV names (or name, list or single string) to connect to.
+        """
+        self._value_changed = Condition()
+        super(MonitorGroupInterface, self).__init__(pv_names)
+
+        for pv in self.pvs:
+            pv.add_callback(self._notify_value_changed)
+
+    def _read_values(self):
+        """
+        Read the PVs in the waits. Always synchronous, also in the async subclass, since the waits run in a thread.
+        :return: Result
+        """
+        return super(MonitorGroupInterface, self).read()
+
+    def _notify_value_changed(self, **kwargs):
+        with self._value_changed:
+            self._value_changed.notify_all()
+
+    def wait_for(self, predicate, timeout):
+        """
+        Wait until the PV values satisfy the predicate. The values are checked at every value change.
+        :param predicate: Function to check the values. Signature: def predicate(values)
+        :param timeout: Maximum time to wait, in seconds.
+        :return: True if the predicate was satisfied, False if the timeout was reached.
+        """
+        end_timestamp = time.time() + timeout
+
+        with self._value_changed:
+            while not predicate(self._read_values()):
+                time_left = end_timestamp - time.time()
+                if time_left <= 0:
+                    return False
+
+                self._value_changed.wait(time_left)
+
+        return True
+
+    def wait_for_settling(self, tolerances, window, timeout):
+        """
+        Wait until the PV values stay within the tolerances for the whole settling window.
+        Every value change outside the tolerances restarts the window.
+        :param tolerances: Maximum deviation of each PV value during the settling window.
+        :param window: Time in seconds the values have to stay within the tolerances.
+        :param timeout: Maximum time to wait, in seconds.
+        :return: True if the values settled, False if the timeout was reached.
+        """
+        tolerances = convert_to_list(tolerances)
+        # Same tolerance for all PVs.
+        if len(tolerances) == 1:
+            tolerances = tolerances * len(self.pvs)
+
+        end_timestamp = time.time() + timeout
+
+        with self._value_changed:
+            reference_values = self._read_values()
+            window_end_timestamp = time.time() + window
+
+            while True:
+                current_timestamp = time.time()
+                if current_timestamp >= window_end_timestamp:
+                    return True
+
+                if current_timestamp >= end_timestamp:
+                    return False
+
+                self._value_changed.wait(min(window_end_timestamp, end_timestamp) - current_timestamp)
+
+                current_values = self._read_values()
+                if not all(compare_channel_value(current, reference, tolerance) for current, reference, tolerance
+                           in zip(current_values, reference_values, tolerances)):
+                    # The values moved outside the band - start a new window from the current values.
+                    reference_values = current_values
+                    window_end_timestamp = time.time() + window
+
+    @staticmethod
+    def connect(pv_name):
+        return connect_to_pv(pv_name, auto_monitor=True)
+
+
+class AsyncWriteGroupInterface(WriteGroupInterface):
+    """
+    Manage a group of Write PVs from an asyncio event loop. The readbacks are monitored, so they can be read without
+    blocking the event loop.
+    """
+
+    async def set_and_match(self, values, tolerances=None, timeout=None):
+        """
+        Set the value and wait for the PV to reach it, within tolerance, without blocking the event loop.
+        :param values: Values to set (Must match the number of PVs in this group)
+        :param tolerances: Tolerances for each PV (Must match the number of PVs in this group)
+        :param timeout: Timeout, single value, to wait until the value is reached.
+        :raise ValueError if any position cannot be reached.
+        """
+        values, tolerances, timeout = self._prepare_set_and_match(values, tolerances, timeout)
+
+        # Puts do not wait for the completion.
+        for pv, value in zip(self.pvs, values):
+            pv.put(value)
+
+        within_tolerance = [False] * len(self.pvs)
+        initial_timestamp = time.time()
+
+        while (not all(within_tolerance)) and (time.time() - initial_timestamp < timeout):
+            self._update_within_tolerance(values, tolerances, within_tolerance)
+            await asyncio.sleep(self.default_get_sleep)
+
+        self._verify_within_tolerance(values, tolerances, within_tolerance)
+
+    @staticmethod
+    def connect(pv_name):
+        return connect_to_pv(pv_name, auto_monitor=True)
+
+
+class AsyncReadGroupInterface(ReadGroupInterface):
+    """
+    Manage a group of read PVs from an asyncio event loop. The PVs are read in the default executor, so the event loop
+    is not blocked while waiting for the values.
+    """
+
+    async def read(self):
+        """
+        Read the current value of the PVs. The values are read from the IOC, and not from the monitor cache, since the
+        monitor update can still be on the way right after a move.
+        :return: Result
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, super(AsyncReadGroupInterface, self).read)
+
+
+class AsyncMonitorGroupInterface(MonitorGroupInterface):
+    """
+    Manage a group of read PVs, with notifications on value changes, from an asyncio event loop. The reads and the
+    waits run in the default executor, so the event loop is not blocked. A cancelled wait keeps its executor thread
+    until the values satisfy the predicate or the timeout is reached.
+    """
+
+    async def read(self):
+        """
+        Read the current value of the PVs.
+        :return: Result
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, super(AsyncMonitorGroupInterface, self).read)
+
+    async def wait_for(self, predicate, timeout):
+        """
+        Wait until the PV values satisfy the predicate. The values are checked at every value change.
+        :param predicate: Function to check the values. Signature: def predicate(values)
+        :param timeout: Maximum time to wait, in seconds.
+        :return: True if the predicate was satisfied, False if the timeout was reached.
+        """
+        return await asyncio.get_event_loop().run_in_executor(None, super(AsyncMonitorGroupInterface, self).wait_for,
+                                                              predicate, timeout)
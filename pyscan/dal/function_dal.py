@@ -1,4 +1,6 @@
-from pyscan.utils import convert_to_list
+import asyncio
+
+from pyscan.utils import convert_to_list, resolve_awaitable
 
 
 class FunctionProxy(object):
@@ -32,3 +34,24 @@ class FunctionProxy(object):
         values = convert_to_list(values)
         for func, value in zip(self.functions, values):
             func.call_function(value)
+
+
+class AsyncFunctionProxy(FunctionProxy):
+    """
+    Function DAL for the asyncio scanner. The functions can be plain functions or coroutine functions.
+    """
+    async def read(self):
+        """
+        Read the results from all the provided functions, concurrently.
+        :return: Read results.
+        """
+        return list(await asyncio.gather(*[resolve_awaitable(func.call_function()) for func in self.functions]))
+
+    async def write(self, values):
+        """
+        Write the values to the provided functions, concurrently.
+        :param values: Values to write.
+        """
+        values = convert_to_list(values)
+        await asyncio.gather(*[resolve_awaitable(func.call_function(value))
+                               for func, value in zip(self.functions, values)])
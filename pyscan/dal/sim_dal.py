@@ -0,0 +1,304 @@
+"""
+Simulated epics PVs, for testing and profiling scans without an IOC.
+
+Enable the simulation with config.epics_simulation = True - all the epics PVs are then connected to the simulation
+instead of channel access. Motors and detectors are added to the simulation by PV name; all other PVs behave as
+plain values that return what was last written to them.
+"""
+import math
+from threading import Lock, Timer
+from time import time, sleep
+
+import numpy as np
+
+from pyscan.estimator import get_move_time
+
+
+def get_trajectory_distance(distance, elapsed_time, velocity=None, acceleration=None):
+    """
+    Distance covered by a motor moving over the given distance, with a trapezoidal velocity profile.
+    :param distance: Total distance of the move (absolute value).
+    :param elapsed_time: Time since the start of the move, in seconds.
+    :param velocity: Maximum velocity of the motor. None means the move is instant.
+    :param acceleration: Acceleration of the motor. None means the motor reaches the velocity instantly.
+    :return: Distance covered at the elapsed time.
+    """
+    if not velocity or not distance:
+        return distance
+
+    if not acceleration:
+        return min(velocity * elapsed_time, distance)
+
+    acceleration_time = velocity / acceleration
+    acceleration_distance = velocity ** 2 / (2 * acceleration)
+
+    # The motor does not reach the maximum velocity - triangular profile.
+    if distance < 2 * acceleration_distance:
+        acceleration_time = math.sqrt(distance / acceleration)
+        acceleration_distance = distance / 2
+        velocity = acceleration * acceleration_time
+
+    move_time = 2 * acceleration_time + (distance - 2 * acceleration_distance) / velocity
+
+    if elapsed_time >= move_time:
+        return distance
+    elif elapsed_time < acceleration_time:
+        return acceleration * elapsed_time ** 2 / 2
+    elif elapsed_time < move_time - acceleration_time:
+        return acceleration_distance + velocity * (elapsed_time - acceleration_time)
+    else:
+        return distance - acceleration * (move_time - elapsed_time) ** 2 / 2
+
+
+class SimulatedMotor(object):
+    """
+    Motor moving to the written position with a trapezoidal velocity profile.
+    """
+
+    def __init__(self, pv_name, readback_pv_name=None, velocity=None, acceleration=None, noise=0, readback_lag=0,
+                 initial_position=0):
+        """
+        :param pv_name: Setpoint PV name.
+        :param readback_pv_name: Readback PV name. If None, the setpoint PV returns the readback.
+        :param velocity: Maximum velocity, in units per second. None means the moves are instant.
+        :param acceleration: Acceleration, in units per second squared. None means infinite acceleration.
+        :param noise: Standard deviation of the gaussian noise added to the readback.
+        :param readback_lag: Delay, in seconds, with which the readback follows the motor position.
+        :param initial_position: Position of the motor at the start of the simulation.
+        """
+        self.pv_name = pv_name
+        self.readback_pv_name = readback_pv_name or pv_name
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.noise = noise
+        self.readback_lag = readback_lag
+
+        self.setpoint = initial_position
+        # List of moves (start_time, start_position, target_position), needed to replay the lagging readback.
+        self._moves = [(float("-inf"), initial_position, initial_position)]
+        self._lock = Lock()
+
+    def get_position(self, timestamp=None):
+        """
+        Position of the motor, without noise.
+        :param timestamp: Time at which to get the position. Default: now.
+        """
+        timestamp = time() if timestamp is None else timestamp
+
+        with self._lock:
+            # The last move started before the timestamp.
+            start_time, start_position, target_position = \
+                [move for move in self._moves if move[0] <= timestamp][-1]
+
+        distance = get_trajectory_distance(abs(target_position - start_position), timestamp - start_time,
+                                           self.velocity, self.acceleration)
+
+        return start_position + math.copysign(distance, target_position - start_position)
+
+    def move(self, target_position):
+        """
+        Start the move to the target position.
+        :return: Time, in seconds, until the readback reaches the target position.
+        """
+        current_time = time()
+        start_position = self.get_position(current_time)
+
+        with self._lock:
+            # Moves that ended before the lagging readback are not needed anymore.
+            first_move_index = max(index for index, move in enumerate(self._moves)
+                                   if move[0] <= current_time - self.readback_lag)
+            self._moves = self._moves[first_move_index:] + [(current_time, start_position, target_position)]
+            self.setpoint = target_position
+
+        move_time = get_move_time(target_position - start_position, self.velocity, self.acceleration) \
+            if self.velocity else 0
+
+        return move_time + self.readback_lag
+
+    def get_readback(self, random_state):
+        """
+        Lagging position of the motor, with noise.
+        """
+        position = self.get_position(time() - self.readback_lag)
+
+        if self.noise:
+            position += random_state.normal(0, self.noise)
+
+        return position
+
+
+class SimulatedDetector(object):
+    """
+    Detector returning a value computed from the motor positions.
+    """
+
+    def __init__(self, pv_name, value_function=None, latency=0, noise=0):
+        """
+        :param pv_name: PV name of the detector.
+        :param value_function: Function computing the value from the motor readbacks.
+                               Signature: def value_function(positions), positions = {motor pv_name: position}.
+                               Default: always 0.
+        :param latency: Time, in seconds, each read takes.
+        :param noise: Standard deviation of the gaussian noise added to the value.
+        """
+        self.pv_name = pv_name
+        self.value_function = value_function
+        self.latency = latency
+        self.noise = noise
+
+    def get_value(self, positions, random_state):
+        if self.latency:
+            sleep(self.latency)
+
+        value = self.value_function(positions) if self.value_function else 0
+
+        if self.noise:
+            value += random_state.normal(0, self.noise)
+
+        return value
+
+
+class SimulatedPV(object):
+    """
+    Provide the subset of the pyepics PV interface used by the epics DAL.
+    """
+
+    def __init__(self, simulation, pv_name):
+        self.simulation = simulation
+        self.pvname = pv_name
+        self.callbacks = []
+
+    def get(self):
+        return self.simulation.get_value(self.pvname)
+
+    def put(self, value):
+        self.simulation.put_value(self.pvname, value)
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def notify_value_changed(self):
+        for callback in self.callbacks:
+            # The value is not passed, to not consume the noise of the simulation from the timer threads.
+            callback(pvname=self.pvname)
+
+    def disconnect(self):
+        self.simulation.disconnect(self)
+
+
+class Simulation(object):
+    """
+    Simulated epics PVs of motors, detectors and plain values.
+    """
+
+    def __init__(self, seed=0):
+        """
+        :param seed: Seed of the noise, for reproducible scans.
+        """
+        self.motors = {}
+        self.detectors = {}
+        self.values = {}
+        self.pvs = []
+        self.random_state = np.random.RandomState(seed)
+        self._timers = []
+
+    def add_motor(self, pv_name, readback_pv_name=None, velocity=None, acceleration=None, noise=0, readback_lag=0,
+                  initial_position=0):
+        """
+        Add a motor to the simulation. See SimulatedMotor for the parameters.
+        :return: SimulatedMotor.
+        """
+        motor = SimulatedMotor(pv_name, readback_pv_name, velocity, acceleration, noise, readback_lag,
+                               initial_position)
+
+        self.motors[motor.pv_name] = motor
+        self.motors[motor.readback_pv_name] = motor
+
+        return motor
+
+    def add_detector(self, pv_name, value_function=None, latency=0, noise=0):
+        """
+        Add a detector to the simulation. See SimulatedDetector for the parameters.
+        :return: SimulatedDetector.
+        """
+        detector = SimulatedDetector(pv_name, value_function, latency, noise)
+        self.detectors[pv_name] = detector
+
+        return detector
+
+    def get_positions(self):
+        """
+        Readbacks of all the motors, without noise.
+        :return: Dictionary {motor pv_name: position}
+        """
+        current_time = time()
+        return dict((motor.pv_name, motor.get_position(current_time - motor.readback_lag))
+                    for motor in self.motors.values())
+
+    def get_value(self, pv_name):
+        if pv_name in self.motors:
+            motor = self.motors[pv_name]
+            # Motors with a separate readback PV return the setpoint on the setpoint PV.
+            if pv_name != motor.readback_pv_name:
+                return motor.setpoint
+            return motor.get_readback(self.random_state)
+
+        elif pv_name in self.detectors:
+            return self.detectors[pv_name].get_value(self.get_positions(), self.random_state)
+
+        return self.values.get(pv_name, 0)
+
+    def put_value(self, pv_name, value):
+        if pv_name in self.motors:
+            motor = self.motors[pv_name]
+            readback_time = motor.move(value)
+
+            # Monitors are notified when the move starts and when the readback reaches the target.
+            self._notify_value_changed(motor.pv_name, motor.readback_pv_name)
+            timer = Timer(readback_time, self._notify_value_changed, args=(motor.readback_pv_name,))
+            timer.daemon = True
+            self._timers = [x for x in self._timers if x.is_alive()] + [timer]
+            timer.start()
+
+        elif pv_name in self.detectors:
+            raise ValueError("Cannot write to the simulated detector '%s'." % pv_name)
+
+        else:
+            self.values[pv_name] = value
+            self._notify_value_changed(pv_name)
+
+    def _notify_value_changed(self, *pv_names):
+        for pv in [pv for pv in self.pvs if pv.pvname in pv_names]:
+            pv.notify_value_changed()
+
+    def get_pv(self, pv_name):
+        """
+        Connect to a simulated PV.
+        :return: SimulatedPV.
+        """
+        pv = SimulatedPV(self, pv_name)
+        self.pvs.append(pv)
+
+        return pv
+
+    def disconnect(self, pv):
+        if pv in self.pvs:
+            self.pvs.remove(pv)
+
+    def reset(self, seed=0):
+        """
+        Remove all the motors, detectors and values from the simulation.
+        :param seed: New seed of the noise.
+        """
+        for timer in self._timers:
+            timer.cancel()
+
+        self.motors.clear()
+        self.detectors.clear()
+        self.values.clear()
+        self.random_state = np.random.RandomState(seed)
+        self._timers = []
+
+
+# Simulation used by connect_to_pv when config.epics_simulation is enabled.
+simulation = Simulation()
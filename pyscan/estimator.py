@@ -0,0 +1,159 @@
+from collections import namedtuple
+from math import sqrt
+
+from pyscan.positioner.static import StaticPositioner
+from pyscan.positioner.time import TimePositioner
+from pyscan.scan_parameters import scan_settings
+from pyscan.scanner import Scanner
+from pyscan.utils import convert_to_list
+
+# Estimated time budget of a scan, in seconds, split by phase.
+SCAN_ESTIMATE = namedtuple("SCAN_ESTIMATE", ["n_positions", "move_time", "settle_time", "read_time", "wait_time",
+                                             "total_time"])
+
+
+def get_move_time(distance, velocity, acceleration=None):
+    """
+    Time for an axis to travel the distance, with a trapezoidal velocity profile.
+    :param distance: Distance to travel.
+    :param velocity: Maximum velocity of the axis.
+    :param acceleration: Acceleration (and deceleration) of the axis. None for instant acceleration.
+    :return: Travel time in seconds.
+    """
+    distance = abs(distance)
+
+    if not acceleration:
+        return distance / velocity
+
+    # The axis reaches the maximum velocity only if the distance is long enough to accelerate and decelerate.
+    if distance >= velocity ** 2 / acceleration:
+        return distance / velocity + velocity / acceleration
+
+    return 2 * sqrt(distance / acceleration)
+
+
+class DryRunDal(object):
+    """
+    No-op writer, settler, reader and data processor of a dry run scan. Nothing is moved or read: each call adds the
+    time it would take to the time budget of its phase.
+    """
+
+    def __init__(self, settings, axis_velocities, axis_accelerations, read_time, start_position):
+        """
+        Initialize the dry run.
+        :param settings: Settings of the scan.
+        :param axis_velocities: Velocity of each axis.
+        :param axis_accelerations: Acceleration of each axis.
+        :param read_time: Time to read all the readables once.
+        :param start_position: Position of the axis before the scan. None for the first scan position.
+        """
+        self.settings = settings
+        self.axis_velocities = axis_velocities
+        self.axis_accelerations = axis_accelerations
+        self.read_time = read_time
+        self.current_position = start_position
+
+        self.n_positions = 0
+        self.total_move_time = 0
+        self.total_settle_time = 0
+        self.total_read_time = 0
+        self.total_wait_time = 0
+
+    def write(self, position):
+        position = convert_to_list(position)
+
+        if self.current_position is None:
+            self.current_position = position
+
+        n_axis = len(position)
+        if len(self.axis_velocities) > n_axis or len(self.axis_accelerations) > n_axis:
+            raise ValueError("The positioner has %d axis, but %d velocities and %d accelerations were provided."
+                             % (n_axis, len(self.axis_velocities), len(self.axis_accelerations)))
+
+        # All the axis move at the same time, the slowest axis defines the move time.
+        self.total_move_time += max([get_move_time(target - current, velocity, acceleration)
+                                     for current, target, velocity, acceleration
+                                     in zip(self.current_position, position, self.axis_velocities,
+                                            self.axis_accelerations)
+                                     if velocity is not None] or [0])
+        self.current_position = position
+
+    def settle(self, position):
+        # With adaptive settling, the values settle in the settling window at best.
+        if self.settings.settling_band is not None:
+            self.total_settle_time += self.settings.settling_window
+        else:
+            self.total_settle_time += self.settings.settling_time
+
+    def read(self):
+        self.total_read_time += self.read_time
+
+        # The measurement interval is waited only for multiple measurements.
+        if self.settings.n_measurements > 1:
+            self.total_wait_time += self.settings.measurement_interval
+
+        return []
+
+    def process(self, position, data):
+        self.n_positions += 1
+
+    def get_data(self):
+        return None
+
+
+def estimate_scan(positioner, settings=None, axis_velocities=None, axis_accelerations=None, read_time=0,
+                  start_position=None):
+    """
+    Estimate the duration of a scan with a dry run: the scanner walks the positioner with no-op DALs, that do not
+    move the motors or read the data, but add the modelled time of each move, settling and read.
+    :param positioner: Positioner of the scan.
+    :param settings: Settings of the scan.
+    :param axis_velocities: Velocity of each axis. Axis without velocity (None) move instantly.
+    :param axis_accelerations: Acceleration of each axis. Axis without acceleration (None) accelerate instantly.
+    :param read_time: Time to read all the readables once. The read time of the records of a previous scan can be used.
+    :param start_position: Position of the axis before the scan. Default: the first scan position.
+    :return: SCAN_ESTIMATE with the time spent in each phase of the scan.
+    """
+    if hasattr(positioner, "update"):
+        raise ValueError("The positions of adaptive positioners depend on the acquired data, the scan duration "
+                         "cannot be estimated.")
+
+    settings = settings or scan_settings()
+    axis_velocities = list(convert_to_list(axis_velocities) or [])
+    axis_accelerations = list(convert_to_list(axis_accelerations) or [])
+
+    if any(velocity is not None and velocity <= 0 for velocity in axis_velocities):
+        raise ValueError("Axis velocities must be positive, but %s were provided." % axis_velocities)
+
+    axis_velocities += [None] * (len(axis_accelerations) - len(axis_velocities))
+    axis_accelerations += [None] * (len(axis_velocities) - len(axis_accelerations))
+
+    dry_run = DryRunDal(settings, axis_velocities, axis_accelerations, read_time, convert_to_list(start_position))
+
+    # Time positioners wait for the ticks in real time, and do not move anything.
+    time_positioner = isinstance(positioner, TimePositioner)
+    if time_positioner:
+        scan_positioner = StaticPositioner(positioner.n_intervals)
+        writer = None
+    else:
+        scan_positioner = positioner
+        writer = dry_run.write
+
+    # The modelled waits are added by the dry run, the scanner does not sleep.
+    dry_run_settings = settings._replace(measurement_interval=0, progress_callback=lambda current, total: None)
+
+    Scanner(scan_positioner, dry_run, dry_run.read, writer, settings=dry_run_settings,
+            settler=dry_run.settle).discrete_scan()
+
+    n_positions = dry_run.n_positions
+    wait_time = dry_run.total_wait_time
+
+    # Time positioners wait for the rest of the time interval after each position but the last one.
+    if time_positioner and n_positions:
+        position_time = (dry_run.total_settle_time + dry_run.total_read_time + wait_time) / n_positions
+        wait_time += (n_positions - 1) * max(positioner.time_interval - position_time, 0)
+
+    total_time = dry_run.total_move_time + dry_run.total_settle_time + dry_run.total_read_time + wait_time
+
+    return SCAN_ESTIMATE(n_positions, dry_run.total_move_time, dry_run.total_settle_time, dry_run.total_read_time,
+                         wait_time, total_time)
@@ -2,6 +2,7 @@ from pyscan import scan, action_restore, ZigZagVectorPositioner, VectorPositione
 from pyscan.scan import EPICS_READER
 from pyscan.positioner.area import AreaPositioner, ZigZagAreaPositioner
 from pyscan.positioner.line import ZigZagLinePositioner, LinePositioner
+from pyscan.positioner.search import BinarySearchPositioner, HillClimbingPositioner
 from pyscan.positioner.time import TimePositioner
 from pyscan.scan_parameters import scan_settings
 from pyscan.utils import convert_to_list
@@ -356,7 +357,15 @@ def bsearch(writables, readable, start, end, steps, maximum=True, strategy="Norm
         SearchResult object.
 
     """
-    raise NotImplementedError("Binary search scan not supported.")
+    offsets, finalization_actions, settings = _generate_scan_parameters(relative, writables, latency)
+
+    positioner = BinarySearchPositioner(start=start, end=end, resolution=steps, maximum=maximum, strategy=strategy,
+                                        offsets=offsets)
+
+    scan(positioner, readable, writables, before_read=before_read, after_read=after_read, settings=settings,
+         finalization=finalization_actions)
+
+    return positioner.get_result()
 
 
 def hsearch(writables, readable, range_min, range_max, initial_step, resolution, noise_filtering_steps=1, maximum=True,
@@ -382,4 +391,16 @@ def hsearch(writables, readable, range_min, range_max, initial_step, resolution,
         SearchResult object.
 
     """
-    raise NotImplementedError("Hill climbing scan not supported.")
+    offsets, finalization_actions, settings = _generate_scan_parameters(relative, writables, latency)
+
+    # Relative search starts at the current position, absolute in the middle of the range.
+    start = [0] * len(convert_to_list(range_min)) if relative else None
+
+    positioner = HillClimbingPositioner(range_min=range_min, range_max=range_max, initial_step=initial_step,
+                                        resolution=resolution, noise_filtering_steps=noise_filtering_steps,
+                                        maximum=maximum, start=start, offsets=offsets)
+
+    scan(positioner, readable, writables, before_read=before_read, after_read=after_read, settings=settings,
+         finalization=finalization_actions)
+
+    return positioner.get_result()
@@ -1,12 +1,13 @@
 import traceback
 from copy import deepcopy
 from datetime import datetime
+from itertools import product
 from time import sleep
 
 import numpy as np
 
 from pyscan.dal.epics_dal import PyEpicsDal
-from pyscan.interface.pyScan.utils import PyScanDataProcessor
+from pyscan.interface.pyScan.utils import PyScanDataProcessor, PyScanArrayDataProcessor
 from pyscan.positioner.compound import CompoundPositioner
 from pyscan.positioner.serial import SerialPositioner
 from pyscan.positioner.vector import VectorPositioner
@@ -68,11 +69,19 @@ class Scan(object):
                                  n_measurements=self.dimensions[-1]["NumberOfMeasurements"],
                                  measurement_interval=self.dimensions[-1]["Waiting"])
 
-        data_processor = PyScanDataProcessor(self.outdict,
-                                             n_readbacks=self.n_readbacks,
-                                             n_validations=self.n_validations,
-                                             n_observables=self.n_observables,
-                                             n_measurements=settings.n_measurements)
+        if self.numpy_output:
+            data_processor = PyScanArrayDataProcessor(self.outdict,
+                                                      indexes=self.get_output_indexes(),
+                                                      n_readbacks=self.n_readbacks,
+                                                      n_validations=self.n_validations,
+                                                      n_observables=self.n_observables,
+                                                      n_measurements=settings.n_measurements)
+        else:
+            data_processor = PyScanDataProcessor(self.outdict,
+                                                 n_readbacks=self.n_readbacks,
+                                                 n_validations=self.n_validations,
+                                                 n_observables=self.n_observables,
+                                                 n_measurements=settings.n_measurements)
 
         self.scanner = Scanner(positioner=self.get_positioner(), data_processor=data_processor,
                                reader=self.epics_dal.get_group(READ_GROUP).read,
@@ -173,6 +182,7 @@ class Scan(object):
         self.n_observables = None
         self.n_total_positions = None
         self.n_measurements = None
+        self.numpy_output = False
 
         # Accessed by some clients.
         self.ProgDisp = Scan.DummyProgress()
@@ -206,16 +216,19 @@ class Scan(object):
         else:
             self.scanner.resume_scan()
 
-    def initializeScan(self, inlist, dal=None):
+    def initializeScan(self, inlist, dal=None, numpy_output=False):
         """
         Initialize and verify the provided scan values.
         :param inlist: List of dictionaries for each dimension.
         :param dal: Which reader should be used to access the PVs. Default: PyEpicsDal.
+        :param numpy_output: Store KnobReadback, Validation and Observable in numpy arrays instead of nested lists.
         :return: Dictionary with results.
         """
         if not inlist:
             raise ValueError("Provided inlist is empty.")
 
+        self.numpy_output = numpy_output
+
         if dal is not None:
             self.epics_dal = dal
         else:
@@ -291,10 +304,16 @@ class Scan(object):
             self._setup_monitors(self.dimensions[-1])
 
             # Prealocating the place for the output
-            self.outdict = {"ErrorMessage": None,
-                            "KnobReadback": self.allocateOutput(),
-                            "Validation": self.allocateOutput(),
-                            "Observable": self.allocateOutput()}
+            if self.numpy_output:
+                self.outdict = {"ErrorMessage": None,
+                                "KnobReadback": self.allocateArrayOutput(self.n_readbacks),
+                                "Validation": self.allocateArrayOutput(self.n_validations),
+                                "Observable": self.allocateArrayOutput(self.n_observables)}
+            else:
+                self.outdict = {"ErrorMessage": None,
+                                "KnobReadback": self.allocateOutput(),
+                                "Validation": self.allocateOutput(),
+                                "Observable": self.allocateOutput()}
 
         except ValueError:
             self.outdict = {"ErrorMessage": traceback.format_exc()}
@@ -333,6 +352,46 @@ class Scan(object):
 
         return root_list
 
+    def allocateArrayOutput(self, n_channels):
+        """
+        Allocate a numpy array for the output, with an axis for each dimension (knob and step for series dimensions),
+        followed by the measurements axis (if more than 1 measurement) and the channels axis.
+        Series knobs with less steps than the others are left as NaN.
+        :param n_channels: Number of channels read at each measurement.
+        :return: Numpy array filled with NaN.
+        """
+        shape = []
+        for dimension in self.dimensions:
+            if dimension['Series']:
+                shape.extend([len(dimension['Nstep']), max(dimension['Nstep'])])
+            else:
+                shape.append(dimension['Nstep'])
+
+        n_measurements = self.dimensions[-1]['NumberOfMeasurements']
+        if n_measurements > 1:
+            shape.append(n_measurements)
+
+        shape.append(n_channels)
+
+        return np.full(shape, np.nan)
+
+    def get_output_indexes(self):
+        """
+        Index in the array output of each scan position, in the order of the scan.
+        :return: Generator of index tuples.
+        """
+        dimension_indexes = []
+        for dimension in self.dimensions:
+            if dimension['Series']:
+                dimension_indexes.append([(knob_index, step_index)
+                                          for knob_index, n_steps in enumerate(dimension['Nstep'])
+                                          for step_index in range(n_steps)])
+            else:
+                dimension_indexes.append([(step_index,) for step_index in range(dimension['Nstep'])])
+
+        for indexes in product(*dimension_indexes):
+            yield sum(indexes, ())
+
     def _setup_epics_dal(self):
         # Collect all PVs that need to be read at each scan step.
         self.all_read_pvs = []
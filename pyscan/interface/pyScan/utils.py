@@ -1,3 +1,5 @@
+import numpy as np
+
 from pyscan.utils import flat_list_generator
 
 
@@ -39,3 +41,82 @@ class PyScanDataProcessor(object):
 
     def get_data(self):
         return self.output
+
+
+class PyScanArrayDataProcessor(object):
+    """
+    Same as PyScanDataProcessor, but the output is stored in preallocated numpy arrays instead of nested lists.
+    Each array has an axis for each scan dimension (2 axis for series dimensions: knob, step), followed by the
+    measurements axis (only for more than 1 measurement) and the channels axis.
+    """
+    def __init__(self, output, indexes, n_readbacks, n_validations, n_observables, n_measurements):
+        """
+        Initialize the array data processor.
+        :param output: Dictionary with the preallocated KnobReadback, Validation and Observable arrays.
+        :param indexes: Index in the output arrays of each scan position, in the order of the scan.
+        """
+        self.n_readbacks = n_readbacks
+        self.n_validations = n_validations
+        self.n_observables = n_observables
+        self.n_measurements = n_measurements
+        self.output = output
+        self.indexes = iter(indexes)
+
+        # Output key and channels interval in each measurement.
+        validation_end = self.n_readbacks + self.n_validations
+        self.output_intervals = [("KnobReadback", 0, self.n_readbacks),
+                                 ("Validation", self.n_readbacks, validation_end),
+                                 ("Observable", validation_end, validation_end + self.n_observables)]
+
+        self.n_points = 0
+
+    @staticmethod
+    def _is_numeric(values):
+        try:
+            return np.asarray(values).dtype.kind in "biuf"
+        # Inhomogeneous values (waveforms, for example).
+        except ValueError:
+            return False
+
+    def _store(self, name, index, values):
+        """
+        Store the values in the output array. The array is converted to objects if the values are not numeric.
+        :param name: Output key.
+        :param index: Index of the position in the output array.
+        :param values: Values of the channels (for each measurement, if more than 1).
+        """
+        array = self.output[name]
+
+        # The type of the values is verified only on the first point, to keep the processing fast.
+        if array.dtype != np.object_ and self.n_points == 0 and not self._is_numeric(values):
+            array = self.output[name] = array.astype(np.object_)
+
+        if array.dtype != np.object_:
+            try:
+                array[index] = values
+                return
+            except (TypeError, ValueError):
+                array = self.output[name] = array.astype(np.object_)
+
+        # Object arrays are filled value by value, so that waveforms are not broadcast.
+        for value_index in np.ndindex(*array.shape[len(index):]):
+            value = values
+            for axis_index in value_index:
+                value = value[axis_index]
+            array[index + value_index] = value
+
+    def process(self, position, data):
+        index = next(self.indexes)
+
+        # Just we can always iterate over it.
+        if self.n_measurements == 1:
+            data = [data]
+
+        for name, interval_start, interval_end in self.output_intervals:
+            values = [measurement[interval_start:interval_end] for measurement in data]
+            self._store(name, index, values if self.n_measurements > 1 else values[0])
+
+        self.n_points += 1
+
+    def get_data(self):
+        return self.output
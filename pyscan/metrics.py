@@ -0,0 +1,268 @@
+import os
+import sys
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from time import time
+
+from pyscan import config
+
+# Snapshot of the scan metrics. The latencies are LATENCY_HISTOGRAM of each phase, in seconds.
+SCAN_METRICS = namedtuple("SCAN_METRICS", ["points_done", "total_points", "elapsed_time", "points_per_second",
+                                           "eta", "retries", "condition_failures", "move_latency", "settle_latency",
+                                           "read_latency"])
+# Cumulative counts of the values lower or equal to each bucket upper bound, sum and count of all the values.
+LATENCY_HISTOGRAM = namedtuple("LATENCY_HISTOGRAM", ["buckets", "counts", "sum", "count"])
+
+
+def _format_time(seconds):
+    if seconds is None:
+        return "unknown"
+
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+
+    return "%d:%02d:%02d" % (hours, minutes, seconds)
+
+
+class ProgressReporter(object):
+    """
+    Progress callback printing the progress, rate and ETA at most once per report interval.
+    The first and the last position are always reported.
+    """
+
+    def __init__(self, report_interval=None, output=None):
+        """
+        :param report_interval: Minimum time between reports, in seconds. Default: config.scan_progress_report_interval
+        :param output: File to write the reports to. Default: sys.stdout
+        """
+        self.report_interval = report_interval if report_interval is not None else \
+            config.scan_progress_report_interval
+        self.output = output
+
+        self.start_time = None
+        self.last_report_time = None
+
+    def __call__(self, current_position, total_positions):
+        current_time = time()
+
+        # A new scan started.
+        if current_position == 0 or self.start_time is None:
+            self.start_time = current_time
+            self.last_report_time = None
+
+        if current_position not in (0, total_positions) and self.last_report_time is not None and \
+                current_time - self.last_report_time < self.report_interval:
+            return
+
+        self.last_report_time = current_time
+
+        elapsed_time = current_time - self.start_time
+        points_per_second = current_position / elapsed_time if elapsed_time > 0 else 0.0
+        eta = (total_positions - current_position) / points_per_second if points_per_second else None
+        completed_percentage = 100.0 * current_position / total_positions if total_positions else 100.0
+
+        print("Scan: %.2f %% completed (%d/%d), %.1f points/s, ETA %s" %
+              (completed_percentage, current_position, total_positions, points_per_second, _format_time(eta)),
+              file=self.output or sys.stdout)
+
+
+class LatencyHistogram(object):
+    """
+    Histogram of latencies, with cumulative buckets like the Prometheus histograms.
+    """
+
+    def __init__(self, buckets=None):
+        """
+        :param buckets: Upper bounds of the buckets, in seconds. Default: config.metrics_latency_buckets
+        """
+        self.buckets = sorted(buckets or config.metrics_latency_buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.counts[index] += 1
+
+        self.sum += value
+        self.count += 1
+
+    def get_snapshot(self):
+        return LATENCY_HISTOGRAM(list(self.buckets), list(self.counts), self.sum, self.count)
+
+
+class ScanMetrics(object):
+    """
+    Metrics of a running scan. Updated by the scanner, they can be read from any thread.
+    """
+
+    def __init__(self, condition_failures=None):
+        """
+        :param condition_failures: Dictionary with the number of failures of each condition, updated by the scanner.
+        """
+        self.condition_failures = condition_failures if condition_failures is not None else OrderedDict()
+
+        self.export_filename = None
+        self.export_interval = None
+        self.export_labels = None
+        self.export_error = None
+        self._last_export_time = None
+
+        self._lock = Lock()
+        self._reset(0)
+
+    def _reset(self, total_points):
+        self.total_points = total_points
+        self.points_done = 0
+        self.retries = 0
+        self.start_time = time()
+        self.end_time = None
+
+        self.move_latency = LatencyHistogram()
+        self.settle_latency = LatencyHistogram()
+        self.read_latency = LatencyHistogram()
+
+    def start(self, total_points):
+        """
+        Reset the metrics at the start of the scan.
+        :param total_points: Number of positions in the scan.
+        """
+        with self._lock:
+            self._reset(total_points)
+
+        self.export()
+
+    def record_position(self, timing):
+        """
+        Account the position acquired by the scanner.
+        :param timing: SCAN_TIMING of the position.
+        """
+        with self._lock:
+            self.points_done += 1
+            self.move_latency.observe(timing.move_time)
+            self.settle_latency.observe(timing.settle_time)
+            self.read_latency.observe(timing.read_time)
+
+        if self.export_filename and time() - self._last_export_time >= self.export_interval:
+            self.export()
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def finish(self):
+        """
+        The scan acquired all its positions. Adaptive positioners can finish before the total number of positions.
+        """
+        with self._lock:
+            self.total_points = self.points_done
+
+    def stop(self):
+        """
+        Stop the elapsed time at the end of the scan (completed or aborted) and write the metrics file.
+        """
+        with self._lock:
+            self.end_time = time()
+
+        self.export()
+
+    def get_snapshot(self):
+        """
+        Consistent copy of the current metrics.
+        :return: SCAN_METRICS
+        """
+        with self._lock:
+            elapsed_time = (self.end_time or time()) - self.start_time
+            points_per_second = self.points_done / elapsed_time if elapsed_time > 0 else 0.0
+            eta = (self.total_points - self.points_done) / points_per_second if points_per_second else None
+
+            return SCAN_METRICS(self.points_done, self.total_points, elapsed_time, points_per_second, eta,
+                                self.retries, OrderedDict(self.condition_failures), self.move_latency.get_snapshot(),
+                                self.settle_latency.get_snapshot(), self.read_latency.get_snapshot())
+
+    def to_prometheus_text(self, labels=None):
+        """
+        Format the metrics in the Prometheus text exposition format.
+        :param labels: Labels added to all the metrics, for example {"scan": "alignment"}.
+        :return: Metrics as text.
+        """
+        metrics = self.get_snapshot()
+        labels = OrderedDict(labels or {})
+
+        def format_labels(extra_labels=None):
+            all_labels = OrderedDict(labels)
+            all_labels.update(extra_labels or {})
+            if not all_labels:
+                return ""
+            return "{%s}" % ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                                     for name, value in all_labels.items())
+
+        lines = []
+
+        def add_metric(name, metric_type, description, values):
+            lines.append("# HELP pyscan_%s %s" % (name, description))
+            lines.append("# TYPE pyscan_%s %s" % (name, metric_type))
+            for suffix, extra_labels, value in values:
+                value = "NaN" if value != value else repr(float(value))
+                lines.append("pyscan_%s%s%s %s" % (name, suffix, format_labels(extra_labels), value))
+
+        add_metric("points_done_total", "counter", "Number of acquired positions.", [("", None, metrics.points_done)])
+        add_metric("points_total", "gauge", "Number of positions in the scan.", [("", None, metrics.total_points)])
+        add_metric("points_per_second", "gauge", "Average acquisition rate.",
+                   [("", None, metrics.points_per_second)])
+        add_metric("eta_seconds", "gauge", "Estimated time to the end of the scan.",
+                   [("", None, metrics.eta if metrics.eta is not None else float("nan"))])
+        add_metric("retries_total", "counter", "Number of acquisition retries.", [("", None, metrics.retries)])
+        add_metric("condition_failures_total", "counter", "Number of times each condition was not met.",
+                   [("", {"condition": name}, value) for name, value in metrics.condition_failures.items()])
+
+        for phase, histogram in (("move", metrics.move_latency), ("settle", metrics.settle_latency),
+                                 ("read", metrics.read_latency)):
+            values = [("_bucket", {"le": repr(float(upper_bound))}, count)
+                      for upper_bound, count in zip(histogram.buckets, histogram.counts)]
+            values.append(("_bucket", {"le": "+Inf"}, histogram.count))
+            values.append(("_sum", None, histogram.sum))
+            values.append(("_count", None, histogram.count))
+
+            add_metric("%s_latency_seconds" % phase, "histogram", "Time spent in the %s phase of each position." %
+                       phase, values)
+
+        return "\n".join(lines) + "\n"
+
+    def export_to_file(self, filename, interval=None, labels=None):
+        """
+        Periodically write the metrics in the Prometheus text format, for example for the textfile collector of the
+        node exporter. The file is replaced atomically.
+        :param filename: File to write the metrics to.
+        :param interval: Minimum time between writes, in seconds. Default: config.metrics_export_interval
+        :param labels: Labels added to all the metrics.
+        """
+        self.export_filename = filename
+        self.export_interval = interval if interval is not None else config.metrics_export_interval
+        self.export_labels = labels
+        self._last_export_time = None
+
+        self.export()
+
+    def export(self):
+        """
+        Write the metrics file now. Does nothing if export_to_file was not called.
+        Errors writing the file do not stop the scan (or hide its errors): they are printed to stderr and the last one
+        is kept in export_error.
+        """
+        if not self.export_filename:
+            return
+
+        self._last_export_time = time()
+
+        temporary_filename = self.export_filename + ".tmp"
+        try:
+            with open(temporary_filename, "w") as metrics_file:
+                metrics_file.write(self.to_prometheus_text(self.export_labels))
+
+            os.replace(temporary_filename, self.export_filename)
+
+        except OSError as e:
+            self.export_error = e
+            print("Cannot write the scan metrics to '%s': %s" % (self.export_filename, e), file=sys.stderr)
@@ -0,0 +1,145 @@
+import math
+from bisect import bisect_left
+
+from pyscan.utils import convert_to_list, get_first_readable_value
+
+
+class AdaptiveLinePositioner(object):
+    """
+    Move along a line, refining the positions where the measured value changes the most.
+    A coarse grid is measured first, then new positions are added in the middle of the intervals with the largest
+    change (gradient) or change of slope (curvature) of the measured value, until the resolution, the tolerance or the
+    maximum number of positions is reached.
+
+    The scanner passes the data acquired at each position to the update method, before requesting the next position.
+    """
+
+    def _validate_parameters(self):
+        if not len(self.start) == len(self.end):
+            raise ValueError("Number of start %s and end %s positions do not match." %
+                             (self.start, self.end))
+
+        if not isinstance(self.n_initial, int) or self.n_initial < 2:
+            raise ValueError("Number of initial positions must be an integer of at least 2, but %s was given."
+                             % self.n_initial)
+
+        if self.resolution is None and self.max_positions is None:
+            raise ValueError("Resolution or max_positions must be set, otherwise the refinement might not stop.")
+
+        if self.resolution is not None and self.resolution <= 0:
+            raise ValueError("Resolution must be a positive number, but %s was given." % self.resolution)
+
+        if self.max_positions is not None and self.max_positions < self.n_initial:
+            raise ValueError("Max positions %s cannot be less than the number of initial positions %s." %
+                             (self.max_positions, self.n_initial))
+
+        if max(abs(end - start) for start, end in zip(self.start, self.end)) == 0:
+            raise ValueError("Start %s and end %s positions must be different." % (self.start, self.end))
+
+    def __init__(self, start, end, n_initial=5, resolution=None, max_positions=None, tolerance=0.01,
+                 value_function=None):
+        """
+        Initialize the adaptive line positioner.
+        :param start: Start position (one value for each axis).
+        :param end: End position (one value for each axis).
+        :param n_initial: Number of positions in the initial grid, including start and end.
+        :param resolution: Minimum distance between positions, on the axis with the largest range.
+        :param max_positions: Maximum number of positions, including the initial ones.
+        :param tolerance: Intervals with a loss (relative change of the value) smaller than this are not refined.
+        :param value_function: Function to get the value to refine on from the data at a position.
+                               Signature: def (data) -> number. Default: first readable (mean of the measurements).
+        """
+        self.start = convert_to_list(start)
+        self.end = convert_to_list(end)
+        self.n_initial = n_initial
+        self.resolution = resolution
+        self.max_positions = max_positions
+        self.tolerance = tolerance
+        self.value_function = value_function or get_first_readable_value
+
+        self._validate_parameters()
+
+        # The positions are parametrized by the fraction of the line (0=start, 1=end).
+        line_length = max(abs(end - start) for start, end in zip(self.start, self.end))
+        self.min_interval = self.resolution / line_length if self.resolution else 0
+
+        # Fractions and values measured in the current scan, sorted by fraction.
+        self.fractions = []
+        self.values = []
+        self._current_fraction = None
+
+    def _get_position(self, fraction):
+        return [start + (end - start) * fraction for start, end in zip(self.start, self.end)]
+
+    def update(self, position, data):
+        """
+        Receive the data acquired at the last position.
+        :param position: Last position.
+        :param data: Data acquired at the last position.
+        """
+        index = bisect_left(self.fractions, self._current_fraction)
+        self.fractions.insert(index, self._current_fraction)
+        self.values.insert(index, self.value_function(data))
+
+    def _get_interval_losses(self):
+        """
+        Loss of each interval between measured positions: relative change of the value over the interval, plus the
+        relative change of the slope at its ends.
+        """
+        value_scale = (max(self.values) - min(self.values)) or 1
+        changes = [(next_value - value) / value_scale for value, next_value in zip(self.values, self.values[1:])]
+
+        # Change of the slope at each inner position.
+        curvatures = [0] + [abs(next_change - change) for change, next_change in zip(changes, changes[1:])] + [0]
+
+        return [abs(change) + max(curvatures[index], curvatures[index + 1]) for index, change in enumerate(changes)]
+
+    def _get_next_fraction(self):
+        """
+        Middle of the interval with the largest loss, or None if no interval needs to be refined.
+        """
+        if len(self.fractions) < 2:
+            return None
+
+        best_loss = self.tolerance
+        next_fraction = None
+        for index, loss in enumerate(self._get_interval_losses()):
+            interval = self.fractions[index + 1] - self.fractions[index]
+
+            # The new intervals would be smaller than the resolution.
+            if interval / 2 < self.min_interval:
+                continue
+
+            # Prefer larger intervals with the same loss.
+            if loss > best_loss or (next_fraction is not None and loss == best_loss and
+                                    interval > self.fractions[index + 1] - next_fraction):
+                best_loss = loss
+                next_fraction = self.fractions[index] + interval / 2
+
+        return next_fraction
+
+    def get_n_positions(self):
+        """
+        Maximum number of positions the positioner can generate.
+        """
+        if self.max_positions is not None:
+            return self.max_positions
+
+        return max(self.n_initial, int(math.floor(1 / self.min_interval)) + 1)
+
+    def get_generator(self):
+        self.fractions = []
+        self.values = []
+
+        # Initial coarse grid.
+        for index in range(self.n_initial):
+            self._current_fraction = index / (self.n_initial - 1)
+            yield self._get_position(self._current_fraction)
+
+        while self.max_positions is None or len(self.fractions) < self.max_positions:
+            self._current_fraction = self._get_next_fraction()
+
+            if self._current_fraction is None:
+                return
+
+            yield self._get_position(self._current_fraction)
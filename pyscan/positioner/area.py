@@ -1,5 +1,6 @@
 import math
 from copy import copy
+from itertools import product
 
 from pyscan.utils import convert_to_list
 
@@ -86,6 +87,22 @@ class AreaPositioner(object):
 
             yield from scan_axis(0)
 
+    def get_shape(self):
+        """
+        Shape of the scan: (passes, positions on axis 1, positions on axis 2...).
+        The passes axis is omitted for a single pass.
+        """
+        shape = tuple(n_steps + 1 for n_steps in self.n_steps)
+        return (self.passes,) + shape if self.passes > 1 else shape
+
+    def get_index_generator(self):
+        """
+        Index of each generated position in the scan shape.
+        """
+        for pass_number in range(self.passes):
+            for axis_indexes in product(*(range(n_steps + 1) for n_steps in self.n_steps)):
+                yield (pass_number,) + axis_indexes if self.passes > 1 else axis_indexes
+
 
 class ZigZagAreaPositioner(AreaPositioner):
     def get_generator(self):
@@ -119,6 +136,37 @@ class ZigZagAreaPositioner(AreaPositioner):
 
             yield from scan_axis(0)
 
+    def get_index_generator(self):
+        """
+        Index of each generated position in the scan shape. The index follows the physical position, so the
+        positions of the descending lines are placed in reverse order.
+        """
+        for pass_number in range(self.passes):
+            # Same walk as in the generator, but moving the axis index instead of the position.
+            directions = [1] * self.n_axis
+            indexes = [0] * self.n_axis
+
+            def get_index():
+                return (pass_number,) + tuple(indexes) if self.passes > 1 else tuple(indexes)
+
+            # Return the initial state.
+            yield get_index()
+
+            def scan_axis(axis_number):
+                if not axis_number < self.n_axis:
+                    return
+
+                yield from scan_axis(axis_number + 1)
+
+                for _ in range(self.n_steps[axis_number]):
+                    indexes[axis_number] += directions[axis_number]
+                    yield get_index()
+                    yield from scan_axis(axis_number + 1)
+
+                directions[axis_number] *= -1
+
+            yield from scan_axis(0)
+
 
 class MultiAreaPositioner(object):
     def __init__(self, start, end, steps, passes=1, offsets=None):
@@ -19,3 +19,22 @@ class CompoundPositioner(object):
                     yield from walk_positioner(index+1, output_positions + convert_to_list(current_positions))
 
         yield from walk_positioner(0, [])
+
+    def get_shape(self):
+        """
+        Shape of the scan: the shapes of the compounded positioners, in the given order.
+        """
+        return tuple(dimension for positioner in self.positioners for dimension in positioner.get_shape())
+
+    def get_index_generator(self):
+        """
+        Index of each generated position in the scan shape.
+        """
+        def walk_positioner(index, output_index):
+            if index == self.n_positioners:
+                yield output_index
+            else:
+                for current_index in self.positioners[index].get_index_generator():
+                    yield from walk_positioner(index+1, output_index + tuple(current_index))
+
+        yield from walk_positioner(0, ())
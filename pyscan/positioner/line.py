@@ -73,6 +73,21 @@ class LinePositioner(object):
 
                 yield current_positions
 
+    def get_shape(self):
+        """
+        Shape of the scan: (passes, positions per pass). The passes axis is omitted for a single pass.
+        """
+        shape = (self.n_steps + 1,)
+        return (self.passes,) + shape if self.passes > 1 else shape
+
+    def get_index_generator(self):
+        """
+        Index of each generated position in the scan shape.
+        """
+        for pass_number in range(self.passes):
+            for step_index in range(self.n_steps + 1):
+                yield (pass_number, step_index) if self.passes > 1 else (step_index,)
+
 
 class ZigZagLinePositioner(LinePositioner):
     def get_generator(self):
@@ -89,3 +104,19 @@ class ZigZagLinePositioner(LinePositioner):
                                      in zip(current_positions, self.step_size)]
 
                 yield current_positions
+
+    def get_index_generator(self):
+        """
+        Index of each generated position in the scan shape. The index follows the physical position, so the
+        positions of the descending passes are placed in reverse order.
+        """
+        # The initial position is always the start position.
+        step_index = 0
+        yield (0, step_index) if self.passes > 1 else (step_index,)
+
+        for pass_number in range(self.passes):
+            direction = 1 if pass_number % 2 == 0 else -1
+
+            for __ in range(self.n_steps):
+                step_index += direction
+                yield (pass_number, step_index) if self.passes > 1 else (step_index,)
@@ -0,0 +1,328 @@
+import math
+from collections import namedtuple
+from itertools import product
+
+from pyscan.utils import convert_to_list, get_first_readable_value
+
+# Result of a search: best position and value found, and all the evaluated positions and values, in order.
+SEARCH_RESULT = namedtuple("SEARCH_RESULT", ["optimal_position", "optimal_value", "positions", "values"])
+
+BINARY_SEARCH_STRATEGIES = ["Normal", "Boundary", "FullNeighborhood"]
+
+
+class _MaximumPositionsReached(Exception):
+    pass
+
+
+class SearchPositioner(object):
+    """
+    Base class for positioners searching for the maximum (or minimum) of a readable.
+    The scanner passes the data acquired at each position to the update method, before requesting the next position.
+    Each position is evaluated only once.
+    """
+
+    def __init__(self, range_min, range_max, resolution, maximum=True, offsets=None, max_positions=None,
+                 value_function=None):
+        """
+        Initialize the search positioner.
+        :param range_min: Minimum position of each axis.
+        :param range_max: Maximum position of each axis.
+        :param resolution: Resolution (minimum step size) of each axis.
+        :param maximum: If True, search for the maximum, otherwise for the minimum.
+        :param offsets: Offsets to add to each axis.
+        :param max_positions: Maximum number of positions to evaluate.
+                              Default: number of positions in an area scan with the given resolution.
+        :param value_function: Function to get the value to optimize from the data at a position.
+                               Signature: def (data) -> number. Default: first readable (mean of the measurements).
+        """
+        self.range_min = convert_to_list(range_min)
+        self.range_max = convert_to_list(range_max)
+        self.n_axis = len(self.range_min)
+        self.resolution = convert_to_list(resolution)
+        self.maximum = maximum
+        self.offsets = convert_to_list(offsets)
+        self.value_function = value_function or get_first_readable_value
+
+        # Single resolution for all axis.
+        if len(self.resolution) == 1:
+            self.resolution = self.resolution * self.n_axis
+
+        self._validate_parameters()
+
+        if self.offsets:
+            self.range_min = [offset + original_value for original_value, offset in zip(self.range_min, self.offsets)]
+            self.range_max = [offset + original_value for original_value, offset in zip(self.range_max, self.offsets)]
+
+        if max_positions is None:
+            max_positions = 1
+            for axis_min, axis_max, axis_resolution in zip(self.range_min, self.range_max, self.resolution):
+                max_positions *= int(math.floor(abs(axis_max - axis_min) / axis_resolution)) + 1
+        self.max_positions = max_positions
+
+        self.positions = []
+        self.values = []
+        self._evaluated = {}
+        self._last_value = None
+
+    def _validate_parameters(self):
+        if not len(self.range_min) == len(self.range_max):
+            raise ValueError("Number of range_min %s and range_max %s positions do not match." %
+                             (self.range_min, self.range_max))
+
+        if not len(self.resolution) == self.n_axis:
+            raise ValueError("Number of resolutions %s does not match the number of axis %d." %
+                             (self.resolution, self.n_axis))
+
+        if not all(x > 0 for x in self.resolution):
+            raise ValueError("Resolution must be positive, but %s was given." % self.resolution)
+
+        if self.offsets and (not len(self.offsets) == self.n_axis):
+            raise ValueError("Number of offsets %s does not match the number of axis %d." %
+                             (self.offsets, self.n_axis))
+
+    def _clip(self, position):
+        return [min(max(x, min(axis_min, axis_max)), max(axis_min, axis_max))
+                for x, axis_min, axis_max in zip(position, self.range_min, self.range_max)]
+
+    def _is_better(self, value, reference_value):
+        if reference_value is None:
+            return value is not None
+        if value is None:
+            return False
+
+        return value > reference_value if self.maximum else value < reference_value
+
+    def _evaluate(self, position):
+        """
+        Move to the position and get the measured value. Use as: value = yield from self._evaluate(position)
+        :param position: Position to evaluate.
+        :return: Value at the position.
+        """
+        # Positions are compared with a precision well below any motor resolution.
+        key = tuple(round(x, 9) for x in position)
+        if key in self._evaluated:
+            return self._evaluated[key]
+
+        if len(self.positions) >= self.max_positions:
+            raise _MaximumPositionsReached()
+
+        self._last_value = None
+        yield position
+
+        self._evaluated[key] = self._last_value
+        self.positions.append(position)
+        self.values.append(self._last_value)
+
+        return self._last_value
+
+    def _search(self):
+        raise NotImplementedError("The search must be implemented by the positioner.")
+
+    def update(self, position, data):
+        """
+        Receive the data acquired at the last position.
+        :param position: Last position.
+        :param data: Data acquired at the last position.
+        """
+        self._last_value = self.value_function(data)
+
+    def get_n_positions(self):
+        """
+        Maximum number of positions the positioner can generate.
+        """
+        return self.max_positions
+
+    def get_generator(self):
+        self.positions = []
+        self.values = []
+        self._evaluated = {}
+
+        try:
+            yield from self._search()
+        except _MaximumPositionsReached:
+            pass
+
+    def get_result(self):
+        """
+        Get the result of the last search.
+        :return: SEARCH_RESULT with the optimal position and value, and all evaluated positions and values.
+        """
+        optimal_index = None
+        for index, value in enumerate(self.values):
+            if optimal_index is None or self._is_better(value, self.values[optimal_index]):
+                optimal_index = index
+
+        if optimal_index is None:
+            return SEARCH_RESULT(None, None, self.positions, self.values)
+
+        return SEARCH_RESULT(self.positions[optimal_index], self.values[optimal_index], self.positions, self.values)
+
+
+class BinarySearchPositioner(SearchPositioner):
+    """
+    Search the maximum (or minimum) by evaluating the neighbourhood of the best position, moving to the best neighbour
+    and halving the neighbourhood size when no neighbour is better, until the resolution is reached.
+    """
+
+    def __init__(self, start, end, resolution, maximum=True, strategy="Normal", offsets=None, max_positions=None,
+                 value_function=None):
+        """
+        Initialize the binary search positioner.
+        :param start: Start position of each axis.
+        :param end: End position of each axis.
+        :param resolution: Resolution of the search for each axis.
+        :param maximum: If True, search for the maximum, otherwise for the minimum.
+        :param strategy: "Normal": start in the middle of the range, evaluate the orthogonal neighbourhood.
+                         "Boundary": start in the middle of the range, with the first neighbours on the range limits.
+                         "FullNeighborhood": as "Normal", but evaluate the complete neighbourhood (8 points in 2D).
+        """
+        if strategy not in BINARY_SEARCH_STRATEGIES:
+            raise ValueError("Strategy %s is not supported. Available strategies: %s." %
+                             (strategy, BINARY_SEARCH_STRATEGIES))
+        self.strategy = strategy
+
+        super(BinarySearchPositioner, self).__init__(start, end, resolution, maximum=maximum, offsets=offsets,
+                                                     max_positions=max_positions, value_function=value_function)
+
+    def _get_neighbours(self, position, step):
+        if self.strategy == "FullNeighborhood":
+            directions = [direction for direction in product([-1, 0, 1], repeat=self.n_axis) if any(direction)]
+        else:
+            directions = []
+            for axis in range(self.n_axis):
+                for sign in (-1, 1):
+                    directions.append([sign if index == axis else 0 for index in range(self.n_axis)])
+
+        return [self._clip([x + direction_x * axis_step for x, direction_x, axis_step
+                            in zip(position, direction, step)])
+                for direction in directions]
+
+    def _search(self):
+        ranges = [axis_max - axis_min for axis_min, axis_max in zip(self.range_min, self.range_max)]
+        center = [axis_min + axis_range / 2 for axis_min, axis_range in zip(self.range_min, ranges)]
+
+        # The boundary strategy evaluates the range limits first.
+        step_fraction = 2 if self.strategy == "Boundary" else 4
+        step = [max(abs(axis_range) / step_fraction, resolution)
+                for axis_range, resolution in zip(ranges, self.resolution)]
+
+        best_value = yield from self._evaluate(center)
+
+        while True:
+            best_position = center
+            for neighbour in self._get_neighbours(center, step):
+                value = yield from self._evaluate(neighbour)
+                if self._is_better(value, best_value):
+                    best_value = value
+                    best_position = neighbour
+
+            # Move to the best neighbour, keeping the neighbourhood size.
+            if best_position is not center:
+                center = best_position
+                continue
+
+            # No better neighbour and the resolution was reached.
+            if all(axis_step <= resolution for axis_step, resolution in zip(step, self.resolution)):
+                return
+
+            step = [max(axis_step / 2, resolution) for axis_step, resolution in zip(step, self.resolution)]
+
+
+class HillClimbingPositioner(SearchPositioner):
+    """
+    Search the maximum (or minimum) by moving each axis in the improving direction, halving the step when no direction
+    improves the value, until the resolution is reached.
+    """
+
+    def __init__(self, range_min, range_max, initial_step, resolution, noise_filtering_steps=1, maximum=True,
+                 start=None, offsets=None, max_positions=None, value_function=None):
+        """
+        Initialize the hill climbing positioner.
+        :param range_min: Minimum position of each axis.
+        :param range_max: Maximum position of each axis.
+        :param initial_step: Initial step size for each axis.
+        :param resolution: Minimum step size for each axis.
+        :param noise_filtering_steps: Number of consecutive steps without improvement before changing direction.
+                                      Larger values avoid stopping on a noisy measurement.
+        :param maximum: If True, search for the maximum, otherwise for the minimum.
+        :param start: Start position. Default: middle of the range.
+        """
+        super(HillClimbingPositioner, self).__init__(range_min, range_max, resolution, maximum=maximum,
+                                                     offsets=offsets, max_positions=max_positions,
+                                                     value_function=value_function)
+
+        self.initial_step = convert_to_list(initial_step)
+        if len(self.initial_step) == 1:
+            self.initial_step = self.initial_step * self.n_axis
+
+        if not len(self.initial_step) == self.n_axis:
+            raise ValueError("Number of initial steps %s does not match the number of axis %d." %
+                             (self.initial_step, self.n_axis))
+
+        if not isinstance(noise_filtering_steps, int) or noise_filtering_steps < 1:
+            raise ValueError("Noise filtering steps must be a positive integer, but %s was given." %
+                             noise_filtering_steps)
+        self.noise_filtering_steps = noise_filtering_steps
+
+        self.start = convert_to_list(start)
+        if self.start and self.offsets:
+            self.start = [offset + original_value for original_value, offset in zip(self.start, self.offsets)]
+
+    def _climb_axis(self, position, value, axis, step):
+        """
+        Move along the axis, in both directions, as long as the value improves.
+        :return: Tuple (best position, best value).
+        """
+        best_position, best_value = position, value
+
+        for direction in (1, -1):
+            current_position = best_position
+            n_steps_without_improvement = 0
+
+            while n_steps_without_improvement < self.noise_filtering_steps:
+                next_position = list(current_position)
+                next_position[axis] += direction * step
+                next_position = self._clip(next_position)
+
+                # Range limit reached.
+                if next_position == current_position:
+                    break
+
+                current_position = next_position
+                current_value = yield from self._evaluate(current_position)
+
+                if self._is_better(current_value, best_value):
+                    best_position, best_value = current_position, current_value
+                    n_steps_without_improvement = 0
+                else:
+                    n_steps_without_improvement += 1
+
+            # Do not go back if the first direction improved the value.
+            if best_position is not position:
+                break
+
+        return best_position, best_value
+
+    def _search(self):
+        position = self._clip(self.start or [(axis_min + axis_max) / 2 for axis_min, axis_max
+                                             in zip(self.range_min, self.range_max)])
+        value = yield from self._evaluate(position)
+
+        step = [abs(x) for x in self.initial_step]
+
+        while True:
+            improved = False
+            for axis in range(self.n_axis):
+                new_position, value = yield from self._climb_axis(position, value, axis, step[axis])
+                if new_position is not position:
+                    position = new_position
+                    improved = True
+
+            if improved:
+                continue
+
+            # No direction improves the value and the resolution was reached.
+            if all(axis_step <= resolution for axis_step, resolution in zip(step, self.resolution)):
+                return
+
+            step = [max(axis_step / 2, resolution) for axis_step, resolution in zip(step, self.resolution)]
@@ -38,3 +38,23 @@ class SerialPositioner(object):
                 for axis_position_index in range(n_steps_in_axis):
                     current_state[axis_index] = convert_to_list(self.positions[axis_index])[axis_position_index]
                     yield copy(current_state)
+
+    def get_shape(self):
+        """
+        Shape of the scan: (passes, axis, positions on the longest axis). The passes axis is omitted for a single pass,
+        and the axis dimension for a single axis. Axis with less positions leave the last entries empty.
+        """
+        shape = (max(len(convert_to_list(axis_positions)) for axis_positions in self.positions),)
+        if self.n_axis > 1:
+            shape = (self.n_axis,) + shape
+        return (self.passes,) + shape if self.passes > 1 else shape
+
+    def get_index_generator(self):
+        """
+        Index of each generated position in the scan shape.
+        """
+        for pass_number in range(self.passes):
+            for axis_index in range(self.n_axis):
+                for axis_position_index in range(len(convert_to_list(self.positions[axis_index]))):
+                    index = (axis_index, axis_position_index) if self.n_axis > 1 else (axis_position_index,)
+                    yield (pass_number,) + index if self.passes > 1 else index
@@ -10,3 +10,10 @@ class StaticPositioner(object):
     def get_generator(self):
         for index in range(self.n_images):
             yield index
+
+    def get_shape(self):
+        return self.n_images,
+
+    def get_index_generator(self):
+        for index in range(self.n_images):
+            yield index,
@@ -1,16 +1,22 @@
-from time import time, sleep
+import asyncio
+from time import perf_counter, sleep, time
 
+from pyscan import config
 from pyscan.config import max_time_tolerance
 
-smoothing_factor = 0.95
+# What to do when a tick is missed because the acquisition took longer than the time interval.
+MISSED_TICK_POLICIES = ["Raise", "Skip", "CatchUp"]
 
 
 class TimePositioner(object):
-    def __init__(self, time_interval, n_intervals, tolerance=None):
+    def __init__(self, time_interval, n_intervals, tolerance=None, missed_tick_policy="Raise"):
         """
-        Time interval at which to read data.
+        Time interval at which to read data. The ticks are scheduled at start + k * time_interval.
         :param time_interval: Time interval in seconds.
         :param n_intervals: How many intervals to measure.
+        :param tolerance: How late a tick can be before it is considered missed.
+        :param missed_tick_policy: What to do when a tick is missed. 'Raise': stop the scan with an error,
+                                   'Skip': wait for the next scheduled tick, 'CatchUp': acquire immediately.
         """
         self.time_interval = time_interval
         # Tolerance cannot be less than the min set tolerance.
@@ -23,30 +29,125 @@ class TimePositioner(object):
             n_intervals = 1
         self.n_intervals = n_intervals
 
-    def get_generator(self):
-        measurement_time_start = time()
-        last_time_to_sleep = 0
+        if missed_tick_policy not in MISSED_TICK_POLICIES:
+            raise ValueError("Missed tick policy '%s' not supported. Available policies: %s" %
+                             (missed_tick_policy, MISSED_TICK_POLICIES))
+        self.missed_tick_policy = missed_tick_policy
+
+        # Scheduled and actual timestamps of the ticks of the last generator.
+        self.scheduled_timestamps = []
+        self.actual_timestamps = []
+
+    @staticmethod
+    def _wait_until(deadline):
+        """
+        Sleep until shortly before the deadline, then spin to reach it with sub-millisecond accuracy.
+        :param deadline: perf_counter value to wait for.
+        """
+        time_to_sleep = deadline - perf_counter() - config.time_positioner_spin_time
+        if time_to_sleep > 0:
+            sleep(time_to_sleep)
+
+        while perf_counter() < deadline:
+            pass
+
+    @staticmethod
+    async def _async_wait_until(deadline):
+        """
+        Same as _wait_until, but the event loop keeps running while sleeping. Only the short spin blocks it.
+        :param deadline: perf_counter value to wait for.
+        """
+        time_to_sleep = deadline - perf_counter() - config.time_positioner_spin_time
+        if time_to_sleep > 0:
+            await asyncio.sleep(time_to_sleep)
+
+        while perf_counter() < deadline:
+            pass
+
+    def _get_ticks(self):
+        """
+        Schedule the ticks. Send the actual perf_counter value of each tick back to the generator.
+        :return: Generator of the deadline (perf_counter value) of each tick.
+        """
+        self.scheduled_timestamps = []
+        self.actual_timestamps = []
+
+        # Monotonic clock for the scheduling, wall clock only to report the timestamps.
+        start_timestamp = time()
+        start_counter = perf_counter()
+        tick = 0
 
         for _ in range(self.n_intervals):
-            measurement_time_stop = time()
-            # How much time did the measurement take.
-            measurement_time = measurement_time_stop - measurement_time_start
+            deadline = start_counter + (tick * self.time_interval)
+            delay = perf_counter() - deadline
+
+            if delay > self.tolerance:
+                if self.missed_tick_policy == "Raise":
+                    raise ValueError("The requested time interval cannot be achieved. Tick %d was missed by %.4f "
+                                     "seconds, with a %.4f seconds time interval." % (tick, delay, self.time_interval))
+
+                # Move to the first tick in the future.
+                elif self.missed_tick_policy == "Skip" and self.time_interval > 0:
+                    tick += int(delay // self.time_interval) + 1
+                    deadline = start_counter + (tick * self.time_interval)
 
-            time_to_sleep = self.time_interval - measurement_time
-            # Use the smoothing factor to attenuate variations in the measurement time.
-            time_to_sleep = (smoothing_factor * time_to_sleep) + ((1-smoothing_factor) * last_time_to_sleep)
+            actual_counter = yield deadline
+            actual_timestamp = start_timestamp + (actual_counter - start_counter)
 
-            # Time to sleep is negative (more time has elapsed, we cannot achieve the requested time interval.
-            if time_to_sleep < (-1 * max_time_tolerance):
-                raise ValueError("The requested time interval cannot be achieved. Last iteration took %.2f seconds, "
-                                 "but a %.2f seconds time interval was set." % (measurement_time, self.time_interval))
+            self.scheduled_timestamps.append(start_timestamp + (deadline - start_counter))
+            self.actual_timestamps.append(actual_timestamp)
+            tick += 1
+
+            # Return the timestamp at which the measurement begins.
+            yield actual_timestamp
+
+    def get_generator(self):
+        ticks = self._get_ticks()
+
+        for deadline in ticks:
+            self._wait_until(deadline)
+            yield ticks.send(perf_counter())
+
+    def get_async_iterator(self):
+        """
+        Same as get_generator, for the async scanner: the event loop is not blocked while waiting for the ticks.
+        :return: Async iterator of the timestamps.
+        """
+        return AsyncTicks(self._get_ticks(), self._async_wait_until)
+
+    def get_n_positions(self):
+        return self.n_intervals
+
+    def get_shape(self):
+        return self.n_intervals,
+
+    def get_index_generator(self):
+        for index in range(self.n_intervals):
+            yield index,
+
+
+class AsyncTicks(object):
+    """
+    Async iterator of the ticks of a TimePositioner. A class instead of an async generator, since async generators
+    are not available before Python 3.6.
+    """
+
+    def __init__(self, ticks, async_wait_until):
+        """
+        :param ticks: Generator of the tick deadlines (TimePositioner._get_ticks).
+        :param async_wait_until: Coroutine function waiting until a deadline.
+        """
+        self.ticks = ticks
+        self.async_wait_until = async_wait_until
 
-            # Sleep only if time to sleep is positive.
-            if time_to_sleep > 0:
-                sleep(time_to_sleep)
+    def __aiter__(self):
+        return self
 
-            last_time_to_sleep = time_to_sleep
-            measurement_time_start = time()
+    async def __anext__(self):
+        try:
+            deadline = next(self.ticks)
+        except StopIteration:
+            raise StopAsyncIteration
 
-            # Return the timestamp at which the measurement should begin.
-            yield measurement_time_start
+        await self.async_wait_until(deadline)
+        return self.ticks.send(perf_counter())
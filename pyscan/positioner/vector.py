@@ -1,7 +1,92 @@
 from itertools import cycle, chain
 
+import numpy as np
+
 from pyscan.utils import convert_to_list
 
+# Maximum number of 2-opt passes over the path when optimizing the order of the positions.
+max_path_optimization_passes = 50
+
+
+def _get_travel_times(positions, position, axis_velocities):
+    """
+    Time to travel from a position to each of the positions, with all axis moving at the same time.
+    :param positions: Numpy array of positions (n_positions, n_axis).
+    :param position: Numpy array of the start position (n_axis).
+    :param axis_velocities: Numpy array of the velocity of each axis.
+    :return: Numpy array of travel times.
+    """
+    return np.max(np.abs(positions - position) / axis_velocities, axis=-1)
+
+
+def get_path_travel_time(positions, axis_velocities):
+    """
+    Total time to travel over the positions, in the given order.
+    """
+    positions = np.asarray(positions, dtype=float).reshape(len(positions), -1)
+    return float(np.sum(np.max(np.abs(np.diff(positions, axis=0)) / axis_velocities, axis=-1)))
+
+
+def _optimize_path(positions, axis_velocities):
+    """
+    Order the positions to minimize the travel time, starting from the first position.
+    Nearest neighbour path, improved with 2-opt segment reversals.
+    :param positions: Numpy array of positions (n_positions, n_axis).
+    :param axis_velocities: Numpy array of the velocity of each axis.
+    :return: List of indexes of the positions, in the optimized order.
+    """
+    n_positions = len(positions)
+
+    # Nearest neighbour path.
+    path = [0]
+    unvisited = np.ones(n_positions, dtype=bool)
+    unvisited[0] = False
+    for _ in range(n_positions - 1):
+        travel_times = _get_travel_times(positions, positions[path[-1]], axis_velocities)
+        travel_times[~unvisited] = np.inf
+        next_index = int(np.argmin(travel_times))
+        unvisited[next_index] = False
+        path.append(next_index)
+
+    # 2-opt: reverse the segment path[i+1:j+1] if it shortens the path. The first position is fixed.
+    path = np.array(path)
+    ordered_positions = positions[path]
+    # Travel time from each position of the path to the next one, updated with each reversal.
+    segment_times = _get_travel_times(ordered_positions[1:], ordered_positions[:-1], axis_velocities)
+
+    for _ in range(max_path_optimization_passes):
+        improved = False
+
+        for i in range(n_positions - 2):
+            a, b = ordered_positions[i], ordered_positions[i + 1]
+            c = ordered_positions[i + 2:]
+            # The last segment does not have a following position.
+            d = ordered_positions[i + 3:]
+
+            old_times = segment_times[i] + np.append(segment_times[i + 2:], 0)
+            new_times = _get_travel_times(c, a, axis_velocities) + np.append(
+                _get_travel_times(d, b, axis_velocities), 0)
+
+            gains = old_times - new_times
+            best = int(np.argmax(gains))
+            if gains[best] > 1e-12:
+                j = i + 2 + best
+                path[i + 1:j + 1] = path[i + 1:j + 1][::-1].copy()
+                ordered_positions[i + 1:j + 1] = ordered_positions[i + 1:j + 1][::-1].copy()
+
+                # The travel times are symmetric: only the 2 segments at the ends of the reversal change.
+                segment_times[i + 1:j] = segment_times[i + 1:j][::-1].copy()
+                segment_times[i] = _get_travel_times(ordered_positions[i + 1], ordered_positions[i], axis_velocities)
+                if j < n_positions - 1:
+                    segment_times[j] = _get_travel_times(ordered_positions[j + 1], ordered_positions[j],
+                                                         axis_velocities)
+                improved = True
+
+        if not improved:
+            break
+
+    return path.tolist()
+
 
 class VectorPositioner(object):
     """
@@ -19,10 +104,26 @@ class VectorPositioner(object):
             raise ValueError("Number of offsets %s does not match the number of positions %s." %
                              (self.offsets, self.positions[0]))
 
-    def __init__(self, positions, passes=1, offsets=None):
+        if self.axis_velocities and (not len(self.axis_velocities) == len(convert_to_list(self.positions[0]))):
+            raise ValueError("Number of axis velocities %s does not match the number of positions %s." %
+                             (self.axis_velocities, self.positions[0]))
+
+        if self.axis_velocities and not all(velocity > 0 for velocity in self.axis_velocities):
+            raise ValueError("Axis velocities must be positive, but %s were given." % self.axis_velocities)
+
+    def __init__(self, positions, passes=1, offsets=None, optimize_path=False, axis_velocities=None):
+        """
+        Initialize the vector positioner.
+        :param positions: List of positions to move to.
+        :param passes: Number of times to move over all the positions.
+        :param offsets: Offsets to add to each axis.
+        :param optimize_path: Reorder the positions to minimize the motors travel time. The first position is kept.
+        :param axis_velocities: Velocity of each axis, used to calculate the travel time. Default: equal velocities.
+        """
         self.positions = convert_to_list(positions)
         self.passes = passes
         self.offsets = convert_to_list(offsets)
+        self.axis_velocities = convert_to_list(axis_velocities)
 
         self._validate_parameters()
 
@@ -35,11 +136,58 @@ class VectorPositioner(object):
                 step_positions[:] = [original_position + offset
                                      for original_position, offset in zip(step_positions, self.offsets)]
 
+        # Index in the provided positions of each position to move to.
+        self.position_indexes = list(range(self.n_positions))
+
+        if optimize_path and self.n_positions > 2:
+            n_axis = len(convert_to_list(self.positions[0]))
+            velocities = np.array(self.axis_velocities or [1] * n_axis, dtype=float)
+            positions = np.array([convert_to_list(position) for position in self.positions], dtype=float)
+
+            self.position_indexes = _optimize_path(positions, velocities)
+            self.positions = [self.positions[index] for index in self.position_indexes]
+
     def get_generator(self):
         for _ in range(self.passes):
             for position in self.positions:
                 yield position
 
+    def get_result_indexes(self):
+        """
+        Index in the scan results of each generated position. With an optimized path, the results are returned in
+        the order of the provided positions, and not in the order they were visited.
+        :return: List of indexes, or None if the positions are visited in the provided order.
+        """
+        if self.position_indexes == list(range(self.n_positions)):
+            return None
+
+        shape = self.get_shape()
+        flat_indexes = [int(np.ravel_multi_index(index, shape)) for index in self.get_index_generator()]
+
+        # Rank of each generated position, ordered by its index in the scan shape.
+        result_indexes = [0] * len(flat_indexes)
+        for result_index, position_index in enumerate(sorted(range(len(flat_indexes)),
+                                                             key=lambda x: flat_indexes[x])):
+            result_indexes[position_index] = result_index
+
+        return result_indexes
+
+    def get_shape(self):
+        """
+        Shape of the scan: (passes, positions per pass). The passes axis is omitted for a single pass.
+        """
+        shape = (self.n_positions,)
+        return (self.passes,) + shape if self.passes > 1 else shape
+
+    def get_index_generator(self):
+        """
+        Index of each generated position in the scan shape. The index is the position in the provided list, also
+        when the path is optimized.
+        """
+        for pass_number in range(self.passes):
+            for position_index in self.position_indexes:
+                yield (pass_number, position_index) if self.passes > 1 else (position_index,)
+
 
 class ZigZagVectorPositioner(VectorPositioner):
     def get_generator(self):
@@ -50,3 +198,21 @@ class ZigZagVectorPositioner(VectorPositioner):
 
         for x in range(n_indexes):
             yield self.positions[next(indexes)]
+
+    def get_index_generator(self):
+        """
+        Index of each generated position in the scan shape. The index follows the position in the provided list, so
+        the positions of the descending passes are placed in reverse order.
+        """
+        for pass_number in range(self.passes):
+            # First pass has all the positions, descending passes skip the last and ascending the first position.
+            if pass_number == 0:
+                position_indexes = range(0, self.n_positions, 1)
+            elif pass_number % 2 == 1:
+                position_indexes = range(self.n_positions - 2, -1, -1)
+            else:
+                position_indexes = range(1, self.n_positions, 1)
+
+            for position_index in position_indexes:
+                position_index = self.position_indexes[position_index]
+                yield (pass_number, position_index) if self.passes > 1 else (position_index,)
@@ -0,0 +1,229 @@
+import numpy as np
+
+from pyscan.scan_parameters import convert_input
+from pyscan.utils import convert_to_list, get_n_positions
+
+
+class ColumnarDataProcessor(object):
+    """
+    Save the positions and the received data in preallocated numpy arrays, with a column for each readable.
+    """
+    # Number of points to allocate when the number of positions is not known.
+    initial_capacity = 1024
+    # Factor by which the arrays grow when they are full.
+    growth_factor = 2
+
+    def __init__(self, readables, n_positions=None, n_measurements=1, positioner=None):
+        """
+        Initialize the columnar data processor.
+        :param readables: Same readables that were passed to the scan function.
+        :param n_positions: Number of positions in the scan. If not known, the arrays grow as needed.
+        :param n_measurements: Number of measurements at each position (same as in the scan settings).
+        :param positioner: Same positioner that is passed to the scan function. If given, the number of positions
+                           defaults to the number of positions of the positioner.
+        """
+        readables = convert_input(convert_to_list(readables))
+        self.readable_ids = [x.identifier for x in readables]
+
+        if len(set(self.readable_ids)) != len(self.readable_ids):
+            raise ValueError("Readables identifiers must be unique, but %s were provided." % self.readable_ids)
+
+        if n_positions is None and positioner is not None:
+            n_positions = get_n_positions(positioner)
+
+        if n_positions is not None and (not isinstance(n_positions, int) or n_positions < 1):
+            raise ValueError("Number of positions must be a positive integer, but %s was given." % n_positions)
+
+        self.n_positions = n_positions
+        self.n_measurements = n_measurements
+
+        self.n_points = 0
+        self.data = None
+        self.positions = None
+
+    @staticmethod
+    def _get_value_type(value):
+        """
+        Get the numpy type and shape of a value.
+        :param value: Value to inspect.
+        :return: Tuple (dtype, shape). Strings and unknown types are stored as objects. Integer and boolean scalars
+                 are stored as float64, since the next values of the same readable can be fractional.
+        """
+        value = np.asarray(value)
+        if value.dtype.kind in "OSUV":
+            return np.dtype(np.object_), value.shape
+        if value.dtype.kind in "biu" and not value.shape:
+            return np.dtype(np.float64), value.shape
+        return value.dtype, value.shape
+
+    def _get_data_dtype(self, data):
+        """
+        Construct the structured type of a point, with a field for each readable.
+        :param data: Data received at the first position.
+        :return: Numpy structured dtype.
+        """
+        measurement = data[0] if self.n_measurements > 1 else data
+
+        fields = []
+        for readable_id, value in zip(self.readable_ids, measurement):
+            dtype, shape = self._get_value_type(value)
+            if self.n_measurements > 1:
+                shape = (self.n_measurements,) + shape
+            fields.append((readable_id, dtype, shape))
+
+        return np.dtype(fields)
+
+    def _allocate(self, name, dtype, shape):
+        """
+        Allocate a new array.
+        :param name: Name of the array ("data" or "positions").
+        :param dtype: Type of the array.
+        :param shape: Shape of the array.
+        :return: Allocated array.
+        """
+        return np.zeros(shape, dtype=dtype)
+
+    def _grow(self, name, array):
+        """
+        Allocate a larger array and copy the already acquired points to it.
+        :param name: Name of the array ("data" or "positions").
+        :param array: Array to grow.
+        :return: Larger array.
+        """
+        new_array = self._allocate(name, array.dtype, (len(array) * self.growth_factor,) + array.shape[1:])
+        new_array[:self.n_points] = array[:self.n_points]
+        return new_array
+
+    def _get_point_values(self, data):
+        """
+        Convert the received data into a tuple, matching the fields of the data array.
+        :param data: Data received at a position.
+        :return: Tuple of values for each readable.
+        """
+        if self.n_measurements > 1:
+            return tuple(list(values) for values in zip(*data))
+
+        return tuple(data)
+
+    def _get_field_type(self, readable_id, value):
+        """
+        Check if the value fits the field of the readable, as typed from the first point.
+        :param readable_id: Readable of the field.
+        :param value: New value of the readable.
+        :return: Tuple (dtype, shape) of a field that can store all the values, or None if the field fits the value.
+                 Values of a different shape are stored as objects; numeric values are promoted to a common type.
+        """
+        field = self.data.dtype[readable_id]
+        if field.base.kind == "O":
+            return None
+
+        try:
+            value = np.asarray(value)
+        except ValueError:
+            # Multiple measurements of different shapes.
+            return np.dtype(np.object_), ()
+
+        if value.shape != field.shape or value.dtype.kind in "OSUV":
+            return np.dtype(np.object_), ()
+
+        if not np.can_cast(value.dtype, field.base, "same_kind"):
+            return np.result_type(field.base, value.dtype), field.shape
+
+        return None
+
+    def _change_field_type(self, readable_id, dtype, shape):
+        """
+        Reallocate the data array with a new type for the field of the readable, and copy the acquired points to it.
+        :param readable_id: Readable of the field.
+        :param dtype: New type of the field.
+        :param shape: New shape of the field.
+        """
+        fields = [(name, dtype, shape) if name == readable_id else
+                  (name, self.data.dtype[name].base, self.data.dtype[name].shape) for name in self.readable_ids]
+        data = self._allocate("data", np.dtype(fields), self.data.shape)
+
+        for name in self.readable_ids:
+            if name == readable_id and dtype.kind == "O":
+                column = data[name]
+                for index, value in enumerate(self.data[name]):
+                    column[index] = value.copy()
+            else:
+                data[name] = self.data[name]
+
+        self.data = data
+
+    def _store_point(self, index, position, data):
+        """
+        Store the position and the data received at it, retyping the fields that do not fit the values.
+        :param index: Index of the point in the arrays.
+        :param position: Position of the point.
+        :param data: Data received at the position.
+        """
+        values = self._get_point_values(data)
+
+        for readable_id, value in zip(self.readable_ids, values):
+            field_type = self._get_field_type(readable_id, value)
+            if field_type:
+                self._change_field_type(readable_id, *field_type)
+
+        self.data[index] = values
+        self.positions[index] = position
+
+    def _allocate_arrays(self, position, data, capacity):
+        """
+        Allocate the data and positions arrays, based on the data received at the first position.
+        :param position: First position.
+        :param data: Data received at the first position.
+        :param capacity: Number of points to allocate.
+        """
+        position_dtype, position_shape = self._get_value_type(position)
+        # Positions are stored as floats, also when the first position is given as integers.
+        if position_dtype.kind in "biu":
+            position_dtype = np.dtype(np.float64)
+
+        self.data = self._allocate("data", self._get_data_dtype(data), (capacity,))
+        self.positions = self._allocate("positions", position_dtype, (capacity,) + position_shape)
+
+    def process(self, position, data):
+        if self.data is None:
+            self._allocate_arrays(position, data, self.n_positions or self.initial_capacity)
+
+        elif self.n_points == len(self.data):
+            self.data = self._grow("data", self.data)
+            self.positions = self._grow("positions", self.positions)
+
+        self._store_point(self.n_points, position, data)
+        self.n_points += 1
+
+    def reorder(self, result_indexes):
+        """
+        Reorder the acquired points, for positioners that do not visit the positions in the provided order.
+        :param result_indexes: Index in the results of each acquired point, in the acquisition order.
+        """
+        if self.data is None:
+            return
+
+        order = np.argsort(result_indexes[:self.n_points], kind="stable")
+        self.data[:self.n_points] = self.data[order]
+        self.positions[:self.n_points] = self.positions[order]
+
+    def get_data(self):
+        """
+        Get the acquired data.
+        :return: Numpy structured array, with a field for each readable. Access the values of a readable with
+                 result[readable_identifier]
+        """
+        if self.data is None:
+            return np.zeros(0, dtype=[(readable_id, np.object_) for readable_id in self.readable_ids])
+
+        return self.data[:self.n_points]
+
+    def get_positions(self):
+        """
+        Get the visited positions.
+        :return: Numpy array with a row for each position.
+        """
+        if self.positions is None:
+            return np.zeros(0)
+
+        return self.positions[:self.n_points]
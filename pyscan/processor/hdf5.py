@@ -0,0 +1,253 @@
+from collections import OrderedDict
+from queue import Queue
+from threading import Thread
+from time import time
+
+import h5py
+import numpy as np
+
+from pyscan import config
+from pyscan.scan_parameters import convert_input
+from pyscan.utils import convert_to_list
+
+# Placed in the queue to signal the writer thread to stop.
+_STOP_WRITER = object()
+
+
+class Hdf5DataProcessor(object):
+    """
+    Stream the positions and the received data into a HDF5 file while the scan is running.
+    The file is written in a separate thread, so the disk access does not stall the scan.
+
+    File layout:
+        /positions - positions at each scan point.
+        /timestamps - time at which the data of each scan point was received.
+        /data/<readable identifier> - values of each readable at each scan point.
+        /condition_failures - number of times each condition was not met. The condition identifiers, in the same
+                              order, are in the "identifiers" attribute.
+
+    The file is flushed and closed by the scanner at the end of the scan, also when the scan fails.
+    """
+
+    def __init__(self, filename, readables, n_measurements=1, compression=None, chunk_size=None,
+                 flush_interval=None):
+        """
+        Initialize the HDF5 data processor.
+        :param filename: Name of the HDF5 file to write. An existing file is overwritten.
+        :param readables: Same readables that were passed to the scan function.
+        :param n_measurements: Number of measurements at each position (same as in the scan settings).
+        :param compression: Compression of the datasets (for example "gzip" or "lzf"). Default: no compression.
+        :param chunk_size: Number of points in each chunk of the datasets.
+        :param flush_interval: Interval, in seconds, at which the data is flushed to disk.
+        """
+        readables = convert_input(convert_to_list(readables))
+        self.readable_ids = [x.identifier for x in readables]
+
+        self.filename = filename
+        self.n_measurements = n_measurements
+        self.compression = compression
+        self.chunk_size = chunk_size or config.hdf5_default_chunk_size
+        self.flush_interval = flush_interval if flush_interval is not None else config.hdf5_default_flush_interval
+
+        self.n_points = 0
+        self.condition_failures = None
+        self._datasets = None
+        self._dataset_names = None
+        self._writer_error = None
+
+        self.file = h5py.File(self.filename, "w")
+        self._queue = Queue(maxsize=config.hdf5_queue_size)
+
+        self._writer_thread = Thread(target=self._write_points)
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+    def _create_dataset(self, name, value):
+        """
+        Create a resizable dataset, with a row for each scan point.
+        :param name: Name of the dataset.
+        :param value: Value of the first point, to take the type and shape from.
+        :return: Created dataset.
+        """
+        value = np.asarray(value)
+
+        if value.dtype.kind in "US":
+            dtype = h5py.special_dtype(vlen=str)
+        elif value.dtype.kind in "OV":
+            raise ValueError("Cannot write value %s of dataset '%s' to HDF5." % (value, name))
+        elif value.dtype.kind in "biu" and not value.shape:
+            # The next values of the same readable can be fractional.
+            dtype = np.float64
+        else:
+            dtype = value.dtype
+
+        return self.file.create_dataset(name, shape=(0,) + value.shape, maxshape=(None,) + value.shape, dtype=dtype,
+                                        chunks=(self.chunk_size,) + value.shape, compression=self.compression)
+
+    def _fit_dataset(self, dataset, value):
+        """
+        Check if the value fits the dataset, as created from the first point.
+        :param dataset: Dataset to write the value to.
+        :param value: Value of the current point.
+        :return: Dataset that can store the value. Numeric datasets are recreated with a promoted type if needed.
+        """
+        value = np.asarray(value)
+
+        if value.shape != dataset.shape[1:]:
+            raise ValueError("Values of dataset '%s' changed shape from %s to %s at point %d." %
+                             (dataset.name, dataset.shape[1:], value.shape, self.n_points))
+
+        if dataset.dtype.kind not in "biuf" or value.dtype.kind not in "biuf" or \
+                np.can_cast(value.dtype, dataset.dtype, "same_kind"):
+            return dataset
+
+        name, maxshape, chunks = dataset.name, dataset.maxshape, dataset.chunks
+        attributes = dict(dataset.attrs)
+        values = dataset[:].astype(np.result_type(dataset.dtype, value.dtype))
+        del self.file[name]
+
+        new_dataset = self.file.create_dataset(name, data=values, maxshape=maxshape, chunks=chunks,
+                                               compression=self.compression)
+        new_dataset.attrs.update(attributes)
+
+        return new_dataset
+
+    def _get_readables_values(self, data):
+        """
+        Split the received data by readable.
+        :param data: Data received at a position.
+        :return: List of values for each readable.
+        """
+        if self.n_measurements > 1:
+            return [list(values) for values in zip(*data)]
+
+        return list(data)
+
+    def _write_point(self, position, data, timestamp):
+        values = self._get_readables_values(data)
+
+        if self._datasets is None:
+            self._datasets = [self._create_dataset("positions", position),
+                              self._create_dataset("timestamps", timestamp)]
+            for readable_id, value in zip(self.readable_ids, values):
+                dataset = self._create_dataset("data/" + readable_id.replace("/", "_"), value)
+                dataset.attrs["identifier"] = readable_id
+                self._datasets.append(dataset)
+
+        # Grow all datasets by one chunk.
+        if self.n_points == self._datasets[0].shape[0]:
+            for dataset in self._datasets:
+                dataset.resize(self.n_points + self.chunk_size, axis=0)
+
+        for index, value in enumerate([position, timestamp] + values):
+            self._datasets[index] = self._fit_dataset(self._datasets[index], value)
+            self._datasets[index][self.n_points] = value
+
+        self.n_points += 1
+
+    def _write_points(self):
+        last_flush_time = time()
+        stop_received = False
+
+        try:
+            while True:
+                point = self._queue.get()
+                if point is _STOP_WRITER:
+                    stop_received = True
+                    break
+
+                self._write_point(*point)
+
+                if time() - last_flush_time > self.flush_interval:
+                    self.file.flush()
+                    last_flush_time = time()
+
+            # Remove the unused part of the last chunk.
+            for dataset in self._datasets or []:
+                dataset.resize(self.n_points, axis=0)
+            self._dataset_names = [dataset.name for dataset in self._datasets or []]
+
+            if self.condition_failures:
+                # Single dataset, since the identifiers cannot be used as dataset names without escaping.
+                dataset = self.file.create_dataset("condition_failures",
+                                                   data=np.array(list(self.condition_failures.values()), dtype=int))
+                dataset.attrs["identifiers"] = list(self.condition_failures.keys())
+
+        except Exception as e:
+            self._writer_error = e
+
+        finally:
+            self.file.close()
+
+        # In case of an error during the scan, keep emptying the queue until the stop, so the scan is not blocked.
+        while self._writer_error and not stop_received:
+            stop_received = self._queue.get() is _STOP_WRITER
+
+    def _raise_writer_error(self):
+        if self._writer_error:
+            raise ValueError("Cannot write data to HDF5 file '%s'." % self.filename) from self._writer_error
+
+    def process(self, position, data):
+        self._raise_writer_error()
+        self._queue.put((position, data, time()))
+
+    def _stop_writer(self, condition_failures=None):
+        if self._writer_thread.is_alive():
+            # Read by the writer thread after it receives the stop.
+            self.condition_failures = OrderedDict(condition_failures or {})
+            self._queue.put(_STOP_WRITER)
+            self._writer_thread.join()
+
+    def finalize(self, scanner):
+        """
+        Called by the scanner at the end of the scan, completed or failed. Write the remaining data and the number of
+        conditions failures, and close the file. Writing errors are raised by get_data, not to hide the scan error.
+        :param scanner: Scanner that executed the scan.
+        """
+        self._stop_writer(scanner.get_condition_failures())
+
+    def close(self, condition_failures=None):
+        """
+        Write the remaining data and close the file.
+        :param condition_failures: Dictionary with the number of failures of each condition, written to the file.
+        """
+        self._stop_writer(condition_failures)
+        self._raise_writer_error()
+
+    def reorder(self, result_indexes):
+        """
+        Reorder the points in the file, for positioners that do not visit the positions in the provided order.
+        Each dataset is rewritten in blocks of chunk_size points, so the memory usage does not grow with the scan.
+        :param result_indexes: Index in the results of each acquired point, in the acquisition order.
+        """
+        self._stop_writer()
+        if self._writer_error or not self._dataset_names:
+            return
+
+        order = np.argsort(result_indexes[:self.n_points], kind="stable")
+
+        with h5py.File(self.filename, "r+") as file:
+            for name in self._dataset_names:
+                dataset = file[name]
+                reordered_dataset = file.create_dataset(name + "_reordered", shape=dataset.shape,
+                                                        maxshape=dataset.maxshape, dtype=dataset.dtype,
+                                                        chunks=dataset.chunks, compression=self.compression)
+
+                for start in range(0, self.n_points, self.chunk_size):
+                    block = order[start:start + self.chunk_size]
+                    # HDF5 selections need increasing indexes.
+                    sorted_block = np.sort(block)
+                    reordered_dataset[start:start + len(block)] = \
+                        dataset[sorted_block][np.searchsorted(sorted_block, block)]
+
+                reordered_dataset.attrs.update(dict(dataset.attrs))
+                del file[name]
+                file.move(name + "_reordered", name)
+
+    def get_data(self):
+        """
+        Write the remaining data and close the file.
+        :return: Name of the written HDF5 file.
+        """
+        self.close()
+        return self.filename
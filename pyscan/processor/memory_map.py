@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+
+from pyscan.processor.columnar import ColumnarDataProcessor
+
+
+class MemoryMappedDataProcessor(ColumnarDataProcessor):
+    """
+    Save the positions and the received data in memory mapped numpy files. Useful for scans of images and waveforms,
+    since the acquired data does not need to fit in memory.
+
+    Files written to the output directory:
+        data.npy - numpy structured array, with a field for each readable.
+        positions.npy - positions at each scan point.
+    """
+
+    def __init__(self, directory, readables, n_positions=None, n_measurements=1, positioner=None):
+        """
+        Initialize the memory mapped data processor.
+        :param directory: Directory to write the files to. Created if it does not exist.
+        :param readables: Same readables that were passed to the scan function.
+        :param n_positions: Number of positions in the scan. The files are preallocated for this number of points.
+        :param n_measurements: Number of measurements at each position (same as in the scan settings).
+        :param positioner: Same positioner that is passed to the scan function. If given, the number of positions
+                           defaults to the number of positions of the positioner.
+        """
+        super(MemoryMappedDataProcessor, self).__init__(readables, n_positions=n_positions,
+                                                        n_measurements=n_measurements, positioner=positioner)
+
+        if not self.n_positions:
+            raise ValueError("The number of positions is needed to preallocate the memory mapped files.")
+
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def _get_value_type(value):
+        dtype, shape = ColumnarDataProcessor._get_value_type(value)
+
+        if dtype.kind == "O":
+            raise ValueError("Value %s cannot be stored in a memory mapped file. "
+                             "Only numeric values and arrays are supported." % value)
+
+        return dtype, shape
+
+    def _allocate(self, name, dtype, shape):
+        filename = os.path.join(self.directory, name + ".npy")
+        return np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=shape)
+
+    def _change_field_type(self, readable_id, dtype, shape):
+        raise ValueError("Readable '%s' changed type or shape from %s at point %d. Memory mapped files need values "
+                         "of a constant type and shape." % (readable_id, self.data.dtype[readable_id], self.n_points))
+
+    def _store_point(self, index, position, data):
+        """
+        Write each received value straight into its slot of the mapped files, without building the point in memory
+        first. The DALs return the values as Python objects, so each value is still copied once, from the received
+        object into the file; for waveforms and images this also converts the received list to an array.
+        :param index: Index of the point in the files.
+        :param position: Position of the point.
+        :param data: Data received at the position.
+        """
+        measurements = data if self.n_measurements > 1 else [data]
+
+        for measurement_index, measurement in enumerate(measurements):
+            for readable_id, value in zip(self.readable_ids, measurement):
+                column = self.data[readable_id]
+                field = self.data.dtype[readable_id]
+                value_shape = field.shape[1:] if self.n_measurements > 1 else field.shape
+
+                value = np.asarray(value)
+                if value.shape != value_shape or not np.can_cast(value.dtype, field.base, "same_kind"):
+                    self._change_field_type(readable_id, value.dtype, value.shape)
+
+                if self.n_measurements > 1:
+                    column[index, measurement_index] = value
+                else:
+                    column[index] = value
+
+        self.positions[index] = position
+
+    def _grow(self, name, array):
+        raise ValueError("More points than the %d preallocated were received." % self.n_positions)
+
+    def get_data(self):
+        """
+        Flush the acquired data to disk.
+        :return: Memory mapped numpy structured array, with a field for each readable.
+        """
+        if self.data is not None:
+            self.data.flush()
+            self.positions.flush()
+
+        return super(MemoryMappedDataProcessor, self).get_data()
+
+    @staticmethod
+    def load(directory, mode="r"):
+        """
+        Open the files written by a previous scan.
+        :param directory: Directory the files were written to.
+        :param mode: Memory mapping mode ("r" read only, "r+" read and write).
+        :return: Tuple (data, positions) of memory mapped arrays.
+        """
+        data = np.load(os.path.join(directory, "data.npy"), mmap_mode=mode)
+        positions = np.load(os.path.join(directory, "positions.npy"), mmap_mode=mode)
+
+        return data, positions
@@ -0,0 +1,80 @@
+import numpy as np
+
+from pyscan.processor.columnar import ColumnarDataProcessor
+
+
+class ShapedDataProcessor(ColumnarDataProcessor):
+    """
+    Save the positions and the received data in numpy arrays with the shape of the positioner, so that each axis
+    of the result corresponds to a dimension of the scan (passes, area axis, compounded positioners...).
+    Each point is placed at the index reported by the positioner, so zigzag scans do not need to be reordered.
+    """
+
+    def __init__(self, positioner, readables, n_measurements=1):
+        """
+        Initialize the shaped data processor.
+        :param positioner: Same positioner that is passed to the scan function. It must implement get_shape() and
+                           get_index_generator().
+        :param readables: Same readables that were passed to the scan function.
+        :param n_measurements: Number of measurements at each position (same as in the scan settings).
+        """
+        if not (hasattr(positioner, "get_shape") and hasattr(positioner, "get_index_generator")):
+            raise ValueError("Positioner %s does not provide the scan shape." % type(positioner).__name__)
+
+        self.shape = tuple(positioner.get_shape())
+
+        super(ShapedDataProcessor, self).__init__(readables, n_positions=int(np.prod(self.shape)),
+                                                  n_measurements=n_measurements)
+
+        self.indexes = positioner.get_index_generator()
+        # Points of the shape that were acquired.
+        self.mask = np.zeros(self.n_positions, dtype=bool)
+
+    def process(self, position, data):
+        index = next(self.indexes, None)
+        if index is None:
+            raise ValueError("More points than the %d in the scan shape %s were received." %
+                             (self.n_positions, self.shape))
+
+        if self.data is None:
+            self._allocate_arrays(position, data, self.n_positions)
+
+        flat_index = np.ravel_multi_index(index, self.shape)
+
+        self._store_point(flat_index, position, data)
+        self.mask[flat_index] = True
+        self.n_points += 1
+
+    def reorder(self, result_indexes):
+        """
+        The points are already placed at the index of their position.
+        """
+        pass
+
+    def get_data(self):
+        """
+        Get the acquired data.
+        :return: Numpy structured array with the shape of the scan, with a field for each readable. Points that were
+                 not acquired (see get_mask) are zero.
+        """
+        if self.data is None:
+            return np.zeros(self.shape, dtype=[(readable_id, np.object_) for readable_id in self.readable_ids])
+
+        return self.data.reshape(self.shape)
+
+    def get_positions(self):
+        """
+        Get the visited positions.
+        :return: Numpy array with the shape of the scan, followed by the shape of a position.
+        """
+        if self.positions is None:
+            return np.zeros(self.shape)
+
+        return self.positions.reshape(self.shape + self.positions.shape[1:])
+
+    def get_mask(self):
+        """
+        Get the acquired points.
+        :return: Boolean numpy array with the shape of the scan, True where the point was acquired.
+        """
+        return self.mask.reshape(self.shape)
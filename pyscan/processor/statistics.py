@@ -0,0 +1,172 @@
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+
+from pyscan.scan_parameters import convert_input
+from pyscan.utils import convert_to_list
+
+READABLE_STATISTICS = namedtuple("READABLE_STATISTICS", ["count", "mean", "std", "min", "max", "histogram",
+                                                         "samples"])
+
+
+class RunningStatistics(object):
+    """
+    Streaming statistics (count, mean, variance, min, max, histogram) of a readable.
+    Array values (waveforms, images) are reduced element wise.
+    """
+
+    def __init__(self, histogram_bins=None, histogram_range=None):
+        """
+        Initialize the running statistics.
+        :param histogram_bins: Number of histogram bins. Default: no histogram.
+        :param histogram_range: Tuple (min, max) of the histogram range. Needed if histogram_bins is set.
+        """
+        if histogram_bins and not histogram_range:
+            raise ValueError("The histogram range must be set, since the histogram is computed while scanning.")
+
+        self.histogram_bins = histogram_bins
+        self.histogram_range = histogram_range
+
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+        self.histogram = None
+
+    def update(self, samples):
+        """
+        Add a batch of samples to the statistics, using the parallel variant of the Welford algorithm.
+        :param samples: List of samples. All samples must have the same shape.
+        """
+        samples = np.asarray(samples, dtype=float)
+        n_samples = len(samples)
+
+        if n_samples == 0:
+            return
+
+        samples_mean = samples.mean(axis=0)
+        samples_m2 = ((samples - samples_mean) ** 2).sum(axis=0)
+
+        if self.count == 0:
+            self.mean = samples_mean
+            self.m2 = samples_m2
+            self.min = samples.min(axis=0)
+            self.max = samples.max(axis=0)
+        else:
+            total_count = self.count + n_samples
+            delta = samples_mean - self.mean
+
+            self.mean = self.mean + delta * (n_samples / total_count)
+            self.m2 = self.m2 + samples_m2 + (delta ** 2) * (self.count * n_samples / total_count)
+            self.min = np.minimum(self.min, samples.min(axis=0))
+            self.max = np.maximum(self.max, samples.max(axis=0))
+
+        self.count += n_samples
+
+        if self.histogram_bins:
+            histogram, _ = np.histogram(samples, bins=self.histogram_bins, range=self.histogram_range)
+            self.histogram = histogram if self.histogram is None else self.histogram + histogram
+
+    def get_std(self):
+        """
+        Standard deviation of all the samples.
+        :return: Standard deviation, or None if there are no samples.
+        """
+        if self.count == 0:
+            return None
+
+        return np.sqrt(self.m2 / self.count)
+
+
+class StatisticsDataProcessor(object):
+    """
+    Save only the statistics of the received data at each position, instead of all the measurements.
+    The scanner passes each measurement to process_measurement as soon as it is acquired, and the statistics are
+    updated with it, so the statistics of a position are ready when its last measurement is read.
+    """
+
+    def __init__(self, readables, n_measurements=1, histogram_bins=None, histogram_range=None, keep_samples=None):
+        """
+        Initialize the statistics data processor.
+        :param readables: Same readables that were passed to the scan function.
+        :param n_measurements: Number of measurements at each position (same as in the scan settings).
+        :param histogram_bins: Number of histogram bins. Default: no histogram.
+        :param histogram_range: Tuple (min, max) of the histogram range. Needed if histogram_bins is set.
+        :param keep_samples: Identifiers of the readables for which all the measurements are kept as well.
+        """
+        readables = convert_input(convert_to_list(readables))
+        self.readable_ids = [x.identifier for x in readables]
+
+        self.n_measurements = n_measurements
+        self.histogram_bins = histogram_bins
+        self.histogram_range = histogram_range
+        self.keep_samples = convert_to_list(keep_samples) or []
+
+        unknown_readables = [x for x in self.keep_samples if x not in self.readable_ids]
+        if unknown_readables:
+            raise ValueError("Cannot keep the samples of %s, not in readables %s." %
+                             (unknown_readables, self.readable_ids))
+
+        # Verify the histogram parameters before the scan starts.
+        RunningStatistics(histogram_bins, histogram_range)
+
+        self.positions = []
+        self.data = []
+
+        # Statistics and kept samples of the position being acquired.
+        self._statistics = None
+        self._samples = None
+
+    def process_measurement(self, position, measurement):
+        """
+        Add a single measurement of the current position to its statistics.
+        :param position: Current position.
+        :param measurement: Values of the readables in one measurement.
+        """
+        if self._statistics is None:
+            self._statistics = [RunningStatistics(self.histogram_bins, self.histogram_range)
+                                for _ in self.readable_ids]
+            self._samples = [[] if readable_id in self.keep_samples else None for readable_id in self.readable_ids]
+
+        for statistics, samples, value in zip(self._statistics, self._samples, measurement):
+            statistics.update([value])
+            if samples is not None:
+                samples.append(value)
+
+    def process(self, position, data):
+        # Scanners that do not call process_measurement (or a single measurement) pass all the measurements here.
+        if self._statistics is None:
+            for measurement in (data if self.n_measurements > 1 else [data]):
+                self.process_measurement(position, measurement)
+
+        result = OrderedDict()
+        for readable_id, statistics, samples in zip(self.readable_ids, self._statistics, self._samples):
+            result[readable_id] = READABLE_STATISTICS(statistics.count, statistics.mean, statistics.get_std(),
+                                                      statistics.min, statistics.max, statistics.histogram,
+                                                      samples)
+
+        self._statistics = None
+        self._samples = None
+
+        self.positions.append(position)
+        self.data.append(result)
+
+    def get_data(self):
+        """
+        Get the statistics at each position.
+        :return: List with a dictionary {readable identifier: READABLE_STATISTICS} for each position.
+        """
+        return self.data
+
+    def get_positions(self):
+        return self.positions
+
+    def reorder(self, result_indexes):
+        """
+        Reorder the acquired points, for positioners that do not visit the positions in the provided order.
+        :param result_indexes: Index in the results of each acquired point, in the acquisition order.
+        """
+        order = sorted(range(len(self.data)), key=lambda index: result_indexes[index])
+        self.positions[:] = [self.positions[index] for index in order]
+        self.data[:] = [self.data[index] for index in order]
@@ -0,0 +1,255 @@
+"""
+Record the DAL interactions of a scan and replay them later, without the hardware.
+
+Record a scan:
+    with record_scan("scan.rec"):
+        scan(positioner, readables, writables)
+Repeat the same scan from the recording, at the original speed:
+    with replay_scan("scan.rec", speed=1):
+        scan(positioner, readables, writables)
+"""
+import gzip
+import pickle
+import sys
+from collections import namedtuple, deque
+from contextlib import contextmanager
+from threading import Lock
+from time import time, sleep
+
+# The scan function shadows the scan module in the pyscan package.
+scan_module = sys.modules["pyscan.scan"]
+
+DAL_INTERACTION = namedtuple("DAL_INTERACTION", ["timestamp", "duration", "dal", "group_index", "method",
+                                                 "parameters", "result", "error"])
+
+# Scan module DALs that are recorded, by name.
+recorded_dals = ["EPICS_WRITER", "EPICS_READER", "EPICS_MONITOR", "BS_READER", "FUNCTION_PROXY"]
+# DAL methods that read or write values. Other methods are not recorded.
+recorded_methods = ["read", "read_cached_conditions", "set_and_match", "write", "wait_for", "wait_for_settling"]
+# Methods whose parameters have to match the recording when replayed.
+write_methods = ["set_and_match", "write"]
+
+
+def _describe_parameters(parameters):
+    """
+    Convert the parameters to a picklable description. Functions (predicates, function readables) are not stored.
+    """
+    if isinstance(parameters, (list, tuple)):
+        return [_describe_parameters(x) for x in parameters]
+    elif isinstance(parameters, dict):
+        return dict((key, _describe_parameters(value)) for key, value in parameters.items())
+    elif hasattr(parameters, "identifier"):
+        return parameters.identifier
+    elif callable(parameters):
+        return None
+
+    return parameters
+
+
+class DalRecorder(object):
+    """
+    Write the DAL interactions to a gzip compressed stream of pickled DAL_INTERACTION.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.start_time = time()
+        self.group_counters = dict((dal, 0) for dal in recorded_dals)
+
+        self._file = gzip.open(filename, "wb")
+        self._lock = Lock()
+
+    def write(self, interaction):
+        with self._lock:
+            pickle.dump(interaction, self._file, pickle.HIGHEST_PROTOCOL)
+
+    def create_group(self, dal, dal_class, args, kwargs):
+        """
+        Instantiate the DAL group and wrap it, to record its interactions.
+        """
+        with self._lock:
+            group_index = self.group_counters[dal]
+            self.group_counters[dal] += 1
+
+        self.write(DAL_INTERACTION(time() - self.start_time, 0, dal, group_index, "__init__",
+                                   _describe_parameters([args, kwargs]), None, None))
+
+        return _RecordingGroup(self, dal, group_index, dal_class(*args, **kwargs))
+
+    def close(self):
+        self._file.close()
+
+
+class _RecordingGroup(object):
+    def __init__(self, recorder, dal, group_index, group):
+        self._recorder = recorder
+        self._dal = dal
+        self._group_index = group_index
+        self._group = group
+
+    def __getattr__(self, name):
+        attribute = getattr(self._group, name)
+        if name not in recorded_methods:
+            return attribute
+
+        def record_call(*args, **kwargs):
+            start_time = time()
+            result = None
+            error = None
+
+            try:
+                result = attribute(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = "%s: %s" % (type(e).__name__, e)
+                raise
+            finally:
+                self._recorder.write(DAL_INTERACTION(start_time - self._recorder.start_time, time() - start_time,
+                                                     self._dal, self._group_index, name,
+                                                     _describe_parameters([args, kwargs]), result, error))
+
+        return record_call
+
+
+class DalPlayer(object):
+    """
+    Serve the recorded DAL interactions back to the scan.
+    """
+
+    def __init__(self, filename, speed=None):
+        """
+        :param filename: Recording to replay.
+        :param speed: Speed factor of the replay: 1 waits the original duration of each DAL call, 10 replays
+                      10 times faster. None does not wait at all.
+        """
+        self.speed = speed
+        self.group_counters = dict((dal, 0) for dal in recorded_dals)
+        self.interactions = {}
+
+        for interaction in read_recording(filename):
+            if interaction.method != "__init__":
+                key = (interaction.dal, interaction.group_index)
+                self.interactions.setdefault(key, deque()).append(interaction)
+
+        self._lock = Lock()
+
+    def create_group(self, dal, dal_class, args, kwargs):
+        with self._lock:
+            group_index = self.group_counters[dal]
+            self.group_counters[dal] += 1
+
+        return _ReplayGroup(self, dal, group_index)
+
+    def replay(self, dal, group_index, method, args, kwargs):
+        """
+        Return the result of the next recorded interaction of the group.
+        :raise ValueError if the scan does not match the recording.
+        """
+        with self._lock:
+            group_interactions = self.interactions.get((dal, group_index))
+            if not group_interactions:
+                raise ValueError("No more recorded interactions for %s group %d, method %s." %
+                                 (dal, group_index, method))
+
+            interaction = group_interactions.popleft()
+
+        if interaction.method != method:
+            raise ValueError("Replay diverged from the recording on %s group %d: expected method %s, got %s." %
+                             (dal, group_index, interaction.method, method))
+
+        if method in write_methods and interaction.parameters != _describe_parameters([args, kwargs]):
+            raise ValueError("Replay diverged from the recording on %s group %d: expected parameters %s, got %s." %
+                             (dal, group_index, interaction.parameters, _describe_parameters([args, kwargs])))
+
+        if self.speed:
+            sleep(interaction.duration / self.speed)
+
+        if interaction.error:
+            raise ValueError("Recorded error: %s" % interaction.error)
+
+        return interaction.result
+
+
+class _ReplayGroup(object):
+    def __init__(self, player, dal, group_index):
+        self._player = player
+        self._dal = dal
+        self._group_index = group_index
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        if name not in recorded_methods:
+            raise AttributeError("Replayed %s groups do not support the method %s." % (self._dal, name))
+
+        def replay_call(*args, **kwargs):
+            return self._player.replay(self._dal, self._group_index, name, args, kwargs)
+
+        return replay_call
+
+
+def read_recording(filename):
+    """
+    Read all the interactions in the recording.
+    :param filename: Recording to read.
+    :return: List of DAL_INTERACTION, in the order they were recorded.
+    """
+    interactions = []
+
+    with gzip.open(filename, "rb") as recording_file:
+        while True:
+            try:
+                interactions.append(pickle.load(recording_file))
+            except EOFError:
+                break
+
+    return interactions
+
+
+@contextmanager
+def _replace_dals(group_factory):
+    original_dals = dict((dal, getattr(scan_module, dal)) for dal in recorded_dals)
+
+    def get_group_constructor(dal):
+        def create_group(*args, **kwargs):
+            return group_factory(dal, original_dals[dal], args, kwargs)
+        return create_group
+
+    for dal in recorded_dals:
+        setattr(scan_module, dal, get_group_constructor(dal))
+
+    try:
+        yield
+    finally:
+        for dal, dal_class in original_dals.items():
+            setattr(scan_module, dal, dal_class)
+
+
+@contextmanager
+def record_scan(filename):
+    """
+    Record all the DAL interactions of the scans executed in this context.
+    :param filename: File to write the recording to.
+    """
+    recorder = DalRecorder(filename)
+
+    try:
+        with _replace_dals(recorder.create_group):
+            yield recorder
+    finally:
+        recorder.close()
+
+
+@contextmanager
+def replay_scan(filename, speed=None):
+    """
+    Replace the DALs of the scans executed in this context with the recording. The scans have to be the same as the
+    recorded ones.
+    :param filename: Recording to replay.
+    :param speed: Speed factor of the replay: 1 for the original speed, None for no waiting at all.
+    """
+    player = DalPlayer(filename, speed)
+
+    with _replace_dals(player.create_group):
+        yield player
@@ -1,17 +1,51 @@
+from collections import OrderedDict
+from functools import partial
+from os import cpu_count
+from queue import Queue, Empty
+from threading import Thread
+from time import time, sleep
+
 from pyscan.dal import epics_dal, bsread_dal, function_dal
-from pyscan.dal.function_dal import FunctionProxy
+from pyscan import config
 from pyscan.scanner import Scanner
 from pyscan.scan_parameters import EPICS_PV, EPICS_CONDITION, BS_PROPERTY, BS_CONDITION, scan_settings, convert_input, \
-    FUNCTION_VALUE, FUNCTION_CONDITION, convert_conditions
-from pyscan.utils import convert_to_list, SimpleDataProcessor, ActionExecutor, compare_channel_value
+    FUNCTION_VALUE, FUNCTION_CONDITION, convert_conditions, register_protocol, CUSTOM_SOURCE_TYPES
+from pyscan.positioner.vector import VectorPositioner
+from pyscan.utils import convert_to_list, SimpleDataProcessor, ActionExecutor, compare_channel_value, \
+    restore_results_order
 
 # Instances to use.
 EPICS_WRITER = epics_dal.WriteGroupInterface
 EPICS_READER = epics_dal.ReadGroupInterface
+EPICS_MONITOR = epics_dal.MonitorGroupInterface
 BS_READER = bsread_dal.ReadGroupInterface
 FUNCTION_PROXY = function_dal.FunctionProxy
 DATA_PROCESSOR = SimpleDataProcessor
 ACTION_EXECUTOR = ActionExecutor
+# Group factories of the custom sources: {readable, writable or condition type: create_group}.
+CUSTOM_SOURCES = OrderedDict()
+
+
+def register_source(source_type, create_group, protocol=None, converter=None):
+    """
+    Register a custom data source, to be used for readables, writables or conditions without changing the scan.
+    :param source_type: Named tuple type of the readables, writables or conditions of the source. Conditions need the
+                        fields identifier, value, action and tolerance, like epics_condition.
+    :param create_group: Factory of the source group. Signature: def create_group(items), where items is the list
+                         of source_type instances used as readables, writables or conditions of the scan (a group is
+                         created for each). The group provides read(), returning a list with one value per item,
+                         and write(values) if used for writables. All the items are read in a single batch.
+    :param protocol: Protocol of the readables passed as strings, for example "sim" for "sim://NAME".
+    :param converter: Function converting the name after the protocol into a source_type instance.
+                      Default: source_type(name, name).
+    """
+    CUSTOM_SOURCES[source_type] = create_group
+
+    if source_type not in CUSTOM_SOURCE_TYPES:
+        CUSTOM_SOURCE_TYPES.append(source_type)
+
+    if protocol:
+        register_protocol(protocol, converter or (lambda name: source_type(name, name)))
 
 
 def scan(positioner, readables, writables=None, conditions=None, before_read=None, after_read=None, initialization=None,
@@ -23,9 +57,182 @@ def scan(positioner, readables, writables=None, conditions=None, before_read=Non
     return scanner_instance.discrete_scan()
 
 
+def iter_scan(positioner, readables, writables=None, conditions=None, before_read=None, after_read=None,
+              initialization=None, finalization=None, settings=None, data_processor=None, before_move=None,
+              after_move=None, buffer_size=None):
+    """
+    Same as scan, but yield a SCAN_RECORD (index, position, data, timing) for each position as soon as it is acquired.
+    Closing the generator (or breaking out of the loop) stops the scan and runs the finalization.
+    :param buffer_size: If set, the acquisition runs in a separate thread and up to buffer_size records are buffered
+                        while the consumer is busy. If None, the acquisition runs only when the next record is requested.
+    :return: Generator of SCAN_RECORD.
+    """
+    # Validate before the scanner connects to the devices.
+    if buffer_size is not None and buffer_size < 1:
+        raise ValueError("Buffer size must be a positive number, but %s was provided." % buffer_size)
+
+    # Initialize the scanner instance.
+    scanner_instance = scanner(positioner, readables, writables, conditions, before_read, after_read, initialization,
+                               finalization, settings, data_processor, before_move, after_move)
+
+    if buffer_size is None:
+        return scanner_instance.iter_scan()
+
+    return _buffered_iter_scan(scanner_instance, buffer_size)
+
+
+def sharded_scan(positioner, readables, writables=None, conditions=None, before_read=None, after_read=None,
+                 initialization=None, finalization=None, settings=None, data_processor=None, before_move=None,
+                 after_move=None, n_processes=None, n_shards=None):
+    """
+    Same as scan, but the positions are split into contiguous shards, scanned in parallel by a pool of processes.
+    Each process has its own DAL instances. The results are passed to the data processor in the positions order.
+    Only function writables can be used, since the shards are moved at the same time. The readables, writables,
+    conditions and actions are sent to the processes, so they need to be picklable (module level functions).
+    :param n_processes: Number of processes in the pool. Default: number of CPUs.
+    :param n_shards: Number of shards to split the positions into. Default: number of processes.
+    :return: Data of the scan.
+    """
+    writables = convert_input(convert_to_list(writables) or [])
+    readables = convert_input(convert_to_list(readables) or [])
+    conditions = convert_conditions(convert_to_list(conditions) or [])
+    settings = settings or scan_settings()
+
+    if any(not isinstance(writable, FUNCTION_VALUE) for writable in writables):
+        raise ValueError("Sharded scans can move only function writables, but %s were provided." % writables)
+
+    if hasattr(positioner, "update"):
+        raise ValueError("Adaptive positioners cannot be sharded, their positions depend on the acquired data.")
+
+    n_processes = n_processes or cpu_count() or 1
+    n_shards = n_shards or n_processes
+    if n_processes < 1 or n_shards < 1:
+        raise ValueError("Number of processes (%s) and shards (%s) must be positive." % (n_processes, n_shards))
+
+    positions = list(positioner.get_generator())
+    shard_size, n_larger_shards = divmod(len(positions), n_shards)
+    shards = []
+    shard_start = 0
+    for shard_index in range(n_shards):
+        shard_end = shard_start + shard_size + (1 if shard_index < n_larger_shards else 0)
+        if shard_end > shard_start:
+            shards.append(positions[shard_start:shard_end])
+        shard_start = shard_end
+
+    # The progress is reported by this process, for each completed shard.
+    shard_settings = settings._replace(progress_callback=_ignore_progress)
+
+    if not data_processor:
+        data_processor = DATA_PROCESSOR()
+
+    # Imported on first use, the process pool is needed only by sharded scans.
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Initialization and finalization are executed only once, in this process.
+    if initialization:
+        ACTION_EXECUTOR(convert_to_list(initialization)).execute(None)
+
+    try:
+        settings.progress_callback(0, len(positions))
+        n_completed_positions = 0
+
+        with ProcessPoolExecutor(max_workers=n_processes) as executor:
+            scan_shard = partial(_scan_shard, readables=readables, writables=writables, conditions=conditions,
+                                 before_read=before_read, after_read=after_read, before_move=before_move,
+                                 after_move=after_move, settings=shard_settings)
+
+            # The results are returned in the order of the shards.
+            for shard_positions, shard_data in executor.map(scan_shard, shards):
+                for position, position_data in zip(shard_positions, shard_data):
+                    data_processor.process(position, position_data)
+
+                n_completed_positions += len(shard_positions)
+                settings.progress_callback(n_completed_positions, len(positions))
+
+    finally:
+        if finalization:
+            ACTION_EXECUTOR(convert_to_list(finalization)).execute(None)
+
+    restore_results_order(positioner, data_processor)
+
+    return data_processor.get_data()
+
+
+def _ignore_progress(current_position, total_positions):
+    pass
+
+
+def _scan_shard(positions, readables, writables, conditions, before_read, after_read, before_move, after_move,
+                settings):
+    """
+    Scan the positions of a single shard.
+    :return: Tuple (positions, data).
+    """
+    data_processor = SimpleDataProcessor()
+    scan(VectorPositioner(positions), readables, writables, conditions, before_read, after_read,
+         settings=settings, data_processor=data_processor, before_move=before_move, after_move=after_move)
+
+    return data_processor.get_positions(), data_processor.get_data()
+
+
+# Marks the end of the acquisition in the buffered iter scan queue.
+_END_OF_SCAN = object()
+
+
+def _buffered_iter_scan(scanner_instance, buffer_size):
+    """
+    Run the scanner iter_scan in a separate thread, buffering the records in a bounded queue.
+    :param scanner_instance: Scanner to run.
+    :param buffer_size: Maximum number of records waiting for the consumer.
+    :return: Generator of SCAN_RECORD.
+    """
+    records = Queue(maxsize=buffer_size)
+    # Exception raised in the acquisition thread, re-raised in the consumer.
+    acquisition_error = []
+
+    def acquire():
+        try:
+            for record in scanner_instance.iter_scan():
+                records.put(record)
+        except Exception as e:
+            acquisition_error.append(e)
+        finally:
+            records.put(_END_OF_SCAN)
+
+    acquisition_thread = Thread(target=acquire, daemon=True)
+    acquisition_thread.start()
+
+    consumer_finished = False
+    try:
+        while True:
+            record = records.get()
+
+            if record is _END_OF_SCAN:
+                break
+
+            yield record
+
+        consumer_finished = True
+        if acquisition_error:
+            raise acquisition_error[0]
+
+    finally:
+        if not consumer_finished:
+            # The consumer stopped early - abort the scan and free the buffer until the acquisition stops.
+            scanner_instance.abort_scan()
+
+            while acquisition_thread.is_alive():
+                try:
+                    records.get(timeout=config.scan_pause_sleep_interval)
+                except Empty:
+                    pass
+
+        acquisition_thread.join()
+
+
 def scanner(positioner, readables, writables=None, conditions=None, before_read=None, after_read=None,
             initialization=None, finalization=None, settings=None, data_processor=None,
-            before_move=None, after_move=None):
+            before_move=None, after_move=None, stream_pool=None):
     # Allow a list or a single value to be passed. Initialize None values.
     writables = convert_input(convert_to_list(writables) or [])
     readables = convert_input(convert_to_list(readables) or [])
@@ -38,7 +245,7 @@ def scanner(positioner, readables, writables=None, conditions=None, before_read=
     finalization = convert_to_list(finalization) or []
     settings = settings or scan_settings()
 
-    bs_reader = _initialize_bs_dal(readables, conditions, settings.bs_read_filter)
+    bs_reader = _initialize_bs_dal(readables, conditions, settings.bs_read_filter, stream_pool)
     epics_writer, epics_pv_reader, epics_condition_reader = _initialize_epics_dal(writables,
                                                                                   readables,
                                                                                   conditions,
@@ -46,6 +253,8 @@ def scanner(positioner, readables, writables=None, conditions=None, before_read=
     function_writer, function_reader, function_condition = _initialize_function_dal(writables,
                                                                                     readables,
                                                                                     conditions)
+    custom_writers, custom_readers, custom_condition_readers = _initialize_custom_dal(writables, readables, conditions)
+    settler, settling_monitor = _initialize_settler(writables, settings)
 
     writables_order = [type(writable) for writable in writables]
 
@@ -61,68 +270,189 @@ def scanner(positioner, readables, writables=None, conditions=None, before_read=
         if function_writer:
             function_writer.write(function_values)
 
+        for source, custom_writer in custom_writers.items():
+            custom_writer.write([x for x, writable_source in zip(positions, writables_order)
+                                 if writable_source == source])
+
     # Order of value sources, needed to reconstruct the correct order of the result.
     readables_order = [type(readable) for readable in readables]
+    # The bs reader needs to be read also when only bs conditions are used.
+    readables_sources = set(readables_order + ([BS_PROPERTY] if bs_reader else []))
+    # Sources to acquire with the next read. On retries, only the sources with invalid values are acquired again.
+    sources_to_read = set(readables_sources)
+    # Last acquired values of each source.
+    source_values = {}
 
     # Read function needs to merge BS, PV, and function proxy data.
     def read_data():
-        bs_values = iter(bs_reader.read() if bs_reader else [])
-        epics_values = iter(epics_pv_reader.read() if epics_pv_reader else [])
-        function_values = iter(function_reader.read() if function_reader else [])
-
-        # Interleave the values correctly.
-        result = []
-        for source in readables_order:
-            if source == BS_PROPERTY:
-                next_result = next(bs_values)
-            elif source == EPICS_PV:
-                next_result = next(epics_values)
-            elif source == FUNCTION_VALUE:
-                next_result = next(function_values)
-            else:
-                raise ValueError("Unknown type of readable %s used." % source)
+        if BS_PROPERTY in sources_to_read:
+            source_values[BS_PROPERTY] = bs_reader.read() if bs_reader else []
+        if EPICS_PV in sources_to_read:
+            source_values[EPICS_PV] = epics_pv_reader.read() if epics_pv_reader else []
+        if FUNCTION_VALUE in sources_to_read:
+            source_values[FUNCTION_VALUE] = function_reader.read() if function_reader else []
 
-            # We flatten the result, whenever possible.
-            if isinstance(next_result, list) and source != FUNCTION_VALUE:
-                result.extend(next_result)
-            else:
-                result.append(next_result)
+        # Custom sources are read in a single batch per source.
+        for source, custom_reader in custom_readers.items():
+            if source in sources_to_read:
+                source_values[source] = custom_reader.read()
+
+        result = _merge_readables_values(readables_order, source_values)
+
+        # Unless the validation finds invalid values, all sources are acquired with the next read.
+        sources_to_read.update(readables_sources)
 
         return result
 
     # Order of value sources, needed to reconstruct the correct order of the result.
     conditions_order = [type(condition) for condition in conditions]
-
-    # Validate function needs to validate both BS, PV, and function proxy data.
-    def validate_data(current_position, data):
-        bs_values = iter(bs_reader.read_cached_conditions() if bs_reader else [])
-        epics_values = iter(epics_condition_reader.read() if epics_condition_reader else [])
-        function_values = iter(function_condition.read() if function_condition else [])
+    # Number of times each condition was not met.
+    condition_failures = OrderedDict((condition.identifier, 0) for condition in conditions)
+    # Indexes of the conditions, with a wait action, that were not met in the last validation.
+    conditions_to_wait_for = []
+    # Indexes of the epics conditions, in the same order as the values of the epics condition reader.
+    epics_conditions_indexes = [index for index, source in enumerate(conditions_order) if source == EPICS_CONDITION]
+    # Indexes of the function conditions, in the same order as the values of the function condition reader.
+    function_conditions_indexes = [index for index, source in enumerate(conditions_order)
+                                   if source == FUNCTION_CONDITION]
+
+    # Validate the conditions of the provided sources.
+    def validate_conditions(sources):
+        bs_values = iter(bs_reader.read_cached_conditions() if bs_reader and BS_CONDITION in sources else [])
+        epics_values = iter(epics_condition_reader.read()
+                            if epics_condition_reader and EPICS_CONDITION in sources else [])
+        function_values = iter(function_condition.read() if function_condition and FUNCTION_CONDITION in sources
+                               else [])
+        custom_values = dict((source, iter(custom_condition_reader.read()))
+                             for source, custom_condition_reader in custom_condition_readers.items()
+                             if source in sources)
+
+        del conditions_to_wait_for[:]
 
         for index, source in enumerate(conditions_order):
+            # Conditions of this source are verified at another time.
+            if source not in sources:
+                continue
+
             if source == BS_CONDITION:
                 value = next(bs_values)
             elif source == EPICS_CONDITION:
                 value = next(epics_values)
             elif source == FUNCTION_CONDITION:
                 value = next(function_values)
+            elif source in custom_values:
+                value = next(custom_values[source])
             else:
                 raise ValueError("Unknown type of condition %s used." % source)
 
             # Function conditions are self contained.
             if source == FUNCTION_CONDITION:
-                if not value:
-                    raise ValueError("Function condition %s returned False." % conditions[index].identifier)
+                if value:
+                    continue
+                error_message = "Function condition %s returned False." % conditions[index].identifier
             else:
                 expected_value = conditions[index].value
                 tolerance = conditions[index].tolerance
 
-                if not compare_channel_value(value, expected_value, tolerance):
-                    raise ValueError("Condition %s, expected value %s, actual value %s, tolerance %s." %
-                                     (conditions[index].identifier, expected_value, value, tolerance))
+                if compare_channel_value(value, expected_value, tolerance):
+                    continue
+                error_message = "Condition %s, expected value %s, actual value %s, tolerance %s." % \
+                                (conditions[index].identifier, expected_value, value, tolerance)
+
+            condition_failures[conditions[index].identifier] += 1
+
+            if conditions[index].action == "Abort":
+                raise ValueError(error_message)
+
+            conditions_to_wait_for.append(index)
+
+        # BS conditions invalidate only the values from the same bs message.
+        # The other conditions describe the state of the machine at the time of the read: all values are invalid.
+        if conditions_to_wait_for:
+            sources_to_read.clear()
+            if all(conditions_order[index] == BS_CONDITION for index in conditions_to_wait_for):
+                sources_to_read.add(BS_PROPERTY)
+            else:
+                sources_to_read.update(readables_sources)
+
+        return not conditions_to_wait_for
+
+    # Wait until the conditions that were not met are met again. BS conditions cannot be waited for.
+    def wait_for_conditions(current_position):
+        if all(conditions_order[index] == BS_CONDITION for index in conditions_to_wait_for):
+            return False
+
+        timeout_timestamp = time() + settings.condition_wait_timeout
+
+        # Epics conditions are monitored - we are notified as soon as their values change.
+        epics_conditions = [(epics_conditions_indexes.index(index), conditions[index])
+                            for index in conditions_to_wait_for if conditions_order[index] == EPICS_CONDITION]
+        if epics_conditions:
+            def epics_conditions_met(values):
+                return all(compare_channel_value(values[value_index], condition.value, condition.tolerance)
+                           for value_index, condition in epics_conditions)
+
+            conditions_met = epics_condition_reader.wait_for(epics_conditions_met, timeout_timestamp - time())
+        else:
+            conditions_met = True
+
+        # Function conditions can only be polled. They are read through the function DAL, like in the validation.
+        waited_function_conditions = [function_conditions_indexes.index(index) for index in conditions_to_wait_for
+                                      if conditions_order[index] == FUNCTION_CONDITION]
+        while conditions_met and waited_function_conditions:
+            values = function_condition.read()
+            if all(values[value_index] for value_index in waited_function_conditions):
+                break
+
+            if time() > timeout_timestamp:
+                conditions_met = False
+                break
+            sleep(config.scan_condition_wait_poll_interval)
+
+        # Custom conditions are polled as well, reading all the conditions of the source at once.
+        for source, custom_condition_reader in custom_condition_readers.items():
+            source_conditions = [condition for condition in conditions if type(condition) == source]
+            waited_conditions = [(source_conditions.index(conditions[index]), conditions[index])
+                                 for index in conditions_to_wait_for if conditions_order[index] == source]
+
+            while conditions_met and waited_conditions:
+                values = custom_condition_reader.read()
+                if all(compare_channel_value(values[value_index], condition.value, condition.tolerance)
+                       for value_index, condition in waited_conditions):
+                    break
+
+                if time() > timeout_timestamp:
+                    conditions_met = False
+                    break
+                sleep(config.scan_condition_wait_poll_interval)
+
+        # The scan continues only for conditions with the 'Wait' action.
+        if not conditions_met:
+            abort_conditions = [conditions[index].identifier for index in conditions_to_wait_for
+                                if conditions[index].action == "WaitAndAbort"]
+            if abort_conditions:
+                raise ValueError("Conditions %s were not met within %s seconds." %
+                                 (abort_conditions, settings.condition_wait_timeout))
 
         return True
 
+    # BS conditions belong to the same message as the data, they can be verified only after the read.
+    custom_conditions = tuple(custom_condition_readers.keys())
+    if settings.conditions_first:
+        before_read_conditions = (EPICS_CONDITION, FUNCTION_CONDITION) + custom_conditions
+        after_read_conditions = (BS_CONDITION,)
+    else:
+        before_read_conditions = ()
+        after_read_conditions = (BS_CONDITION, EPICS_CONDITION, FUNCTION_CONDITION) + custom_conditions
+
+    # Validate function needs to validate both BS, PV, and function proxy data.
+    def validate_data(current_position, data):
+        return validate_conditions(after_read_conditions)
+
+    # Validate the conditions before the data is read.
+    def validate_before_read(current_position):
+        return validate_conditions(before_read_conditions)
+
     if not data_processor:
         data_processor = DATA_PROCESSOR()
 
@@ -156,16 +486,51 @@ def scanner(positioner, readables, writables=None, conditions=None, before_read=
     if finalization:
         finalization_executor = ACTION_EXECUTOR(finalization).execute
 
+    # The settling monitor is closed when the scan finishes, also on error.
+    if settling_monitor:
+        finalization_executor = _close_after_executor(finalization_executor, settling_monitor)
+
+    # Shared bs streams are released when the scan finishes, so the pool disconnects them after the last scan.
+    if bs_reader and stream_pool is not None:
+        finalization_executor = _close_after_executor(finalization_executor, bs_reader)
+
     scanner = Scanner(positioner=positioner, data_processor=data_processor, reader=read_data,
                       writer=write_data, before_measurement_executor=before_measurement_executor,
                       after_measurement_executor=after_measurement_executor,
                       initialization_executor=initialization_executor,
                       finalization_executor=finalization_executor, data_validator=validate_data, settings=settings,
-                      before_move_executor=before_move_executor, after_move_executor=after_move_executor)
+                      before_move_executor=before_move_executor, after_move_executor=after_move_executor,
+                      conditions_validator=validate_before_read, condition_failures=condition_failures,
+                      conditions_waiter=wait_for_conditions, settler=settler)
 
     return scanner
 
 
+def _merge_readables_values(readables_order, source_values):
+    """
+    Interleave the values of the sources in the order of the readables.
+    :param readables_order: Type of each readable.
+    :param source_values: Dictionary {readable type: values read from this source}
+    :return: Values in the order of the readables.
+    """
+    values = dict((source, iter(values)) for source, values in source_values.items())
+
+    result = []
+    for source in readables_order:
+        if source not in values:
+            raise ValueError("Unknown type of readable %s used." % source)
+
+        next_result = next(values[source])
+
+        # We flatten the result, whenever possible. Function and custom sources return one value per readable.
+        if isinstance(next_result, list) and source in (BS_PROPERTY, EPICS_PV):
+            result.extend(next_result)
+        else:
+            result.append(next_result)
+
+    return result
+
+
 def _initialize_epics_dal(writables, readables, conditions, settings):
     epics_writer = None
     if writables:
@@ -178,35 +543,99 @@ def _initialize_epics_dal(writables, readables, conditions, settings):
                                         timeout=settings.write_timeout)
 
     epics_readables_pv_names = [x.pv_name for x in filter(lambda x: isinstance(x, EPICS_PV), readables)]
-    epics_conditions_pv_names = [x.pv_name for x in filter(lambda x: isinstance(x, EPICS_CONDITION), conditions)]
+    epics_conditions = [x for x in conditions if isinstance(x, EPICS_CONDITION)]
+    epics_conditions_pv_names = [x.pv_name for x in epics_conditions]
 
     # Reading epics PV values.
     epics_pv_reader = None
     if epics_readables_pv_names:
         epics_pv_reader = EPICS_READER(pv_names=epics_readables_pv_names)
 
-    # Reading epics condition values.
+    # Reading epics condition values. Conditions we need to wait for are monitored.
     epics_condition_reader = None
-    if epics_conditions_pv_names:
+    if any(x.action != "Abort" for x in epics_conditions):
+        epics_condition_reader = EPICS_MONITOR(pv_names=epics_conditions_pv_names)
+    elif epics_conditions_pv_names:
         epics_condition_reader = EPICS_READER(pv_names=epics_conditions_pv_names)
 
     return epics_writer, epics_pv_reader, epics_condition_reader
 
 
-def _initialize_bs_dal(readables, conditions, filter_function):
+def _initialize_settler(writables, settings):
+    """
+    Create the settler waiting for the monitored readbacks to settle after each move.
+    :return: Tuple (settler, settling monitor). Both are None without a settling band.
+    """
+    # Without a settling band, the scanner waits the fixed settling time.
+    if settings.settling_band is None:
+        return None, None
+
+    # By default, monitor the readbacks of the epics writables.
+    monitor_pv_names = settings.settling_monitors or [x.readback_pv_name for x in writables if isinstance(x, EPICS_PV)]
+    if not monitor_pv_names:
+        raise ValueError("Adaptive settling needs PVs to monitor, but no settling_monitors or epics writables "
+                         "were provided.")
+
+    if len(settings.settling_band) not in (1, len(monitor_pv_names)):
+        raise ValueError("Settling band needs a single value or one value per monitored PV (%d), but %d were "
+                         "provided." % (len(monitor_pv_names), len(settings.settling_band)))
+
+    settling_monitor = EPICS_MONITOR(pv_names=monitor_pv_names)
+
+    def settle(current_position):
+        # If the values do not settle within the settling time, the scan continues anyway.
+        settling_monitor.wait_for_settling(settings.settling_band, settings.settling_window, settings.settling_time)
+
+    return settle, settling_monitor
+
+
+def _close_after_executor(executor, dal_group):
+    """
+    Wrap the executor, to close the DAL group after it is executed, also when it fails.
+    :param executor: Executor to wrap. Can be None.
+    :param dal_group: DAL group to close.
+    :return: Wrapped executor.
+    """
+    def execute_and_close(*args):
+        try:
+            if executor:
+                executor(*args)
+        finally:
+            dal_group.close()
+
+    return execute_and_close
+
+
+def _initialize_bs_dal(readables, conditions, filter_function, stream_pool=None):
     bs_readables = [x for x in filter(lambda x: isinstance(x, BS_PROPERTY), readables)]
     bs_conditions = [x for x in filter(lambda x: isinstance(x, BS_CONDITION), conditions)]
 
     bs_reader = None
     if bs_readables or bs_conditions:
-        bs_reader = BS_READER(properties=bs_readables, conditions=bs_conditions, filter_function=filter_function)
+        # Custom readers need to support the stream pool only when it is used.
+        stream_pool_parameter = {"stream_pool": stream_pool} if stream_pool is not None else {}
+        bs_reader = BS_READER(properties=bs_readables, conditions=bs_conditions, filter_function=filter_function,
+                              **stream_pool_parameter)
 
     return bs_reader
 
 
+def _initialize_custom_dal(writables, readables, conditions):
+    """
+    Create a group for each registered custom source used by the readables, writables or conditions.
+    :return: Writers, readers and condition readers, as dictionaries {source type: group}.
+    """
+    def create_groups(items):
+        return OrderedDict((source, create_group([x for x in items if type(x) == source]))
+                           for source, create_group in CUSTOM_SOURCES.items()
+                           if any(type(x) == source for x in items))
+
+    return create_groups(writables), create_groups(readables), create_groups(conditions)
+
+
 def _initialize_function_dal(writables, readables, conditions):
-    function_writer = FunctionProxy([x for x in writables if isinstance(x, FUNCTION_VALUE)])
-    function_reader = FunctionProxy([x for x in readables if isinstance(x, FUNCTION_VALUE)])
-    function_condition = FunctionProxy([x for x in conditions if isinstance(x, FUNCTION_CONDITION)])
+    function_writer = FUNCTION_PROXY([x for x in writables if isinstance(x, FUNCTION_VALUE)])
+    function_reader = FUNCTION_PROXY([x for x in readables if isinstance(x, FUNCTION_VALUE)])
+    function_condition = FUNCTION_PROXY([x for x in conditions if isinstance(x, FUNCTION_CONDITION)])
 
     return function_writer, function_reader, function_condition
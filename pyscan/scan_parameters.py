@@ -1,19 +1,36 @@
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 
 from pyscan import config
+from pyscan.metrics import ProgressReporter
 
 EPICS_PV = namedtuple("EPICS_PV", ["identifier", "pv_name", "readback_pv_name", "tolerance", "readback_pv_value"])
 EPICS_CONDITION = namedtuple("EPICS_CONDITION", ["identifier", "pv_name", "value", "action", "tolerance"])
 BS_PROPERTY = namedtuple("BS_PROPERTY", ["identifier", "property", "default_value"])
 BS_CONDITION = namedtuple("BS_CONDITION", ["identifier", "property", "value", "action", "tolerance", "default_value"])
 SCAN_SETTINGS = namedtuple("SCAN_SETTINGS", ["measurement_interval", "n_measurements",
-                                             "write_timeout", "settling_time", "progress_callback", "bs_read_filter"])
+                                             "write_timeout", "settling_time", "progress_callback", "bs_read_filter",
+                                             "conditions_first", "condition_wait_timeout", "acquisition_retry_limit",
+                                             "acquisition_retry_delay", "acquisition_retry_backoff",
+                                             "settling_band", "settling_window", "settling_monitors"])
 FUNCTION_VALUE = namedtuple("FUNCTION_VALUE", ["identifier", "call_function"])
 FUNCTION_CONDITION = namedtuple("FUNCTION_CONDITION", ["identifier", "call_function", "action"])
 
 # Used to determine if a parameter was passed or the default value is used.
 _default_value_placeholder = object()
 
+# Supported actions when a condition is not met.
+CONDITION_ACTIONS = ["Abort", "Wait", "WaitAndAbort"]
+
+
+def _validate_condition_action(action):
+    """
+    Check if the condition action is supported.
+    :param action: Action to check.
+    :raise ValueError if the action is not supported.
+    """
+    if action not in CONDITION_ACTIONS:
+        raise ValueError("Condition action %s is not supported. Supported actions: %s." % (action, CONDITION_ACTIONS))
+
 
 def function_value(call_function, name=None):
     """
@@ -37,7 +54,7 @@ def function_condition(call_function, name=None, action=None):
     Construct a tuple for condition checking function representation.
     :param call_function: Function to invoke.
     :param name: Name to assign to this function.
-    :param action: What to do then the return value is False. ('Abort' and 'WaitAndAbort' supporteds)
+    :param action: What to do then the return value is False. ('Abort', 'Wait' and 'WaitAndAbort' supported)
     :return: Tuple of ("identifier", "call_function", "action")
     """
     # If the name is not specified, use a counter to set the function name.
@@ -50,6 +67,8 @@ def function_condition(call_function, name=None, action=None):
     if not action:
         action = "Abort"
 
+    _validate_condition_action(action)
+
     return FUNCTION_CONDITION(identifier, call_function, action)
 function_condition.function_count = 0
 
@@ -83,7 +102,7 @@ def epics_condition(pv_name, value, action=None, tolerance=None):
     Construct a tuple for an epics condition representation.
     :param pv_name: Name of the PV to monitor.
     :param value: Value we expect the PV to be in.
-    :param action: What to do when the condition fails ('Abort' and 'WaitAndAbort' supporteds)
+    :param action: What to do when the condition fails ('Abort', 'Wait' and 'WaitAndAbort' supported)
     :param tolerance: Tolerance within which the condition needs to be.
     :return: Tuple of ("pv_name", "value", "action", "tolerance", "timeout")
     """
@@ -99,6 +118,8 @@ def epics_condition(pv_name, value, action=None, tolerance=None):
     if not action:
         action = "Abort"
 
+    _validate_condition_action(action)
+
     if not tolerance or tolerance < config.max_float_tolerance:
         tolerance = config.max_float_tolerance
 
@@ -124,13 +145,14 @@ def bs_property(name, default_value=_default_value_placeholder):
     return BS_PROPERTY(identifier, name, default_value)
 
 
-def bs_condition(name, value, tolerance=None, default_value=_default_value_placeholder):
+def bs_condition(name, value, tolerance=None, default_value=_default_value_placeholder, action=None):
     """
     Construct a tuple for bs condition property representation.
     :param name: Complete property name.
     :param value: Expected value.
     :param tolerance: Tolerance within which the condition needs to be.
     :param default_value: Default value of a condition, if not present in the bs stream.
+    :param action: What to do when the condition fails ('Abort', 'Wait' and 'WaitAndAbort' supported)
     :return:  Tuple of ("identifier", "property", "value", "action", "tolerance", "default_value")
     """
     identifier = name
@@ -144,8 +166,11 @@ def bs_condition(name, value, tolerance=None, default_value=_default_value_place
     if not tolerance or tolerance < config.max_float_tolerance:
         tolerance = config.max_float_tolerance
 
-    # We do not support other actions for BS conditions.
-    action = "Abort"
+    # the default action is Abort.
+    if not action:
+        action = "Abort"
+
+    _validate_condition_action(action)
 
     # We need this to allow the user to change the config at runtime.
     if default_value is _default_value_placeholder:
@@ -155,17 +180,32 @@ def bs_condition(name, value, tolerance=None, default_value=_default_value_place
 
 
 def scan_settings(measurement_interval=None, n_measurements=None, write_timeout=None, settling_time=None,
-                  progress_callback=None, bs_read_filter=None):
+                  progress_callback=None, bs_read_filter=None, conditions_first=False, condition_wait_timeout=None,
+                  acquisition_retry_limit=None, acquisition_retry_delay=None, acquisition_retry_backoff=None,
+                  settling_band=None, settling_window=None, settling_monitors=None):
     """
     Set the scan settings.
     :param measurement_interval: Default 0. Interval between each measurement, in case n_measurements is more than 1.
     :param n_measurements: Default 1. How many measurements to make at each position.
     :param write_timeout: How much time to wait in seconds for set_and_match operations on epics PVs.
     :param settling_time: How much time to wait in seconds after the motors have reached the desired destination.
-    :param progress_callback: Function to call after each scan step is completed. 
+                          With adaptive settling, the maximum time to wait for the monitored values to settle.
+    :param progress_callback: Function to call after each scan step is completed. Default: ProgressReporter, printing
+                              the progress, rate and ETA at most once per config.scan_progress_report_interval.
                               Signature: def callback(current_position, total_positions)
     :param bs_read_filter: Filter to apply to the bs read receive function, to filter incoming messages.
                               Signature: def callback(message)
+    :param conditions_first: Default False. Verify the epics and function conditions before reading the readables,
+                             so expensive readables are acquired only when the conditions are met.
+    :param condition_wait_timeout: Maximum time to wait in seconds for conditions with the 'Wait' or 'WaitAndAbort'
+                                   action to be met again.
+    :param acquisition_retry_limit: Maximum number of acquisitions at each position to get valid data.
+    :param acquisition_retry_delay: Time to wait in seconds before repeating the acquisition of invalid data.
+    :param acquisition_retry_backoff: Factor by which the retry delay grows after each retry at the same position.
+    :param settling_band: Enables adaptive settling. Maximum deviation (single value or one per monitored PV) the
+                          monitored values can have during the settling window to be considered settled.
+    :param settling_window: Time in seconds the monitored values have to stay within the settling band.
+    :param settling_monitors: PV names to monitor for adaptive settling. Default: readback PVs of the epics writables.
     :return: Scan settings named tuple.
     """
     if not measurement_interval or measurement_interval < 0:
@@ -177,18 +217,62 @@ def scan_settings(measurement_interval=None, n_measurements=None, write_timeout=
     if not write_timeout or write_timeout < 0:
         write_timeout = config.epics_default_set_and_match_timeout
 
-    if not settling_time or settling_time < 0:
+    if settling_band is not None:
+        settling_band = settling_band if isinstance(settling_band, list) else [settling_band]
+
+        if any(tolerance < 0 for tolerance in settling_band):
+            raise ValueError("Settling band cannot be negative, but %s was provided." % settling_band)
+
+        if not settling_time or settling_time < 0:
+            settling_time = config.epics_default_max_settling_time
+
+        if not settling_window or settling_window < 0:
+            settling_window = config.epics_default_settling_window
+
+        if settling_window > settling_time:
+            raise ValueError("Settling window (%s) cannot be longer than the maximum settling time (%s)."
+                             % (settling_window, settling_time))
+
+    elif not settling_time or settling_time < 0:
         settling_time = config.epics_default_settling_time
 
-    if not progress_callback:
-        def default_progress_callback(current_position, total_positions):
-            completed_percentage = 100.0 * (current_position / total_positions)
-            print("Scan: %.2f %% completed (%d/%d)" % (completed_percentage, current_position, total_positions))
+    if settling_monitors is not None:
+        settling_monitors = settling_monitors if isinstance(settling_monitors, list) else [settling_monitors]
+
+    if not condition_wait_timeout or condition_wait_timeout < 0:
+        condition_wait_timeout = config.scan_default_condition_wait_timeout
+
+    if not acquisition_retry_limit or acquisition_retry_limit < 1:
+        acquisition_retry_limit = config.scan_acquisition_retry_limit
 
-        progress_callback = default_progress_callback
+    if acquisition_retry_delay is None or acquisition_retry_delay < 0:
+        acquisition_retry_delay = config.scan_acquisition_retry_delay
+
+    if not acquisition_retry_backoff or acquisition_retry_backoff < 1:
+        acquisition_retry_backoff = config.scan_acquisition_retry_backoff
+
+    if not progress_callback:
+        progress_callback = ProgressReporter()
 
     return SCAN_SETTINGS(measurement_interval, n_measurements, write_timeout, settling_time, progress_callback,
-                         bs_read_filter)
+                         bs_read_filter, bool(conditions_first), condition_wait_timeout, acquisition_retry_limit,
+                         acquisition_retry_delay, acquisition_retry_backoff, settling_band, settling_window,
+                         settling_monitors)
+
+
+# Protocols of the readables passed as strings: {protocol: function converting the name after the protocol}.
+READABLE_PROTOCOLS = OrderedDict((("ca", epics_pv), ("bs", bs_property)))
+# Types of the registered custom sources, accepted by convert_input and convert_conditions as they are.
+CUSTOM_SOURCE_TYPES = []
+
+
+def register_protocol(protocol, converter):
+    """
+    Register a protocol for readables passed as strings, in the form "protocol://name".
+    :param protocol: Protocol name, without "://". Case insensitive.
+    :param converter: Function converting the name after the protocol into a readable. Signature: def converter(name)
+    """
+    READABLE_PROTOCOLS[protocol.lower()] = converter
 
 
 def convert_input(input_parameters):
@@ -200,7 +284,7 @@ def convert_input(input_parameters):
     converted_inputs = []
     for input in input_parameters:
         # Input already of correct type.
-        if isinstance(input, (EPICS_PV, BS_PROPERTY, FUNCTION_VALUE)):
+        if isinstance(input, (EPICS_PV, BS_PROPERTY, FUNCTION_VALUE) + tuple(CUSTOM_SOURCE_TYPES)):
             converted_inputs.append(input)
         # We need to convert it.
         elif isinstance(input, str):
@@ -209,16 +293,14 @@ def convert_input(input_parameters):
                 raise ValueError("Input cannot be an empty string.")
 
             if "://" in input:
-                # Epics PV!
-                if input.lower().startswith("ca://"):
-                    converted_inputs.append(epics_pv(input[5:]))
-                # bs_read property.
-                elif input.lower().startswith("bs://"):
-                    converted_inputs.append(bs_property(input[5:]))
+                protocol, name = input.split("://", 1)
+
                 # A new protocol we don't know about?
-                else:
-                    raise ValueError("Readable %s uses an unexpected protocol. "
-                                     "'ca://' and 'bs://' are supported." % input)
+                if protocol.lower() not in READABLE_PROTOCOLS:
+                    raise ValueError("Readable %s uses an unexpected protocol. %s are supported." %
+                                     (input, ", ".join("'%s://'" % x for x in READABLE_PROTOCOLS)))
+
+                converted_inputs.append(READABLE_PROTOCOLS[protocol.lower()](name))
             # No protocol specified, default is epics.
             else:
                 converted_inputs.append(epics_pv(input))
@@ -242,7 +324,7 @@ def convert_conditions(input_conditions):
     converted_inputs = []
     for input in input_conditions:
         # Input already of correct type.
-        if isinstance(input, (EPICS_CONDITION, BS_CONDITION, FUNCTION_CONDITION)):
+        if isinstance(input, (EPICS_CONDITION, BS_CONDITION, FUNCTION_CONDITION) + tuple(CUSTOM_SOURCE_TYPES)):
             converted_inputs.append(input)
         # Function call.
         elif callable(input):
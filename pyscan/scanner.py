@@ -1,8 +1,12 @@
+import asyncio
+from collections import OrderedDict, namedtuple
 from itertools import count
-from time import sleep
+from time import sleep, time
 
 from pyscan import config
+from pyscan.metrics import ScanMetrics
 from pyscan.scan_parameters import scan_settings
+from pyscan.utils import resolve_awaitable, get_n_positions, restore_results_order
 
 STATUS_INITIALIZED = "INITIALIZED"
 STATUS_RUNNING = "RUNNING"
@@ -10,6 +14,11 @@ STATUS_FINISHED = "FINISHED"
 STATUS_PAUSED = "PAUSED"
 STATUS_ABORTED = "ABORTED"
 
+# Record yielded by the scanner for each acquired position.
+SCAN_RECORD = namedtuple("SCAN_RECORD", ["index", "position", "data", "timing"])
+# Timestamp of the acquisition start, time spent moving, time spent settling and time spent reading.
+SCAN_TIMING = namedtuple("SCAN_TIMING", ["timestamp", "move_time", "settle_time", "read_time"])
+
 
 class Scanner(object):
     """
@@ -18,7 +27,8 @@ class Scanner(object):
 
     def __init__(self, positioner, data_processor, reader, writer=None, before_measurement_executor=None,
                  after_measurement_executor=None, initialization_executor=None, finalization_executor=None,
-                 data_validator=None, settings=None, before_move_executor=None, after_move_executor=None):
+                 data_validator=None, settings=None, before_move_executor=None, after_move_executor=None,
+                 conditions_validator=None, condition_failures=None, conditions_waiter=None, settler=None):
         """
         Initialize scanner.
         :param positioner: Positioner should provide a generator to get the positions to move to.
@@ -29,6 +39,11 @@ class Scanner(object):
         :param after_measurement_executor: Callbacks executor that executed after measurements.
         :param before_move_executor: Callbacks executor that executes before each move.
         :param after_move_executor: Callbacks executor that executes after each move.
+        :param conditions_validator: Validate the conditions before reading the data. Signature: def (position)
+        :param condition_failures: Dictionary with the number of failures of each condition, updated by the validators.
+        :param conditions_waiter: Wait for the conditions to be met before trying to read again. Returns False if
+                                  there was nothing to wait for. Signature: def (position)
+        :param settler: Wait for the positions to settle after each move. Signature: def (position)
         """
         self.positioner = positioner
         self.writer = writer
@@ -44,6 +59,15 @@ class Scanner(object):
 
         # If no data validator is provided, data is always valid.
         self.data_validator = data_validator or (lambda position, data: True)
+        # If no conditions validator is provided, the conditions are verified only by the data validator.
+        self.conditions_validator = conditions_validator or (lambda position: True)
+        self.condition_failures = condition_failures if condition_failures is not None else OrderedDict()
+        # If no conditions waiter is provided, the retry delay is used before trying again.
+        self.conditions_waiter = conditions_waiter or (lambda position: False)
+        # If no settler is provided, wait the fixed settling time.
+        self.settler = settler or (lambda position: sleep(self.settings.settling_time))
+        # Progress, rate, retries and latencies of the scan, readable from other threads.
+        self.metrics = ScanMetrics(self.condition_failures)
 
         self._user_abort_scan_flag = False
         self._user_pause_scan_flag = False
@@ -65,6 +89,21 @@ class Scanner(object):
     def get_status(self):
         return self._status
 
+    def get_condition_failures(self):
+        """
+        Number of times each condition failed since the scanner was created.
+        :return: Dictionary {condition identifier: number of failures}
+        """
+        return self.condition_failures
+
+    def get_metrics(self):
+        """
+        Metrics of the scan: progress, rate, ETA, retries, condition failures and latency histograms.
+        Can be called from any thread while the scan is running.
+        :return: SCAN_METRICS
+        """
+        return self.metrics.get_snapshot()
+
     def resume_scan(self):
         """
         Resume the scan.
@@ -100,20 +139,28 @@ class Scanner(object):
         :return: Single result (all channels).
         """
         n_current_acquisition = 0
+        retry_delay = self.settings.acquisition_retry_delay
         # Collect data until acquired data is valid or retry limit reached.
-        while n_current_acquisition < config.scan_acquisition_retry_limit:
-            single_measurement = self.reader()
+        while n_current_acquisition < self.settings.acquisition_retry_limit:
+            # Do not read the data if we already know the conditions are not met.
+            if self.conditions_validator(current_position):
+                single_measurement = self.reader()
 
-            # If the data is valid, break out of the loop.
-            if self.data_validator(current_position, single_measurement):
-                return single_measurement
+                # If the data is valid, break out of the loop.
+                if self.data_validator(current_position, single_measurement):
+                    return single_measurement
 
             n_current_acquisition += 1
-            sleep(config.scan_acquisition_retry_delay)
+            self.metrics.record_retry()
+
+            # If there are no conditions to wait for, wait before trying again.
+            if not self.conditions_waiter(current_position):
+                sleep(retry_delay)
+                retry_delay *= self.settings.acquisition_retry_backoff
         # Could not read the data within the retry limit.
         else:
             raise Exception("Number of maximum read attempts (%d) exceeded. Cannot read valid data at position %s."
-                            % (config.scan_acquisition_retry_limit, current_position))
+                            % (self.settings.acquisition_retry_limit, current_position))
 
     def _read_and_process_data(self, current_position):
         """
@@ -127,9 +174,15 @@ class Scanner(object):
 
         # Multiple acquisitions.
         else:
+            # Data processors can receive each measurement as soon as it is acquired.
+            process_measurement = getattr(self.data_processor, "process_measurement", None)
+
             result = []
             for n_measurement in range(self.settings.n_measurements):
-                result.append(self._perform_single_read(current_position))
+                measurement = self._perform_single_read(current_position)
+                if process_measurement:
+                    process_measurement(current_position, measurement)
+                result.append(measurement)
                 sleep(self.settings.measurement_interval)
 
         # Process only valid data.
@@ -137,33 +190,52 @@ class Scanner(object):
 
         return result
 
-    def discrete_scan(self):
+    def _get_n_positions(self):
         """
-        Perform a discrete scan - set a position, read, continue. Return value at the end.
+        Number of positions in the scan. Adaptive positioners report the maximum number of positions.
+        """
+        return get_n_positions(self.positioner)
+
+    def iter_scan(self):
+        """
+        Perform a discrete scan, yielding the record of each position as soon as it is acquired.
+        Closing the generator stops the scan after the current position; the finalization executor is still executed.
+        :return: Generator of SCAN_RECORD.
         """
         try:
             self._status = STATUS_RUNNING
 
             # Get how many positions we have in total.
-            n_of_positions = sum(1 for _ in self.positioner.get_generator())
+            n_of_positions = self._get_n_positions()
+            self.metrics.start(n_of_positions)
             # Report the 0% completed.
             self.settings.progress_callback(0, n_of_positions)
 
+            # Adaptive positioners choose the next positions based on the acquired data.
+            positioner_update = getattr(self.positioner, "update", None)
+
             # Set up the experiment.
             if self.initialization_executor:
                 self.initialization_executor(self)
 
+            position_index = 0
             for position_index, next_positions in zip(count(1), self.positioner.get_generator()):
                 # Execute before moving to the next position.
                 if self.before_move_executor:
                     self.before_move_executor(next_positions)
 
+                move_start_time = time()
+
                 # Position yourself before reading.
                 if self.writer:
                     self.writer(next_positions)
 
-                # Settling time, wait after positions has been reached.
-                sleep(self.settings.settling_time)
+                move_time = time() - move_start_time
+
+                # Wait for the positions to settle after they have been reached.
+                self.settler(next_positions)
+
+                settle_time = time() - move_start_time - move_time
 
                 # Execute the after move executor.
                 if self.after_move_executor:
@@ -173,29 +245,292 @@ class Scanner(object):
                 if self.before_measurement_executor:
                     self.before_measurement_executor(next_positions)
 
+                read_start_time = time()
+
                 # Read and process the data in the current position.
                 position_data = self._read_and_process_data(next_positions)
 
+                read_time = time() - read_start_time
+
+                if positioner_update:
+                    positioner_update(next_positions, position_data)
+
                 # Post reading callbacks.
                 if self.after_measurement_executor:
                     self.after_measurement_executor(next_positions)
 
+                timing = SCAN_TIMING(read_start_time, move_time, settle_time, read_time)
+                self.metrics.record_position(timing)
+
                 # Report about the progress.
                 self.settings.progress_callback(position_index, n_of_positions)
 
+                yield SCAN_RECORD(position_index - 1, next_positions, position_data, timing)
+
                 # Verify is the scan should continue.
                 self._verify_scan_status()
+
+            # Adaptive positioners can finish before reaching the maximum number of positions.
+            if position_index < n_of_positions:
+                self.metrics.finish()
+                self.settings.progress_callback(position_index, position_index)
+
+        except GeneratorExit:
+            # The consumer closed the generator - the scan was stopped before the end.
+            self._status = STATUS_ABORTED
+            raise
+
         finally:
+            # The finalization is not part of the scan time.
+            self.metrics.stop()
+
             # Clean up after yourself.
             if self.finalization_executor:
                 self.finalization_executor(self)
 
+            # Data processors writing to files are flushed and closed also when the scan fails.
+            finalize_data_processor = getattr(self.data_processor, "finalize", None)
+            if finalize_data_processor:
+                finalize_data_processor(self)
+
             # If the scan was aborted we do not change the status to finished.
             if self._status != STATUS_ABORTED:
                 self._status = STATUS_FINISHED
 
+    def discrete_scan(self):
+        """
+        Perform a discrete scan - set a position, read, continue. Return value at the end.
+        """
+        for _ in self.iter_scan():
+            pass
+
+        # Optimized paths visit the positions in a different order than provided.
+        restore_results_order(self.positioner, self.data_processor)
+
         return self.data_processor.get_data()
 
     def continuous_scan(self):
         # TODO: Needs implementation.
         pass
+
+
+class AsyncScanner(Scanner):
+    """
+    Perform discrete scans in an asyncio event loop.
+    The writer, reader, validators, settler and executors can be plain functions or coroutine functions.
+    Cancelling the task running the scan aborts the scan; the finalization executor is still executed.
+    """
+
+    def __init__(self, positioner, data_processor, reader, writer=None, before_measurement_executor=None,
+                 after_measurement_executor=None, initialization_executor=None, finalization_executor=None,
+                 data_validator=None, settings=None, before_move_executor=None, after_move_executor=None,
+                 conditions_validator=None, condition_failures=None, conditions_waiter=None, settler=None):
+        super(AsyncScanner, self).__init__(positioner, data_processor, reader, writer, before_measurement_executor,
+                                           after_measurement_executor, initialization_executor,
+                                           finalization_executor, data_validator, settings, before_move_executor,
+                                           after_move_executor, conditions_validator, condition_failures,
+                                           conditions_waiter, settler)
+
+        # If no settler is provided, wait the fixed settling time without blocking the event loop.
+        self.settler = settler or (lambda position: asyncio.sleep(self.settings.settling_time))
+
+    async def _verify_scan_status(self):
+        """
+        Check if the conditions to pause or abort the scan are met.
+        :raise Exception in case the conditions are met.
+        """
+        if self._user_abort_scan_flag:
+            self._status = STATUS_ABORTED
+            raise Exception("User aborted scan.")
+
+        if self._user_pause_scan_flag:
+            self._status = STATUS_PAUSED
+
+            while self._user_pause_scan_flag:
+                if self._user_abort_scan_flag:
+                    self._status = STATUS_ABORTED
+                    raise Exception("User aborted scan in pause.")
+                await asyncio.sleep(config.scan_pause_sleep_interval)
+
+            self._status = STATUS_RUNNING
+
+    async def _perform_single_read(self, current_position):
+        """
+        Read a single result from the channel.
+        :param current_position: Current position, passed to the validator.
+        :return: Single result (all channels).
+        """
+        n_current_acquisition = 0
+        retry_delay = self.settings.acquisition_retry_delay
+        while n_current_acquisition < self.settings.acquisition_retry_limit:
+            if await resolve_awaitable(self.conditions_validator(current_position)):
+                single_measurement = await resolve_awaitable(self.reader())
+
+                if await resolve_awaitable(self.data_validator(current_position, single_measurement)):
+                    return single_measurement
+
+            n_current_acquisition += 1
+            self.metrics.record_retry()
+
+            if not await resolve_awaitable(self.conditions_waiter(current_position)):
+                await asyncio.sleep(retry_delay)
+                retry_delay *= self.settings.acquisition_retry_backoff
+        else:
+            raise Exception("Number of maximum read attempts (%d) exceeded. Cannot read valid data at position %s."
+                            % (self.settings.acquisition_retry_limit, current_position))
+
+    async def _read_and_process_data(self, current_position):
+        """
+        Read the data and pass it on only if valid.
+        :param current_position: Current position reached by the scan.
+        :return: Current position scan data.
+        """
+        if self.settings.n_measurements == 1:
+            result = await self._perform_single_read(current_position)
+
+        else:
+            process_measurement = getattr(self.data_processor, "process_measurement", None)
+
+            result = []
+            for n_measurement in range(self.settings.n_measurements):
+                measurement = await self._perform_single_read(current_position)
+                if process_measurement:
+                    process_measurement(current_position, measurement)
+                result.append(measurement)
+                await asyncio.sleep(self.settings.measurement_interval)
+
+        self.data_processor.process(current_position, result)
+
+        return result
+
+    def _get_positions(self):
+        """
+        Number (starting at 1) and value of each position. Positioners that wait between the positions (TimePositioner)
+        provide an async iterator, so they do not block the event loop.
+        :return: Async iterator of tuples (position number, position).
+        """
+        return AsyncPositions(self.positioner)
+
+    def iter_scan(self):
+        raise ValueError("The async scanner cannot be iterated. "
+                         "Use discrete_scan(record_callback) to receive the record of each position.")
+
+    async def discrete_scan(self, record_callback=None):
+        """
+        Perform a discrete scan - set a position, read, continue. Return value at the end.
+        :param record_callback: Called with the SCAN_RECORD of each position as soon as it is acquired.
+                                Signature: def (record)
+        """
+        try:
+            self._status = STATUS_RUNNING
+
+            n_of_positions = self._get_n_positions()
+            self.metrics.start(n_of_positions)
+            self.settings.progress_callback(0, n_of_positions)
+
+            positioner_update = getattr(self.positioner, "update", None)
+
+            if self.initialization_executor:
+                await resolve_awaitable(self.initialization_executor(self))
+
+            position_index = 0
+            async for position_index, next_positions in self._get_positions():
+                if self.before_move_executor:
+                    await resolve_awaitable(self.before_move_executor(next_positions))
+
+                move_start_time = time()
+
+                if self.writer:
+                    await resolve_awaitable(self.writer(next_positions))
+
+                move_time = time() - move_start_time
+
+                await resolve_awaitable(self.settler(next_positions))
+
+                settle_time = time() - move_start_time - move_time
+
+                if self.after_move_executor:
+                    await resolve_awaitable(self.after_move_executor(next_positions))
+
+                if self.before_measurement_executor:
+                    await resolve_awaitable(self.before_measurement_executor(next_positions))
+
+                read_start_time = time()
+
+                position_data = await self._read_and_process_data(next_positions)
+
+                read_time = time() - read_start_time
+
+                if positioner_update:
+                    positioner_update(next_positions, position_data)
+
+                if self.after_measurement_executor:
+                    await resolve_awaitable(self.after_measurement_executor(next_positions))
+
+                timing = SCAN_TIMING(read_start_time, move_time, settle_time, read_time)
+                self.metrics.record_position(timing)
+
+                self.settings.progress_callback(position_index, n_of_positions)
+
+                if record_callback:
+                    record_callback(SCAN_RECORD(position_index - 1, next_positions, position_data, timing))
+
+                await self._verify_scan_status()
+
+            if position_index < n_of_positions:
+                self.metrics.finish()
+                self.settings.progress_callback(position_index, position_index)
+
+        except asyncio.CancelledError:
+            # The task running the scan was cancelled.
+            self._status = STATUS_ABORTED
+            raise
+
+        finally:
+            self.metrics.stop()
+
+            if self.finalization_executor:
+                await resolve_awaitable(self.finalization_executor(self))
+
+            finalize_data_processor = getattr(self.data_processor, "finalize", None)
+            if finalize_data_processor:
+                finalize_data_processor(self)
+
+            if self._status != STATUS_ABORTED:
+                self._status = STATUS_FINISHED
+
+        restore_results_order(self.positioner, self.data_processor)
+
+        return self.data_processor.get_data()
+
+
+class AsyncPositions(object):
+    """
+    Async iterator of the number (starting at 1) and value of each position of the positioner. A class instead of an
+    async generator, since async generators are not available before Python 3.6.
+    """
+
+    def __init__(self, positioner):
+        """
+        :param positioner: Positioner of the scan. Its async iterator (get_async_iterator) is used if available.
+        """
+        get_async_iterator = getattr(positioner, "get_async_iterator", None)
+
+        self.async_positions = get_async_iterator() if get_async_iterator else None
+        self.positions = None if get_async_iterator else positioner.get_generator()
+        self.position_index = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.async_positions is not None:
+            position = await self.async_positions.__anext__()
+        else:
+            try:
+                position = next(self.positions)
+            except StopIteration:
+                raise StopAsyncIteration
+
+        self.position_index += 1
+        return self.position_index, position
@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from threading import Condition, Thread
+from time import time
+
+from pyscan.dal.bsread_dal import StreamPool
+from pyscan.scan import scanner
+from pyscan.scan_parameters import EPICS_PV, FUNCTION_VALUE, convert_input, CUSTOM_SOURCE_TYPES
+from pyscan.utils import convert_to_list
+
+
+class ScanJob(object):
+    """
+    Scan submitted to the scheduler, running in its own thread.
+    """
+
+    def __init__(self, name, scanner_instance, writable_keys):
+        """
+        :param name: Name of the scan, for reporting.
+        :param scanner_instance: Scanner to run.
+        :param writable_keys: Keys of the writables to lock while the scan runs.
+        """
+        self.name = name
+        self.scanner = scanner_instance
+        self.writable_keys = writable_keys
+
+        # Time spent waiting for other scans to release the writables.
+        self.wait_time = None
+        self.result = None
+        self.error = None
+        self.thread = None
+
+    def join(self, timeout=None):
+        """
+        Wait for the scan to complete.
+        :param timeout: Maximum time to wait, in seconds.
+        :return: Data of the scan.
+        :raise The exception raised by the scan.
+        """
+        self.thread.join(timeout)
+
+        if self.thread.is_alive():
+            raise ValueError("Scan '%s' did not complete within %s seconds." % (self.name, timeout))
+
+        if self.error:
+            raise self.error
+
+        return self.result
+
+    def is_running(self):
+        return self.thread.is_alive()
+
+    def get_wait_time(self):
+        """
+        Time the scan waited for other scans to release its writables. None if the scan did not start yet.
+        """
+        return self.wait_time
+
+    def abort_scan(self):
+        self.scanner.abort_scan()
+
+
+class ScanScheduler(object):
+    """
+    Run multiple scans concurrently in this process. Scans with overlapping writables run one after the other, in the
+    order they were submitted.
+    """
+
+    def __init__(self, share_streams=True):
+        """
+        :param share_streams: Share the bs streams with the same connection parameters between the scans.
+                              Epics channels are always shared by pyepics within the process.
+        """
+        self.stream_pool = StreamPool() if share_streams else None
+        self.jobs = []
+
+        self._locked_writables = set()
+        self._writables_released = Condition()
+        # Writable keys of the scans waiting for their writables, in the order of submission.
+        self._lock_requests = []
+
+    @staticmethod
+    def _get_writable_key(writable):
+        if isinstance(writable, EPICS_PV):
+            return writable.pv_name
+        elif isinstance(writable, FUNCTION_VALUE):
+            return writable.call_function
+        elif type(writable) in CUSTOM_SOURCE_TYPES:
+            return type(writable), writable.identifier
+        else:
+            raise ValueError("Unknown type of writable %s used." % type(writable))
+
+    def _request_writables(self, writable_keys):
+        """
+        Queue the request for the writables. Called at submission, so the requests are granted in submission order.
+        """
+        with self._writables_released:
+            self._lock_requests.append(writable_keys)
+
+    def _is_request_blocked(self, writable_keys):
+        """
+        Check if the writables are used by another scan, or needed by a scan submitted earlier.
+        A scan waiting for several writables is therefore not starved by later scans that need only some of them.
+        """
+        if self._locked_writables.intersection(writable_keys):
+            return True
+
+        for earlier_writable_keys in self._lock_requests:
+            if earlier_writable_keys is writable_keys:
+                return False
+
+            if earlier_writable_keys.intersection(writable_keys):
+                return True
+
+        return False
+
+    def _lock_writables(self, writable_keys):
+        """
+        Lock all the writables at once, waiting until none of them is used by another scan. The requested writables
+        are granted in the order the scans were submitted.
+        """
+        with self._writables_released:
+            while self._is_request_blocked(writable_keys):
+                self._writables_released.wait()
+
+            # Requests with equal writables are different requests.
+            self._lock_requests[:] = [x for x in self._lock_requests if x is not writable_keys]
+            self._locked_writables.update(writable_keys)
+            # Later requests can be waiting only for this request to be granted.
+            self._writables_released.notify_all()
+
+    def _release_writables(self, writable_keys):
+        with self._writables_released:
+            self._locked_writables.difference_update(writable_keys)
+            self._writables_released.notify_all()
+
+    def _run_job(self, job):
+        wait_start_time = time()
+        self._lock_writables(job.writable_keys)
+        job.wait_time = time() - wait_start_time
+
+        try:
+            job.result = job.scanner.discrete_scan()
+        except Exception as e:
+            job.error = e
+        finally:
+            self._release_writables(job.writable_keys)
+
+    def submit(self, positioner, readables, writables=None, conditions=None, before_read=None, after_read=None,
+               initialization=None, finalization=None, settings=None, data_processor=None, before_move=None,
+               after_move=None, name=None):
+        """
+        Start a scan. Same parameters as scan(). The scan waits for other scans using the same writables to complete.
+        :param name: Name of the scan. Default: scan_N, where N is the number of submitted scans.
+        :return: ScanJob of the submitted scan.
+        """
+        writables = convert_input(convert_to_list(writables) or [])
+        writable_keys = set(self._get_writable_key(writable) for writable in writables)
+
+        scanner_instance = scanner(positioner, readables, writables, conditions, before_read, after_read,
+                                   initialization, finalization, settings, data_processor, before_move, after_move,
+                                   stream_pool=self.stream_pool)
+
+        job = ScanJob(name or "scan_%d" % len(self.jobs), scanner_instance, writable_keys)
+        job.thread = Thread(target=self._run_job, args=(job,), daemon=True)
+        self.jobs.append(job)
+
+        self._request_writables(writable_keys)
+
+        job.thread.start()
+
+        return job
+
+    def wait(self, timeout=None):
+        """
+        Wait for all the submitted scans to complete.
+        :param timeout: Maximum time to wait for each scan, in seconds.
+        :return: List with the data of each scan, in the order of submission.
+        """
+        return [job.join(timeout) for job in self.jobs]
+
+    def get_wait_times(self):
+        """
+        Time each scan waited for its writables.
+        :return: Dictionary {scan name: wait time}
+        """
+        return OrderedDict((job.name, job.get_wait_time()) for job in self.jobs)
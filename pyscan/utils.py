@@ -2,8 +2,6 @@ import inspect
 from collections import OrderedDict
 from time import sleep
 
-from epics.pv import PV
-
 from pyscan import config
 from pyscan.scan_parameters import convert_input
 
@@ -47,15 +45,23 @@ def compare_channel_value(current_value, expected_value, tolerance=0.0):
         return compare_value(current_value)
 
 
-def connect_to_pv(pv_name, n_connection_attempts=3):
+def connect_to_pv(pv_name, n_connection_attempts=3, auto_monitor=False):
     """
     Start a connection to a PV.
     :param pv_name: PV name to connect to.
     :param n_connection_attempts: How many times you should try to connect before raising an exception.
+    :param auto_monitor: Subscribe to the PV value changes.
     :return: PV object.
     :raises ValueError if cannot connect to PV.
     """
-    pv = PV(pv_name, auto_monitor=False)
+    if config.epics_simulation:
+        from pyscan.dal.sim_dal import simulation
+        return simulation.get_pv(pv_name)
+
+    # Imported on first use, so scans without epics PVs do not need pyepics (and libca).
+    from epics.pv import PV
+
+    pv = PV(pv_name, auto_monitor=auto_monitor)
     for i in range(n_connection_attempts):
         if pv.connect():
             return pv
@@ -103,6 +109,47 @@ def convert_to_position_list(axis_list):
     return [list(positions) for positions in zip(*axis_list)]
 
 
+def get_first_readable_value(data):
+    """
+    Get the value of the first readable from the data acquired at a position.
+    :param data: Data acquired at a position.
+    :return: Value of the first readable. With multiple measurements, the mean of the measured values.
+    """
+    # Multiple measurements - average the first readable.
+    if isinstance(data[0], list):
+        return sum(measurement[0] for measurement in data) / len(data)
+
+    return data[0]
+
+
+def get_n_positions(positioner):
+    """
+    Number of positions of the positioner. Adaptive positioners report the maximum number of positions.
+    :param positioner: Positioner to inspect.
+    :return: Number of positions.
+    """
+    if hasattr(positioner, "get_n_positions"):
+        return positioner.get_n_positions()
+
+    return sum(1 for _ in positioner.get_generator())
+
+
+def restore_results_order(positioner, data_processor):
+    """
+    Return the results in the order of the provided positions, if the positioner visited them in a different order
+    (optimized paths). Only data processors that implement reorder are reordered.
+    :param positioner: Positioner of the scan.
+    :param data_processor: Data processor with the acquired points.
+    """
+    get_result_indexes = getattr(positioner, "get_result_indexes", None)
+    reorder = getattr(data_processor, "reorder", None)
+
+    if get_result_indexes and reorder:
+        result_indexes = get_result_indexes()
+        if result_indexes is not None:
+            reorder(result_indexes)
+
+
 def flat_list_generator(list_to_flatten):
     # Just return the most inner list.
     if (len(list_to_flatten) == 0) or (not isinstance(list_to_flatten[0], list)):
@@ -134,6 +181,31 @@ class ActionExecutor(object):
                 action()
 
 
+class AsyncActionExecutor(ActionExecutor):
+    """
+    Execute all callbacks in the event loop. Callbacks can be plain functions or coroutine functions.
+    """
+
+    async def execute(self, position):
+        for action in self.actions:
+            if "position" in inspect.signature(action).parameters:
+                await resolve_awaitable(action(position))
+            else:
+                await resolve_awaitable(action())
+
+
+async def resolve_awaitable(value):
+    """
+    Await the value if it is awaitable (the result of a coroutine function), otherwise return it as it is.
+    :param value: Result of a plain function or coroutine function.
+    :return: Resolved value.
+    """
+    if inspect.isawaitable(value):
+        return await value
+
+    return value
+
+
 class SimpleDataProcessor(object):
     """
     Save the position and the received data at this position.
@@ -158,6 +230,15 @@ class SimpleDataProcessor(object):
     def get_positions(self):
         return self.positions
 
+    def reorder(self, result_indexes):
+        """
+        Reorder the acquired points, for positioners that do not visit the positions in the provided order.
+        :param result_indexes: Index in the results of each acquired point, in the acquisition order.
+        """
+        order = sorted(range(len(self.data)), key=lambda index: result_indexes[index])
+        self.positions[:] = [self.positions[index] for index in order]
+        self.data[:] = [self.data[index] for index in order]
+
 
 class DictionaryDataProcessor(SimpleDataProcessor):
     """
@@ -10,6 +10,7 @@ setup(
     packages=['pyscan',
               "pyscan.dal",
               "pyscan.positioner",
+              "pyscan.processor",
               "pyscan.interface",
               "pyscan.interface.pyScan"]
 )
@@ -1,6 +1,7 @@
 from itertools import cycle
 
-from pyscan.dal.epics_dal import PyEpicsDal, ReadGroupInterface, WriteGroupInterface
+from pyscan.dal.epics_dal import PyEpicsDal, ReadGroupInterface, WriteGroupInterface, MonitorGroupInterface, \
+    AsyncReadGroupInterface, AsyncWriteGroupInterface, AsyncMonitorGroupInterface
 from pyscan.interface.pyScan import READ_GROUP, convert_to_list
 
 pv_cache = {}
@@ -61,6 +62,12 @@ class MockReadGroupInterface(ReadGroupInterface):
         return result
 
 
+class MockMonitorGroupInterface(MonitorGroupInterface):
+    @staticmethod
+    def connect(pv_name):
+        return MockPV(pv_name)
+
+
 class MockWriteGroupInterface(WriteGroupInterface):
     @staticmethod
     def connect(pv_name):
@@ -75,6 +82,24 @@ class MockWriteGroupInterface(WriteGroupInterface):
             pv.put(value)
 
 
+class MockAsyncReadGroupInterface(AsyncReadGroupInterface):
+    @staticmethod
+    def connect(pv_name):
+        return MockPV(pv_name)
+
+
+class MockAsyncMonitorGroupInterface(AsyncMonitorGroupInterface):
+    @staticmethod
+    def connect(pv_name):
+        return MockPV(pv_name)
+
+
+class MockAsyncWriteGroupInterface(AsyncWriteGroupInterface):
+    @staticmethod
+    def connect(pv_name):
+        return MockPV(pv_name)
+
+
 class MockPV(object):
     """
     Mock the behaviour of PVs, including readback logic.
@@ -82,6 +107,7 @@ class MockPV(object):
     def __init__(self, pv_name, readback_pv_name=None):
         self.pv_name = pv_name
         self.readback_pv_name = readback_pv_name
+        self.callbacks = []
         if pv_name in cached_initial_values:
             self.value = cached_initial_values[pv_name]
         else:
@@ -101,6 +127,7 @@ class MockPV(object):
 
     def put(self, value):
         self.value = value
+        self._run_callbacks()
 
         # If we have a readback PV, update it.
         if self.readback_pv_name:
@@ -111,6 +138,14 @@ class MockPV(object):
             for pv in [pv for pv in pv_cache[self.pv_name] if pv != self]:
                 # Do not use PUT, it triggers a recursion.
                 pv.value = value
+                pv._run_callbacks()
+
+    def add_callback(self, callback):
+        self.callbacks.append(callback)
+
+    def _run_callbacks(self):
+        for callback in self.callbacks:
+            callback(pvname=self.pv_name, value=self.value)
 
     def disconnect(self):
         pass
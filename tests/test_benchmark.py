@@ -0,0 +1,54 @@
+import json
+import sys
+import unittest
+
+from pyscan.benchmark import run_benchmark, compare_results, get_scenarios
+
+scan_module = sys.modules["pyscan.scan"]
+
+
+class BenchmarkTests(unittest.TestCase):
+    def test_run_benchmark(self):
+        original_reader = scan_module.EPICS_READER
+
+        results = run_benchmark(quick=True, scenario_filter="readables_10")
+
+        self.assertEqual(set(results["scenarios"].keys()),
+                         {"function_readables_10", "epics_readables_10", "bs_readables_10",
+                          "function_readables_100", "epics_readables_100", "bs_readables_100"})
+
+        for result in results["scenarios"].values():
+            self.assertEqual(result["n_points"], 100)
+            self.assertGreater(result["points_per_second"], 0)
+            self.assertGreater(result["peak_memory"], 0)
+            self.assertEqual(list(result["latency"].keys()), ["move", "settle", "read"])
+            self.assertLessEqual(result["latency"]["read"]["p50"], result["latency"]["read"]["p99"])
+
+        # The results need to be serializable, to compare them to later runs.
+        self.assertEqual(json.loads(json.dumps(results))["quick"], True)
+
+        # The simulated DALs are only used during the benchmark.
+        self.assertIs(scan_module.EPICS_READER, original_reader)
+
+    def test_scenarios(self):
+        names = [scenario.name for scenario in get_scenarios(quick=False)]
+        self.assertEqual(len(names), len(set(names)), "Scenario names must be unique.")
+
+        for name in ["bs_readables_1000", "dimensions_4", "n_measurements_1000", "image_readables"]:
+            self.assertIn(name, names)
+
+        dimensions_4 = [scenario for scenario in get_scenarios(quick=True) if scenario.name == "dimensions_4"][0]
+        self.assertEqual(len(dimensions_4.writables), 4)
+        self.assertEqual(len(list(dimensions_4.create_positioner().get_generator())), 81)
+
+    def test_compare_results(self):
+        baseline = {"scenarios": {"a": {"points_per_second": 1000.0}, "b": {"points_per_second": 1000.0}}}
+        results = {"scenarios": {"a": {"points_per_second": 850.0}, "b": {"points_per_second": 700.0},
+                                 "c": {"points_per_second": 1.0}}}
+
+        regressions = compare_results(baseline, results, tolerance=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("Scenario b", regressions[0])
+
+        # Scenarios without a baseline are not compared.
+        self.assertEqual(compare_results(baseline, results, tolerance=0.5), [])
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+import unittest
+
+# Maximum time, in seconds, to import pyscan in a new interpreter. Numpy, asyncio and the data processors are still
+# imported eagerly, about 0.15 seconds on a recent machine: the budget leaves a margin for slower test machines.
+import_time_budget = 0.5
+
+
+def run_python(code):
+    """
+    Run the code in a new interpreter, to start with an empty module cache.
+    :return: Output of the code.
+    """
+    return subprocess.check_output([sys.executable, "-c", code], universal_newlines=True).strip()
+
+
+class ImportTests(unittest.TestCase):
+    def test_lazy_dal_imports(self):
+        loaded_modules = run_python("import sys, pyscan; "
+                                    "print([name for name in ('epics', 'bsread', 'zmq') if name in sys.modules])")
+        self.assertEqual(loaded_modules, "[]", "The DAL dependencies should be imported only when used.")
+
+        # Function scans do not need the DAL dependencies at all.
+        loaded_modules = run_python("import sys; from pyscan import *; "
+                                    "scan(StaticPositioner(2), lambda: 1, settings=scan_settings("
+                                    "progress_callback=lambda current, total: None)); "
+                                    "print([name for name in ('epics', 'bsread', 'zmq') if name in sys.modules])")
+        self.assertEqual(loaded_modules, "[]")
+
+    def test_import_time(self):
+        # Best of 3, to exclude the cold disk cache.
+        import_time = min(float(run_python("import time; start_time = time.perf_counter(); import pyscan; "
+                                           "print(time.perf_counter() - start_time)")) for _ in range(3))
+
+        self.assertLess(import_time, import_time_budget,
+                        "Importing pyscan took %.3f seconds, the budget is %.3f seconds." %
+                        (import_time, import_time_budget))
@@ -1,16 +1,19 @@
+import math
 import unittest
 from itertools import count
 from random import randrange, random
 from time import sleep, time
 
-from pyscan import StaticPositioner
+from pyscan import StaticPositioner, scan, scan_settings
 from pyscan.config import max_time_tolerance
+from pyscan.positioner.adaptive import AdaptiveLinePositioner
 from pyscan.positioner.area import AreaPositioner, ZigZagAreaPositioner, MultiAreaPositioner
 from pyscan.positioner.compound import CompoundPositioner
 from pyscan.positioner.line import LinePositioner, ZigZagLinePositioner
+from pyscan.positioner.search import BinarySearchPositioner, HillClimbingPositioner
 from pyscan.positioner.serial import SerialPositioner
 from pyscan.positioner.time import TimePositioner
-from pyscan.positioner.vector import VectorPositioner, ZigZagVectorPositioner
+from pyscan.positioner.vector import VectorPositioner, ZigZagVectorPositioner, get_path_travel_time
 from pyscan.utils import convert_to_position_list
 from tests.helpers.utils import is_close
 
@@ -159,6 +162,184 @@ class DiscreetPositionersTests(unittest.TestCase):
         # Test offset.
         self.verify_result(VectorPositioner(expected_result, offsets=[2, 1]), expected_result)
 
+    def test_VectorPositioner_optimize_path(self):
+        # Points on a line, given in a back and forth order.
+        positions = [[0, 0], [4, 0], [1, 0], [3, 0], [2, 0]]
+        positioner = VectorPositioner(positions, optimize_path=True)
+        self.verify_result(positioner, [[0, 0], [1, 0], [2, 0], [3, 0], [4, 0]])
+        # The index of each position is the index in the provided list.
+        self.assertEqual(list(positioner.get_index_generator()), [(0,), (2,), (4,), (3,), (1,)])
+        self.assertEqual(positioner.get_result_indexes(), [0, 2, 4, 3, 1])
+        self.assertIsNone(VectorPositioner(positions).get_result_indexes())
+
+        # The travel time takes into account the axis velocity.
+        positions = [[0, 0], [1, 10], [2, 0], [1, -10]]
+        positioner = VectorPositioner(positions, optimize_path=True, axis_velocities=[1, 100])
+        self.assertEqual(get_path_travel_time(positioner.positions, [1, 100]), 2.2)
+
+        # The optimized path of a random cloud is shorter, and visits all the points.
+        positions = [[randrange(100), randrange(100)] for _ in range(200)]
+        positioner = VectorPositioner([list(position) for position in positions], optimize_path=True,
+                                      axis_velocities=[1, 2])
+        self.assertEqual(positioner.positions[0], positions[0], "The first position must not change.")
+        self.assertLess(get_path_travel_time(positioner.positions, [1, 2]),
+                        get_path_travel_time(positions, [1, 2]))
+        for position, index in zip(positioner.get_generator(), positioner.get_index_generator()):
+            self.assertEqual(position, positions[index[0]])
+        self.assertEqual(sorted(index[0] for index in positioner.get_index_generator()), list(range(200)))
+
+        self.assertRaisesRegex(ValueError, "axis velocities", VectorPositioner, positions, optimize_path=True,
+                               axis_velocities=[1])
+
+    def test_AdaptiveLinePositioner(self):
+        def edge(x):
+            return 0 if x < 3.3 else 1
+
+        positioner = AdaptiveLinePositioner(0, 10, n_initial=11, resolution=0.01)
+        positions = []
+        for position in positioner.get_generator():
+            positions.append(position[0])
+            positioner.update(position, [edge(position[0])])
+
+        # Positions are refined only around the edge, up to the resolution.
+        refined_positions = [x for x in positions[11:]]
+        self.assertTrue(all(3 < x < 4 for x in refined_positions))
+        self.assertTrue(any(abs(x - 3.3) < 0.02 for x in refined_positions))
+        # A grid with the same resolution would need 1000 positions.
+        self.assertLess(len(positions), 30)
+        self.assertEqual(len(positions), len(set(positions)), "Each position should be visited only once.")
+
+        # The maximum number of positions is respected.
+        positioner = AdaptiveLinePositioner(0, 10, n_initial=5, max_positions=8)
+        n_positions = 0
+        for position in positioner.get_generator():
+            n_positions += 1
+            positioner.update(position, [[edge(position[0])], [edge(position[0])]])
+        self.assertEqual(n_positions, 8)
+
+        # Flat regions are not refined.
+        positioner = AdaptiveLinePositioner([0, 0], [10, 20], n_initial=5, resolution=0.01)
+        positions = []
+        for position in positioner.get_generator():
+            positions.append(position)
+            positioner.update(position, [1])
+        self.assertEqual(positions, [[0, 0], [2.5, 5], [5, 10], [7.5, 15], [10, 20]])
+
+        self.assertRaisesRegex(ValueError, "might not stop", AdaptiveLinePositioner, 0, 10)
+
+    def run_search(self, positioner, objective):
+        """
+        Execute the search on the objective, as the scanner would.
+        :return: Search result.
+        """
+        for position in positioner.get_generator():
+            positioner.update(position, [objective(position)])
+        return positioner.get_result()
+
+    def test_BinarySearchPositioner(self):
+        # Simulated objective, with the maximum at (3.37, -1.21).
+        def objective(position):
+            return math.exp(-((position[0] - 3.37) ** 2 + (position[1] + 1.21) ** 2) / 4)
+
+        # Number of moves of an area scan with the same resolution.
+        n_area_positions = sum(1 for _ in AreaPositioner([-10, -10], [10, 10], step_size=[0.05, 0.05]).get_generator())
+
+        for strategy in ("Normal", "Boundary", "FullNeighborhood"):
+            positioner = BinarySearchPositioner([-10, -10], [10, 10], 0.05, strategy=strategy)
+            result = self.run_search(positioner, objective)
+
+            self.assertTrue(is_close(result.optimal_position, [3.37, -1.21], 0.05),
+                            "Strategy %s did not find the maximum: %s." % (strategy, result.optimal_position))
+            self.assertLess(len(result.positions), n_area_positions / 1000)
+            self.assertEqual(len(set(tuple(x) for x in result.positions)), len(result.positions),
+                             "Positions should be evaluated only once.")
+
+        # Minimum search.
+        positioner = BinarySearchPositioner([0], [10], 0.01, maximum=False)
+        result = self.run_search(positioner, lambda position: (position[0] - 7.77) ** 2)
+        self.assertTrue(abs(result.optimal_position[0] - 7.77) < 0.01)
+
+        # The search stops after the maximum number of positions.
+        positioner = BinarySearchPositioner([-10, -10], [10, 10], 0.05, max_positions=10)
+        self.assertEqual(len(self.run_search(positioner, objective).positions), 10)
+
+        self.assertRaisesRegex(ValueError, "Strategy", BinarySearchPositioner, [0], [1], 0.1, strategy="Random")
+
+    def test_HillClimbingPositioner(self):
+        def objective(position):
+            return math.exp(-((position[0] - 3.37) ** 2 + (position[1] + 1.21) ** 2) / 4)
+
+        n_area_positions = sum(1 for _ in AreaPositioner([-10, -10], [10, 10], step_size=[0.05, 0.05]).get_generator())
+
+        positioner = HillClimbingPositioner([-10, -10], [10, 10], initial_step=2, resolution=0.05)
+        result = self.run_search(positioner, objective)
+        self.assertTrue(is_close(result.optimal_position, [3.37, -1.21], 0.05),
+                        "Maximum not found: %s." % result.optimal_position)
+        self.assertLess(len(result.positions), n_area_positions / 1000)
+
+        # The search starts at the given position.
+        positioner = HillClimbingPositioner([-10], [10], initial_step=1, resolution=0.1, start=-9, offsets=[1])
+        result = self.run_search(positioner, lambda position: -abs(position[0] - 5))
+        self.assertEqual(result.positions[0], [-8])
+        self.assertTrue(abs(result.optimal_position[0] - 5) < 0.1)
+
+        # With noise filtering, a single worse measurement does not stop the climb.
+        def noisy_objective(position):
+            return -1 if position[0] == 1 else position[0]
+
+        positioner = HillClimbingPositioner([0], [5], initial_step=1, resolution=1, start=0)
+        self.assertEqual(self.run_search(positioner, noisy_objective).optimal_position, [0])
+        positioner = HillClimbingPositioner([0], [5], initial_step=1, resolution=1, start=0, noise_filtering_steps=2)
+        self.assertEqual(self.run_search(positioner, noisy_objective).optimal_position, [5])
+
+    def test_search_positioners_scan(self):
+        # Search through the scanner, moving simulated motors, like pshell bsearch and hsearch.
+        motors = {}
+        moves = []
+
+        def move_motor1(position):
+            motors["MOTOR1"] = position
+            moves.append(position)
+
+        def move_motor2(position):
+            motors["MOTOR2"] = position
+
+        # Simulated objective, with the maximum at (1.3, -2.7).
+        def objective():
+            return -((motors["MOTOR1"] - 1.3) ** 2) - ((motors["MOTOR2"] + 2.7) ** 2)
+
+        settings = scan_settings(progress_callback=lambda current_position, total_positions: None)
+
+        positioner = BinarySearchPositioner([-5, -5], [5, 5], 0.1)
+        data = scan(positioner, objective, [move_motor1, move_motor2], settings=settings)
+        result = positioner.get_result()
+
+        self.assertTrue(is_close(result.optimal_position, [1.3, -2.7], 0.1),
+                        "Maximum not found: %s." % result.optimal_position)
+        self.assertEqual(result.values, [x[0] for x in data])
+        self.assertEqual(result.optimal_value, max(result.values))
+
+        # The search moves the motors much less than an area scan with the same resolution.
+        n_search_moves = len(moves)
+        del moves[:]
+        scan(AreaPositioner([-5, -5], [5, 5], step_size=[0.1, 0.1]), objective, [move_motor1, move_motor2],
+             settings=settings)
+        self.assertEqual(len(moves), 101 * 101)
+        self.assertLess(n_search_moves, len(moves) / 100,
+                        "Search moves: %d, area scan moves: %d." % (n_search_moves, len(moves)))
+
+        # Relative minimum search around the current position of the motor.
+        current_position = -10
+        positioner = HillClimbingPositioner([-5], [5], initial_step=1, resolution=0.1, maximum=False, start=[0],
+                                            offsets=[current_position])
+        data = scan(positioner, lambda: (motors["MOTOR1"] + 8.5) ** 2, move_motor1, settings=settings)
+        result = positioner.get_result()
+
+        self.assertEqual(result.positions[0], [current_position])
+        self.assertTrue(abs(result.optimal_position[0] + 8.5) < 0.1, "Minimum not found: %s." % result.optimal_position)
+        self.assertEqual(result.values, [x[0] for x in data])
+        self.assertEqual(result.optimal_value, min(result.values))
+
     def test_ZigZagVectorPositioner(self):
         expected_single_result = [[-2., -2], [-1., -1], [0., 0], [1., 1], [2., 2]]
         expected_3pass_result = [[-2.0, -2], [-1.0, -1], [0.0, 0], [1.0, 1], [2.0, 2],
@@ -405,6 +586,48 @@ class DiscreetPositionersTests(unittest.TestCase):
             self.assertTrue(abs(time_difference-acquisition_delay) < max_time_tolerance,
                             "The acquisition time difference is larger than the minimum tolerance.")
 
+    def test_TimePositioner_deadlines(self):
+        time_interval = 0.01
+        time_positioner = TimePositioner(time_interval, 20)
+
+        for _ in time_positioner.get_generator():
+            sleep(random() * time_interval / 2)
+
+        scheduled = time_positioner.scheduled_timestamps
+        # The ticks are scheduled at absolute deadlines, so the jitter does not accumulate.
+        for index in range(len(scheduled)):
+            self.assertAlmostEqual(scheduled[index] - scheduled[0], index * time_interval, places=5)
+            self.assertLess(abs(time_positioner.actual_timestamps[index] - scheduled[index]), max_time_tolerance)
+
+        # A slow acquisition stops the scan with the default policy.
+        generator = TimePositioner(0.02, 5).get_generator()
+        next(generator)
+        sleep(0.1)
+        self.assertRaisesRegex(ValueError, "cannot be achieved", next, generator)
+
+        # Missed ticks are skipped - the next sample is at the next scheduled tick.
+        time_positioner = TimePositioner(0.02, 3, missed_tick_policy="Skip")
+        for index, _ in enumerate(time_positioner.get_generator()):
+            if index == 0:
+                sleep(0.1)
+        scheduled_ticks = [round((timestamp - time_positioner.scheduled_timestamps[0]) / 0.02)
+                           for timestamp in time_positioner.scheduled_timestamps]
+        self.assertEqual(len(scheduled_ticks), 3)
+        self.assertGreaterEqual(scheduled_ticks[1], 5)
+        self.assertEqual(scheduled_ticks[2], scheduled_ticks[1] + 1)
+
+        # Missed ticks are acquired immediately, until the positioner is back on schedule.
+        time_positioner = TimePositioner(0.02, 5, missed_tick_policy="CatchUp")
+        for index, _ in enumerate(time_positioner.get_generator()):
+            if index == 0:
+                sleep(0.1)
+        scheduled_ticks = [round((timestamp - time_positioner.scheduled_timestamps[0]) / 0.02)
+                           for timestamp in time_positioner.scheduled_timestamps]
+        self.assertEqual(scheduled_ticks, [0, 1, 2, 3, 4])
+        self.assertLess(time_positioner.actual_timestamps[4] - time_positioner.actual_timestamps[1], 0.01)
+
+        self.assertRaisesRegex(ValueError, "not supported", TimePositioner, 0.1, 10, missed_tick_policy="Wait")
+
     def test_StaticPositioner(self):
         n_images = 10
         positioner = StaticPositioner(n_images)
@@ -415,4 +638,32 @@ class DiscreetPositionersTests(unittest.TestCase):
             image_index.append(next(positioner_generator))
 
         self.assertEqual(len(image_index), n_images, "Number of images does not match.")
-        self.assertEqual(image_index, list(range(n_images)), "Received array not expected.")
\ No newline at end of file
+        self.assertEqual(image_index, list(range(n_images)), "Received array not expected.")
+
+    def test_scan_shape(self):
+        def verify_shape(positioner, expected_shape, expected_indexes):
+            self.assertEqual(positioner.get_shape(), expected_shape)
+            indexes = list(positioner.get_index_generator())
+            self.assertEqual(indexes, expected_indexes)
+            self.assertEqual(len(indexes), len(list(positioner.get_generator())),
+                             "Each position must have an index.")
+
+        verify_shape(LinePositioner(0, 2, n_steps=2), (3,), [(0,), (1,), (2,)])
+        verify_shape(LinePositioner(0, 1, n_steps=1, passes=2), (2, 2), [(0, 0), (0, 1), (1, 0), (1, 1)])
+        # Descending passes are placed in reverse.
+        verify_shape(ZigZagLinePositioner(0, 2, n_steps=2, passes=2), (2, 3),
+                     [(0, 0), (0, 1), (0, 2), (1, 1), (1, 0)])
+        verify_shape(ZigZagVectorPositioner([1, 2, 3], passes=3), (3, 3),
+                     [(0, 0), (0, 1), (0, 2), (1, 1), (1, 0), (2, 1), (2, 2)])
+        verify_shape(AreaPositioner([0, 0], [1, 2], n_steps=[1, 2]), (2, 3),
+                     [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1), (1, 2)])
+        verify_shape(ZigZagAreaPositioner([0, 0], [1, 2], n_steps=[1, 2]), (2, 3),
+                     [(0, 0), (0, 1), (0, 2), (1, 2), (1, 1), (1, 0)])
+        verify_shape(SerialPositioner([[1, 2], [3]], [0, 0]), (2, 2), [(0, 0), (0, 1), (1, 0)])
+        verify_shape(CompoundPositioner([VectorPositioner([1, 2]), StaticPositioner(2)]), (2, 2),
+                     [(0, 0), (0, 1), (1, 0), (1, 1)])
+
+        # The index of zigzag positioners follows the position.
+        positioner = ZigZagAreaPositioner([0, 0, 0], [2, 2, 3], n_steps=[2, 2, 3], passes=2)
+        for index, position in zip(positioner.get_index_generator(), positioner.get_generator()):
+            self.assertTrue(is_close(list(index[1:]), position))
@@ -1,6 +1,17 @@
+import os
+import tempfile
 import unittest
 
-from pyscan import epics_pv, StaticPositioner, scan, SimpleDataProcessor
+import numpy as np
+
+from pyscan import epics_pv, StaticPositioner, scan, SimpleDataProcessor, function_value, function_condition, \
+    scan_settings, VectorPositioner, CompoundPositioner, ZigZagAreaPositioner, ZigZagVectorPositioner, \
+    MultiAreaPositioner
+from pyscan.processor.columnar import ColumnarDataProcessor
+from pyscan.processor.hdf5 import Hdf5DataProcessor
+from pyscan.processor.memory_map import MemoryMappedDataProcessor
+from pyscan.processor.shaped import ShapedDataProcessor
+from pyscan.processor.statistics import StatisticsDataProcessor, RunningStatistics
 from pyscan.utils import DictionaryDataProcessor
 
 # BEGIN EPICS MOCK.
@@ -72,4 +83,283 @@ class DataProcessorsTest(unittest.TestCase):
             current_number_of_items += 1
         current_number_of_items = 0
 
-        scan(positioner=positioner, readables=readables, data_processor=data_processor, after_read=after_read)
\ No newline at end of file
+        scan(positioner=positioner, readables=readables, data_processor=data_processor, after_read=after_read)
+
+    def test_ColumnarDataProcessor(self):
+        n_images = 10
+        positioner = VectorPositioner([[x, -x] for x in range(n_images)])
+
+        def counter():
+            counter.value += 1
+            return counter.value
+        counter.value = 0
+
+        readables = [function_value(counter, "counter"),
+                     function_value(lambda: [1.0, 2.0, 3.0], "waveform"),
+                     function_value(lambda: "text", "status")]
+
+        data_processor = ColumnarDataProcessor(readables, n_positions=n_images)
+        result = scan(positioner=positioner, readables=readables, data_processor=data_processor)
+
+        self.assertEqual(len(result), n_images)
+        self.assertEqual(result["counter"].tolist(), list(range(1, n_images + 1)))
+        self.assertEqual(result["waveform"].shape, (n_images, 3))
+        self.assertEqual(result["waveform"].dtype, np.float64)
+        self.assertEqual(result["status"][0], "text")
+        self.assertEqual(data_processor.get_positions().tolist(), [[x, -x] for x in range(n_images)])
+
+        # Without the number of positions, the arrays grow as needed.
+        counter.value = 0
+        ColumnarDataProcessor.initial_capacity = 3
+        try:
+            data_processor = ColumnarDataProcessor(readables[:2], n_measurements=2)
+            result = scan(positioner=StaticPositioner(n_images), readables=readables[:2],
+                          data_processor=data_processor, settings=scan_settings(n_measurements=2))
+        finally:
+            ColumnarDataProcessor.initial_capacity = 1024
+
+        self.assertEqual(len(result), n_images)
+        self.assertEqual(result["counter"].shape, (n_images, 2))
+        self.assertEqual(result["counter"][-1].tolist(), [2 * n_images - 1, 2 * n_images])
+        self.assertEqual(result["waveform"].shape, (n_images, 2, 3))
+        self.assertEqual(data_processor.get_positions().tolist(), list(range(n_images)))
+
+        self.assertRaisesRegex(ValueError, "unique", ColumnarDataProcessor, [readables[0], readables[0]])
+
+        # Integer values are not truncated when the next values are fractional.
+        positioner = VectorPositioner([0, 0.5, 1.7])
+        values = iter([0, 0.5, 1.7])
+        waveforms = iter([[1, 2], [1.5, 2.5], [1, 2, 3]])
+        readables = [function_value(lambda: next(values), "value"),
+                     function_value(lambda: next(waveforms), "waveform")]
+
+        # The number of positions is taken from the positioner.
+        data_processor = ColumnarDataProcessor(readables, positioner=positioner)
+        self.assertEqual(data_processor.n_positions, 3)
+
+        result = scan(positioner=positioner, readables=readables, data_processor=data_processor)
+        self.assertEqual(result["value"].tolist(), [0, 0.5, 1.7])
+        self.assertEqual(data_processor.get_positions().tolist(), [0, 0.5, 1.7])
+        # Waveforms changing length are stored as objects.
+        self.assertEqual([np.asarray(x).tolist() for x in result["waveform"]], [[1, 2], [1.5, 2.5], [1, 2, 3]])
+
+    def test_ShapedDataProcessor(self):
+        positioner = CompoundPositioner([VectorPositioner([10, 20]),
+                                         ZigZagAreaPositioner([0, 0], [2, 3], n_steps=[2, 3])])
+
+        # The readable returns a value computed from the current position.
+        def store_position(position):
+            read_position.value = position[0] * 100 + position[1] * 10 + position[2]
+
+        def read_position():
+            return read_position.value
+
+        readable = function_value(read_position, "value")
+        data_processor = ShapedDataProcessor(positioner, readable)
+        result = scan(positioner=positioner, readables=readable, data_processor=data_processor,
+                      before_read=store_position)
+
+        self.assertEqual(result.shape, (2, 3, 4))
+        self.assertTrue(data_processor.get_mask().all())
+        # Each point is placed at the index of its position, regardless of the zigzag order.
+        for x in range(2):
+            for y in range(3):
+                for z in range(4):
+                    self.assertEqual(result["value"][x, y, z], (x + 1) * 1000 + y * 10 + z)
+                    self.assertEqual(data_processor.get_positions()[x, y, z].tolist(), [(x + 1) * 10, y, z])
+
+        # Zigzag passes leave the unvisited points masked.
+        data_processor = ShapedDataProcessor(ZigZagVectorPositioner([1, 2, 3], passes=2), "PYSCAN:TEST:OBS1")
+        scan(positioner=ZigZagVectorPositioner([1, 2, 3], passes=2), readables="PYSCAN:TEST:OBS1",
+             data_processor=data_processor)
+        self.assertEqual(data_processor.get_mask().tolist(), [[True, True, True], [True, True, False]])
+
+        self.assertRaisesRegex(ValueError, "does not provide the scan shape", ShapedDataProcessor,
+                               MultiAreaPositioner([[0, 0]], [[1, 1]], [[1, 1]]), "PYSCAN:TEST:OBS1")
+
+    def test_Hdf5DataProcessor(self):
+        import h5py
+
+        n_images = 250
+        positioner = VectorPositioner([[x, -x] for x in range(n_images)])
+
+        def counter():
+            counter.value += 1
+            return counter.value
+        counter.value = 0
+
+        readables = [function_value(counter, "counter"),
+                     function_value(lambda: [1.0, 2.0, 3.0], "CAMERA1:WAVEFORM"),
+                     function_value(lambda: "text", "status")]
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "scan.h5")
+            data_processor = Hdf5DataProcessor(filename, readables, n_measurements=2, compression="gzip",
+                                               chunk_size=100)
+            result = scan(positioner=positioner, readables=readables, data_processor=data_processor,
+                          settings=scan_settings(n_measurements=2))
+            self.assertEqual(result, filename)
+
+            with h5py.File(filename, "r") as file:
+                self.assertEqual(file["positions"][:].tolist(), [[x, -x] for x in range(n_images)])
+                self.assertEqual(file["timestamps"].shape, (n_images,))
+                self.assertEqual(file["data/counter"][:].tolist(), [[x, x + 1] for x in range(1, 2 * n_images, 2)])
+                self.assertEqual(file["data/CAMERA1:WAVEFORM"].shape, (n_images, 2, 3))
+                self.assertEqual(file["data/CAMERA1:WAVEFORM"].attrs["identifier"], "CAMERA1:WAVEFORM")
+                status = [x.decode() if isinstance(x, bytes) else x for x in file["data/status"][0]]
+                self.assertEqual(status, ["text", "text"])
+
+            # The file is closed also when the scan fails, with the points acquired before the failure.
+            values = iter([0, 0.5, 1.7])
+            conditions = iter([True, True, False])
+            data_processor = Hdf5DataProcessor(filename, function_value(lambda: next(values), "value"))
+            self.assertRaisesRegex(ValueError, "returned False", scan, positioner=VectorPositioner([1, 2, 3]),
+                                   readables=function_value(lambda: next(values), "value"),
+                                   conditions=function_condition(lambda: next(conditions), "ready", "Abort"),
+                                   data_processor=data_processor)
+
+            with h5py.File(filename, "r") as file:
+                # Integer values are not truncated when the next values are fractional.
+                self.assertEqual(file["data/value"][:].tolist(), [0, 0.5])
+                self.assertEqual(file["condition_failures"][:].tolist(), [1])
+                self.assertEqual(list(file["condition_failures"].attrs["identifiers"]), ["ready"])
+
+            # With an optimized path, the points are stored in the order of the provided positions.
+            visited = []
+            positioner = VectorPositioner([[0], [10], [1], [11], [2]], optimize_path=True)
+            data_processor = Hdf5DataProcessor(filename, "value", chunk_size=2)
+            scan(positioner=positioner, readables=function_value(lambda: len(visited), "value"),
+                 writables=lambda position: visited.append(position), data_processor=data_processor)
+            with h5py.File(filename, "r") as file:
+                self.assertEqual(file["positions"][:].tolist(), [[0], [10], [1], [11], [2]])
+                # Visited order: 0, 1, 2, 10, 11.
+                self.assertEqual(file["data/value"][:].tolist(), [1, 4, 2, 5, 3])
+                self.assertEqual(file["data/value"].attrs["identifier"], "value")
+
+            # Errors after the stop (writing the condition failures) do not block the closing of the file.
+            data_processor = Hdf5DataProcessor(filename, "PYSCAN:TEST:OBS1")
+            data_processor.process(1, [1])
+            original_create_dataset = data_processor.file.create_dataset
+
+            def failing_create_dataset(name, *args, **kwargs):
+                if name == "condition_failures":
+                    raise ValueError("Cannot create dataset.")
+                return original_create_dataset(name, *args, **kwargs)
+
+            data_processor.file.create_dataset = failing_create_dataset
+            self.assertRaisesRegex(ValueError, "Cannot write data", data_processor.close, {"a/b": 1, "a_b": 2})
+
+            # Identifiers that differ only by "/" and "_" do not collide.
+            data_processor = Hdf5DataProcessor(filename, "PYSCAN:TEST:OBS1")
+            data_processor.close({"a/b": 1, "a_b": 2})
+            with h5py.File(filename, "r") as file:
+                self.assertEqual(file["condition_failures"][:].tolist(), [1, 2])
+                self.assertEqual(list(file["condition_failures"].attrs["identifiers"]), ["a/b", "a_b"])
+
+    def test_MemoryMappedDataProcessor(self):
+        n_images = 20
+        image_shape = (16, 8)
+
+        def image():
+            image.value += 1
+            return np.full(image_shape, image.value, dtype=np.uint16)
+        image.value = 0
+
+        readables = [function_value(image, "CAMERA1:IMAGE"), function_value(lambda: 1.5, "CAMERA1:INTENSITY")]
+
+        with tempfile.TemporaryDirectory() as directory:
+            data_processor = MemoryMappedDataProcessor(directory, readables, n_positions=n_images)
+            result = scan(positioner=StaticPositioner(n_images), readables=readables, data_processor=data_processor)
+
+            self.assertIsInstance(result, np.memmap)
+            self.assertEqual(result["CAMERA1:IMAGE"].shape, (n_images,) + image_shape)
+            self.assertEqual(result["CAMERA1:IMAGE"].dtype, np.uint16)
+            self.assertEqual(result["CAMERA1:IMAGE"][-1].max(), n_images)
+
+            data, positions = MemoryMappedDataProcessor.load(directory)
+            self.assertEqual(data["CAMERA1:IMAGE"][4].min(), 5)
+            self.assertEqual(data["CAMERA1:INTENSITY"].tolist(), [1.5] * n_images)
+            self.assertEqual(positions.tolist(), list(range(n_images)))
+            del data, positions, result
+
+            # More points than preallocated.
+            data_processor = MemoryMappedDataProcessor(directory, readables, n_positions=2)
+            self.assertRaisesRegex(ValueError, "preallocated", scan, positioner=StaticPositioner(3),
+                                   readables=readables, data_processor=data_processor)
+
+            self.assertRaisesRegex(ValueError, "memory mapped", scan, positioner=StaticPositioner(3),
+                                   readables=lambda: "text",
+                                   data_processor=MemoryMappedDataProcessor(directory, lambda: "text", 3))
+
+            # Values changing shape cannot be stored in the preallocated files.
+            waveforms = iter([[1.0, 2.0], [1.0, 2.0, 3.0]])
+            readable = function_value(lambda: next(waveforms), "waveform")
+            positioner = StaticPositioner(2)
+            data_processor = MemoryMappedDataProcessor(directory, readable, positioner=positioner)
+            self.assertEqual(data_processor.n_positions, 2)
+            self.assertRaisesRegex(ValueError, "constant type and shape", scan, positioner=positioner,
+                                   readables=readable, data_processor=data_processor)
+
+            self.assertRaisesRegex(ValueError, "number of positions", MemoryMappedDataProcessor, directory, readable)
+
+            # Multiple measurements are written in place, one measurement at a time.
+            counter = iter(range(100))
+            readable = function_value(lambda: [next(counter)] * 2, "waveform")
+            data_processor = MemoryMappedDataProcessor(directory, readable, n_positions=2, n_measurements=3)
+            result = scan(positioner=StaticPositioner(2), readables=readable, data_processor=data_processor,
+                          settings=scan_settings(n_measurements=3))
+            self.assertEqual(result["waveform"].shape, (2, 3, 2))
+            self.assertEqual(result["waveform"][1].tolist(), [[3, 3], [4, 4], [5, 5]])
+            del result
+
+    def test_StatisticsDataProcessor(self):
+        n_measurements = 100
+        samples = np.random.normal(5, 2, (3, n_measurements))
+        sample_values = iter(samples.flatten())
+
+        readables = [function_value(lambda: next(sample_values), "BPM1:X"),
+                     function_value(lambda: [1.0, 2.0], "WAVEFORM")]
+
+        data_processor = StatisticsDataProcessor(readables, n_measurements=n_measurements, histogram_bins=10,
+                                                 histogram_range=(-5, 15), keep_samples="BPM1:X")
+        result = scan(positioner=VectorPositioner([1, 2, 3]), readables=readables, data_processor=data_processor,
+                      settings=scan_settings(n_measurements=n_measurements))
+
+        self.assertEqual(len(result), 3)
+        for position_samples, position_result in zip(samples, result):
+            statistics = position_result["BPM1:X"]
+            self.assertEqual(statistics.count, n_measurements)
+            self.assertAlmostEqual(statistics.mean, position_samples.mean())
+            self.assertAlmostEqual(statistics.std, position_samples.std())
+            self.assertEqual(statistics.min, position_samples.min())
+            self.assertEqual(statistics.max, position_samples.max())
+            self.assertEqual(statistics.histogram.sum(), n_measurements)
+            self.assertEqual(statistics.samples, position_samples.tolist())
+
+            self.assertEqual(position_result["WAVEFORM"].mean.tolist(), [1.0, 2.0])
+            self.assertIsNone(position_result["WAVEFORM"].samples)
+
+        self.assertEqual(data_processor.get_positions(), [1, 2, 3])
+
+        # Merging batches gives the same result as computing the statistics of all samples at once.
+        statistics = RunningStatistics()
+        for position_samples in samples:
+            statistics.update(position_samples)
+        self.assertAlmostEqual(statistics.mean, samples.mean())
+        self.assertAlmostEqual(statistics.get_std(), samples.std())
+
+        # The measurements are merged into the statistics as they are acquired.
+        data_processor = StatisticsDataProcessor("BPM1:X", n_measurements=n_measurements, keep_samples="BPM1:X")
+        for sample in samples[0]:
+            data_processor.process_measurement(1, [sample])
+        self.assertEqual(data_processor.get_data(), [])
+        self.assertEqual(data_processor._statistics[0].count, n_measurements)
+
+        data_processor.process(1, [[sample] for sample in samples[0]])
+        statistics = data_processor.get_data()[0]["BPM1:X"]
+        self.assertEqual(statistics.count, n_measurements)
+        self.assertAlmostEqual(statistics.mean, samples[0].mean())
+        self.assertAlmostEqual(statistics.std, samples[0].std())
+        self.assertEqual(statistics.samples, samples[0].tolist())
+
+        self.assertRaisesRegex(ValueError, "range", StatisticsDataProcessor, readables, histogram_bins=10)
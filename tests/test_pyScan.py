@@ -617,3 +617,32 @@ class PyScan(unittest.TestCase):
 
         self.assertTrue(progress_completed, "Progress bar did not complete.")
         self.assertListEqual(progress_values, [25, 50, 75, 100], "The completed percentage is wrong.")
+
+    def test_numpy_output(self):
+        def get_list_value(nested_list, index):
+            for axis_index in index:
+                nested_list = nested_list[axis_index]
+            return nested_list
+
+        for n_measurements in (1, 2):
+            # First dimension is Range scan, second is Series scan.
+            indict1, _ = self.get_ScanLine_indices()
+            _, indict2 = self.get_ScanSeries_indices()
+            indict2["NumberOfMeasurements"] = n_measurements
+
+            pyscan = CurrentScan()
+            self.standard_init_tests(pyscan.initializeScan([dict(indict1), dict(indict2)], CurrentMockDal()))
+            list_result = pyscan.startScan()
+
+            pyscan = CurrentScan()
+            self.standard_init_tests(pyscan.initializeScan([indict1, indict2], CurrentMockDal(), numpy_output=True))
+            array_result = pyscan.startScan()
+
+            expected_shape = (4, 2, 3) + ((n_measurements,) if n_measurements > 1 else ()) + (4,)
+            self.assertEqual(array_result["KnobReadback"].shape, expected_shape)
+            self.assertEqual(array_result["Observable"].shape, expected_shape[:-1] + (2,))
+
+            # Same values as in the nested lists, at the same indexes.
+            for index in pyscan.get_output_indexes():
+                for name in ("KnobReadback", "Validation", "Observable"):
+                    self.assertEqual(array_result[name][index].tolist(), get_list_value(list_result[name], index))
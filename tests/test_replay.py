@@ -0,0 +1,113 @@
+import os
+import sys
+import tempfile
+import unittest
+from time import time
+
+from pyscan import config, scan, scan_settings, epics_pv, function_value, function_condition, LinePositioner, \
+    record_scan, replay_scan, read_recording
+from pyscan.dal import epics_dal
+from pyscan.dal.sim_dal import simulation
+
+scan_module = sys.modules["pyscan.scan"]
+
+
+class ReplayTests(unittest.TestCase):
+    def setUp(self):
+        # Other tests replace the epics DAL with mocks.
+        self.original_dals = (scan_module.EPICS_WRITER, scan_module.EPICS_READER, scan_module.EPICS_MONITOR)
+        scan_module.EPICS_WRITER = epics_dal.WriteGroupInterface
+        scan_module.EPICS_READER = epics_dal.ReadGroupInterface
+        scan_module.EPICS_MONITOR = epics_dal.MonitorGroupInterface
+
+        config.epics_simulation = True
+        simulation.reset()
+
+        self.recording_filename = os.path.join(tempfile.mkdtemp(), "scan.rec")
+
+    def tearDown(self):
+        config.epics_simulation = False
+        simulation.reset()
+
+        scan_module.EPICS_WRITER, scan_module.EPICS_READER, scan_module.EPICS_MONITOR = self.original_dals
+
+        if os.path.exists(self.recording_filename):
+            os.remove(self.recording_filename)
+
+    def test_record_and_replay(self):
+        simulation.add_detector("PYSCAN:TEST:OBS1", lambda positions: positions["PYSCAN:TEST:MOTOR1"] * 10,
+                                latency=0.02, noise=0.1)
+        simulation.add_motor("PYSCAN:TEST:MOTOR1")
+
+        read_counter = iter(range(100))
+        positioner = LinePositioner(start=0, end=4, n_steps=4)
+        settings = scan_settings(progress_callback=lambda current_position, total_positions: None)
+
+        def run_scan(read_function):
+            return scan(positioner, ["PYSCAN:TEST:OBS1", function_value(read_function, "counter")],
+                        epics_pv("PYSCAN:TEST:MOTOR1"), function_condition(lambda: True, "always_true"),
+                        settings=settings)
+
+        with record_scan(self.recording_filename):
+            recorded_result = run_scan(lambda: next(read_counter))
+
+        self.assertEqual([x[1] for x in recorded_result], [0, 1, 2, 3, 4])
+
+        interactions = read_recording(self.recording_filename)
+        self.assertEqual([x.parameters for x in interactions if x.method == "set_and_match"],
+                         [[[x], {}] for x in [[0.0], [1.0], [2.0], [3.0], [4.0]]])
+        self.assertEqual(interactions[0].method, "__init__")
+        self.assertTrue(all(x.duration >= 0.02 for x in interactions if x.dal == "EPICS_READER" and
+                            x.method == "read" and x.group_index == 0))
+
+        # The replay does not use the hardware or the functions.
+        config.epics_simulation = False
+
+        def fail():
+            raise AssertionError("Function called during the replay.")
+
+        start_time = time()
+        with replay_scan(self.recording_filename):
+            self.assertEqual(run_scan(fail), recorded_result)
+        self.assertLess(time() - start_time, 0.1)
+
+        # At the original speed, the replay waits the recorded read latency.
+        start_time = time()
+        with replay_scan(self.recording_filename, speed=1):
+            self.assertEqual(run_scan(fail), recorded_result)
+        self.assertGreaterEqual(time() - start_time, 5 * 0.02)
+
+        self.assertIs(scan_module.EPICS_READER, epics_dal.ReadGroupInterface)
+
+    def test_replay_wait_conditions(self):
+        settings = scan_settings(progress_callback=lambda current_position, total_positions: None)
+        condition_values = iter([False, False, True] + [True] * 10)
+
+        def run_scan(condition_function):
+            return scan(LinePositioner(start=0, end=2, n_steps=2), "PYSCAN:TEST:OBS1", "PYSCAN:TEST:MOTOR1",
+                        function_condition(condition_function, "ready", "Wait"), settings=settings)
+
+        with record_scan(self.recording_filename):
+            recorded_result = run_scan(lambda: next(condition_values))
+
+        # The polls of the waited function conditions are recorded as well.
+        self.assertEqual(len([x for x in read_recording(self.recording_filename)
+                              if x.dal == "FUNCTION_PROXY" and x.method == "read" and x.group_index == 2]), 6)
+
+        def fail():
+            raise AssertionError("Function called during the replay.")
+
+        with replay_scan(self.recording_filename):
+            self.assertEqual(run_scan(fail), recorded_result)
+
+    def test_replay_diverged(self):
+        settings = scan_settings(progress_callback=lambda current_position, total_positions: None)
+
+        with record_scan(self.recording_filename):
+            scan(LinePositioner(start=0, end=4, n_steps=4), "PYSCAN:TEST:OBS1", "PYSCAN:TEST:MOTOR1",
+                 settings=settings)
+
+        with replay_scan(self.recording_filename):
+            with self.assertRaisesRegex(ValueError, "diverged"):
+                scan(LinePositioner(start=1, end=4, n_steps=3), "PYSCAN:TEST:OBS1", "PYSCAN:TEST:MOTOR1",
+                     settings=settings)
@@ -1,12 +1,12 @@
 import sys
 import time
 import unittest
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 from threading import Thread
 
 from bsread.sender import Sender
 
-from pyscan import SimpleDataProcessor, config, StaticPositioner, scan_settings, function_value
+from pyscan import SimpleDataProcessor, config, StaticPositioner, scan_settings, function_value, async_scanner
 from pyscan.config import max_time_tolerance
 from pyscan.positioner.time import TimePositioner
 from pyscan.utils import DictionaryDataProcessor
@@ -28,9 +28,10 @@ cached_initial_values["PYSCAN:TEST:OBS1"] = 1
 
 # END OF MOCK.
 
-from pyscan.scan import scan
+from pyscan.scan import scan, register_source, CUSTOM_SOURCES
 from pyscan.positioner.vector import VectorPositioner
-from pyscan.scan_parameters import epics_pv, bs_property, epics_condition, bs_condition, scan_settings
+from pyscan.scan_parameters import epics_pv, bs_property, epics_condition, bs_condition, scan_settings, \
+    READABLE_PROTOCOLS, CUSTOM_SOURCE_TYPES
 from pyscan.scan_actions import action_set_epics_pv, action_restore
 from tests.helpers.mock_epics_dal import pv_cache
 
@@ -395,4 +396,68 @@ class ScanTests(unittest.TestCase):
         positioner = VectorPositioner([1, 2, 3, 4, 5, 6])
 
         scan(readables=void_read, writables=void_write, positioner=positioner,
-             before_move=before_move, after_move=after_move)
\ No newline at end of file
+             before_move=before_move, after_move=after_move)
+
+    def test_custom_source(self):
+        SIM_VALUE = namedtuple("SIM_VALUE", ["identifier", "name"])
+        SIM_CONDITION = namedtuple("SIM_CONDITION", ["identifier", "name", "value", "action", "tolerance"])
+
+        values = {"gain": 2, "shutter": 0}
+        read_batches = []
+
+        class SimGroup(object):
+            def __init__(self, items):
+                self.names = [item.name for item in items]
+
+            def read(self):
+                read_batches.append(self.names)
+                return [values[name] * 10 if name == "signal" else values[name] for name in self.names]
+
+            def write(self, new_values):
+                values.update(zip(self.names, new_values))
+
+        register_source(SIM_VALUE, SimGroup, protocol="sim")
+        register_source(SIM_CONDITION, SimGroup)
+
+        try:
+            # The shutter opens after the first read of the condition.
+            def open_shutter():
+                values["shutter"] = 1
+
+            timer = Thread(target=lambda: (time.sleep(0.2), open_shutter()))
+            timer.start()
+
+            positioner = VectorPositioner([1, 2, 3])
+            settings = scan_settings(progress_callback=lambda current_position, total_positions: None)
+            result = scan(positioner, ["sim://signal", function_value(lambda: 42), "sim://gain"],
+                          SIM_VALUE("signal", "signal"),
+                          conditions=SIM_CONDITION("shutter", "shutter", 1, "Wait", 0), settings=settings)
+            timer.join()
+
+            self.assertEqual(result, [[10, 42, 2], [20, 42, 2], [30, 42, 2]])
+            # All the readables of the source are read in a single batch.
+            self.assertIn(["signal", "gain"], read_batches)
+
+            # The shutter was closed during the read: the data is acquired again once it is open.
+            self.assertGreater(read_batches.count(["shutter"]), 2)
+
+            # Unmet custom conditions with the abort action abort the scan, also when verified before the read.
+            values["shutter"] = 0
+            for conditions_first in (False, True):
+                with self.assertRaisesRegex(ValueError, "Condition shutter, expected value 1, actual value 0"):
+                    scan(positioner, "sim://signal", SIM_VALUE("signal", "signal"),
+                         conditions=SIM_CONDITION("shutter", "shutter", 1, "Abort", 0),
+                         settings=scan_settings(progress_callback=lambda current_position, total_positions: None,
+                                                conditions_first=conditions_first))
+
+            with self.assertRaisesRegex(ValueError, "'ca://', 'bs://', 'sim://' are supported"):
+                scan(positioner, "unknown://signal")
+
+            # The async scan rejects the custom sources when it is built.
+            with self.assertRaisesRegex(ValueError, r"not supported by the async scan, but \['signal'\]"):
+                async_scanner(positioner, "sim://signal")
+        finally:
+            for source_type in (SIM_VALUE, SIM_CONDITION):
+                del CUSTOM_SOURCES[source_type]
+                CUSTOM_SOURCE_TYPES.remove(source_type)
+            del READABLE_PROTOCOLS["sim"]
@@ -1,10 +1,14 @@
+import asyncio
 import threading
 import unittest
+from time import time, sleep
 
 import sys
 
 from pyscan import *
-from tests.helpers.mock_epics_dal import MockReadGroupInterface, MockWriteGroupInterface, cached_initial_values
+from tests.helpers.mock_epics_dal import MockReadGroupInterface, MockWriteGroupInterface, cached_initial_values, \
+    MockMonitorGroupInterface, MockPV, MockAsyncReadGroupInterface, MockAsyncWriteGroupInterface, \
+    MockAsyncMonitorGroupInterface, pv_cache
 from tests.helpers.utils import TestWriter, TestReader
 
 test_positions = [0, 1, 2, 3, 4, 5]
@@ -18,12 +22,29 @@ utils_module.EPICS_READER = MockReadGroupInterface
 utils_module.EPICS_WRITER = MockWriteGroupInterface
 scan_module.EPICS_READER = MockReadGroupInterface
 scan_module.EPICS_WRITER = MockWriteGroupInterface
+scan_module.EPICS_MONITOR = MockMonitorGroupInterface
+
+async_scan_module = sys.modules["pyscan.async_scan"]
+async_scan_module.EPICS_READER = MockAsyncReadGroupInterface
+async_scan_module.EPICS_WRITER = MockAsyncWriteGroupInterface
+async_scan_module.EPICS_MONITOR = MockAsyncMonitorGroupInterface
 
 # Setup mock values
 cached_initial_values["PYSCAN:TEST:OBS1"] = 1
 
 # END OF MOCK.
 
+# Sharded scans run in separate processes: the functions need to be defined at the module level.
+_shard_motor = {}
+
+
+def _move_shard_motor(position):
+    _shard_motor["position"] = position
+
+
+def _read_shard_motor():
+    return _shard_motor["position"] ** 2
+
 
 class ScannerTests(unittest.TestCase):
 
@@ -75,3 +96,636 @@ class ScannerTests(unittest.TestCase):
         scanner_instance.abort_scan()
         self.assertRaisesRegex(Exception, "User aborted scan.", scanner_instance.discrete_scan)
         self.assertEqual(scanner_instance.get_status(), STATUS_ABORTED)
+
+    def test_conditions_first(self):
+        n_reads = 0
+
+        def expensive_readable():
+            nonlocal n_reads
+            n_reads += 1
+            return n_reads
+
+        def beam_off():
+            return False
+
+        conditions = function_condition(beam_off, name="beam_off")
+
+        # By default the data is read before the conditions are verified.
+        scanner_instance = scanner(positioner=StaticPositioner(3), readables=expensive_readable,
+                                   conditions=conditions)
+        self.assertRaisesRegex(ValueError, "beam_off", scanner_instance.discrete_scan)
+        self.assertEqual(n_reads, 1, "The readable should be read before the condition is verified.")
+        self.assertEqual(scanner_instance.get_condition_failures(), {"beam_off": 1})
+
+        n_reads = 0
+        scanner_instance = scanner(positioner=StaticPositioner(3), readables=expensive_readable,
+                                   conditions=conditions, settings=scan_settings(conditions_first=True))
+        self.assertRaisesRegex(ValueError, "beam_off", scanner_instance.discrete_scan)
+        self.assertEqual(n_reads, 0, "The readable should not be read if the conditions are not met.")
+        self.assertEqual(scanner_instance.get_condition_failures(), {"beam_off": 1})
+
+        # When the conditions are met, the result is the same as with the default acquisition.
+        result = scan(positioner=StaticPositioner(3), readables=expensive_readable, conditions=lambda: True,
+                      settings=scan_settings(conditions_first=True))
+        self.assertEqual(result, [[1], [2], [3]])
+
+    def test_wait_conditions(self):
+        cached_initial_values["PYSCAN:TEST:BEAM"] = 0
+        beam = MockPV("PYSCAN:TEST:BEAM")
+
+        def turn_beam_on():
+            sleep(0.2)
+            beam.put(1)
+
+        conditions = epics_condition("PYSCAN:TEST:BEAM", 1, action="WaitAndAbort")
+        settings = scan_settings(condition_wait_timeout=5)
+
+        threading.Thread(target=turn_beam_on).start()
+        start_time = time()
+        result = scan(positioner=StaticPositioner(2), readables="PYSCAN:TEST:OBS1", conditions=conditions,
+                      settings=settings)
+
+        self.assertEqual(result, [[1], [1]])
+        # The scan should continue as soon as the condition is met, not after a fixed retry delay.
+        self.assertLess(time() - start_time, 1)
+
+        # The condition is never met, the scan is aborted after the timeout.
+        beam.put(0)
+        self.assertRaisesRegex(ValueError, "not met within", scan, positioner=StaticPositioner(2),
+                               readables="PYSCAN:TEST:OBS1", conditions=conditions,
+                               settings=scan_settings(condition_wait_timeout=0.1))
+
+        n_calls = 0
+
+        def beam_recovers():
+            nonlocal n_calls
+            n_calls += 1
+            return n_calls > 2
+
+        scanner_instance = scanner(positioner=StaticPositioner(1), readables="PYSCAN:TEST:OBS1",
+                                   conditions=function_condition(beam_recovers, name="recovers", action="Wait"))
+        self.assertEqual(scanner_instance.discrete_scan(), [[1]])
+        self.assertEqual(scanner_instance.get_condition_failures(), {"recovers": 1})
+
+        self.assertRaisesRegex(ValueError, "not supported", epics_condition, "PYSCAN:TEST:BEAM", 1, action="Retry")
+
+    def test_retry_settings(self):
+        read_buffer = [0, 1, 2, 3]
+        n_validations = 0
+
+        def always_invalid(position, data):
+            nonlocal n_validations
+            n_validations += 1
+            return False
+
+        settings = scan_settings(acquisition_retry_limit=4, acquisition_retry_delay=0.05, acquisition_retry_backoff=2)
+        scanner_instance = Scanner(VectorPositioner([1]), SimpleDataProcessor(), TestReader(read_buffer).read,
+                                   data_validator=always_invalid, settings=settings)
+
+        start_time = time()
+        self.assertRaisesRegex(Exception, "Number of maximum read attempts \\(4\\)", scanner_instance.discrete_scan)
+        self.assertEqual(n_validations, 4)
+        # Delays: 0.05 + 0.1 + 0.2 + 0.4
+        self.assertGreaterEqual(time() - start_time, 0.75)
+
+    def test_retry_invalid_sources(self):
+        bs_values = iter(range(10))
+        n_function_reads = 0
+
+        class CountingBsReader(object):
+            def __init__(self, properties, conditions, filter_function):
+                pass
+
+            def read(self):
+                self.value = next(bs_values)
+                return [self.value]
+
+            def read_cached_conditions(self):
+                # Only the third bs message is valid.
+                return [self.value]
+
+        def expensive_readable():
+            nonlocal n_function_reads
+            n_function_reads += 1
+            return "image"
+
+        original_bs_reader = scan_module.BS_READER
+        scan_module.BS_READER = CountingBsReader
+        try:
+            conditions = bs_condition("CAMERA1:VALID", 2, action="Wait")
+            result = scan(positioner=StaticPositioner(1), readables=[bs_property("CAMERA1:X"), expensive_readable],
+                          conditions=conditions, settings=scan_settings(acquisition_retry_delay=0.01))
+        finally:
+            scan_module.BS_READER = original_bs_reader
+
+        self.assertEqual(result, [[2, "image"]])
+        self.assertEqual(n_function_reads, 1, "Only the bs values should be acquired again.")
+
+    def test_iter_scan(self):
+        n_reads = 0
+
+        def readable():
+            nonlocal n_reads
+            n_reads += 1
+            return n_reads
+
+        finalized = []
+
+        records = list(iter_scan(positioner=VectorPositioner([1, 2, 3]), readables=readable,
+                                 finalization=lambda: finalized.append(True)))
+        self.assertEqual([record.index for record in records], [0, 1, 2])
+        self.assertEqual([record.position for record in records], [1, 2, 3])
+        self.assertEqual([record.data for record in records], [[1], [2], [3]])
+        self.assertTrue(all(record.timing.read_time >= 0 for record in records))
+        self.assertEqual(finalized, [True])
+
+        # Closing the generator stops the scan and executes the finalization.
+        n_reads = 0
+        finalized = []
+        scanner_instance = scanner(positioner=VectorPositioner([1, 2, 3]), readables=readable,
+                                   finalization=lambda: finalized.append(True))
+        records = scanner_instance.iter_scan()
+        self.assertEqual(next(records).data, [1])
+        records.close()
+        self.assertEqual(n_reads, 1, "No data should be acquired after the generator was closed.")
+        self.assertEqual(finalized, [True])
+        self.assertEqual(scanner_instance.get_status(), STATUS_ABORTED)
+
+        # The buffered scan acquires in the background, but stops as well when the consumer exits.
+        n_reads = 0
+        finalized = []
+        for record in iter_scan(positioner=VectorPositioner(list(range(100))), readables=readable,
+                                finalization=lambda: finalized.append(True), buffer_size=2):
+            if record.index == 1:
+                break
+        self.assertLess(n_reads, 10, "The acquisition should not run ahead of the buffer size.")
+        self.assertEqual(finalized, [True])
+
+        # Errors in the acquisition thread are raised in the consumer.
+        def failing_readable():
+            raise ValueError("Readable failed.")
+
+        records = iter_scan(positioner=VectorPositioner([1, 2]), readables=failing_readable, buffer_size=2)
+        self.assertRaisesRegex(ValueError, "Readable failed.", list, records)
+
+        # The buffer size is validated before connecting to the devices.
+        connected_readers = []
+        scan_module.EPICS_READER = lambda *args, **kwargs: connected_readers.append(args)
+        try:
+            self.assertRaisesRegex(ValueError, "Buffer size", iter_scan, positioner=VectorPositioner([1]),
+                                   readables="PYSCAN:TEST:OBS1", buffer_size=0)
+        finally:
+            scan_module.EPICS_READER = MockReadGroupInterface
+        self.assertEqual(connected_readers, [])
+
+    def test_adaptive_positioner(self):
+        def move_motor(position):
+            move_motor.position = position
+
+        def read_edge():
+            return 0 if move_motor.position < 0.42 else 1
+
+        progress = []
+        positioner = AdaptiveLinePositioner(0, 1, n_initial=5, max_positions=15)
+        result = scan(positioner=positioner, readables=read_edge, writables=move_motor,
+                      settings=scan_settings(progress_callback=lambda current, total: progress.append((current, total))))
+
+        self.assertEqual(len(result), 15)
+        # The positioner received the data of each position.
+        self.assertEqual(len(positioner.fractions), 15)
+        self.assertEqual(progress[-1], (15, 15))
+
+        # Scan finished before the maximum number of positions.
+        progress = []
+        result = scan(positioner=AdaptiveLinePositioner(0, 1, n_initial=5, max_positions=100), readables=lambda: 1,
+                      settings=scan_settings(progress_callback=lambda current, total: progress.append((current, total))))
+        self.assertEqual(len(result), 5)
+        self.assertEqual(progress[0], (0, 100))
+        self.assertEqual(progress[-1], (5, 5))
+
+    def test_optimized_path_results_order(self):
+        def move_motor(position):
+            move_motor.visited.append(position)
+            move_motor.position = position
+        move_motor.visited = []
+
+        positions = [[0], [10], [1], [11]]
+        positioner = VectorPositioner(positions, optimize_path=True)
+        data_processor = SimpleDataProcessor()
+        result = scan(positioner=positioner, readables=lambda: move_motor.position, writables=move_motor,
+                      data_processor=data_processor)
+
+        # The positions are visited in the optimized order, but the results are in the provided order.
+        self.assertEqual(move_motor.visited, [0, 1, 10, 11])
+        self.assertEqual(result, [[0], [10], [1], [11]])
+        self.assertEqual(data_processor.get_positions(), positions)
+
+    def test_adaptive_settling(self):
+        cached_initial_values["PYSCAN:TEST:RBV"] = 0
+        readback = MockPV("PYSCAN:TEST:RBV")
+
+        def ring_down(amplitudes):
+            for amplitude in amplitudes:
+                sleep(0.05)
+                readback.put(10 + amplitude)
+
+        def move_motor(position):
+            move_motor.thread = threading.Thread(target=ring_down, args=(move_motor.amplitudes,))
+            move_motor.thread.start()
+
+        # The readback oscillates for 0.25 seconds, then stays within the band for the settling window.
+        move_motor.amplitudes = [1, -0.5, 0.25, -0.1, 0.001]
+        settings = scan_settings(settling_band=0.01, settling_window=0.1, settling_time=2,
+                                 settling_monitors="PYSCAN:TEST:RBV")
+        records = list(iter_scan(positioner=StaticPositioner(1), readables="PYSCAN:TEST:OBS1", writables=move_motor,
+                                 settings=settings))
+        move_motor.thread.join()
+        self.assertGreaterEqual(records[0].timing.settle_time, 0.3)
+        self.assertLess(records[0].timing.settle_time, 1)
+
+        # The readback never settles, the scan continues after the maximum settling time.
+        move_motor.amplitudes = [1, -1] * 10
+        settings = scan_settings(settling_band=0.01, settling_window=0.1, settling_time=0.3,
+                                 settling_monitors="PYSCAN:TEST:RBV")
+        records = list(iter_scan(positioner=StaticPositioner(1), readables="PYSCAN:TEST:OBS1", writables=move_motor,
+                                 settings=settings))
+        move_motor.thread.join()
+        self.assertGreaterEqual(records[0].timing.settle_time, 0.3)
+        self.assertLess(records[0].timing.settle_time, 0.6)
+
+        # The settling monitor is closed at the end of the scan, also when the scan fails.
+        closed_monitors = []
+
+        class ClosingMonitorGroupInterface(MockMonitorGroupInterface):
+            def close(self):
+                closed_monitors.append(self.pv_names)
+                super(ClosingMonitorGroupInterface, self).close()
+
+        def failing_readable():
+            raise ValueError("Readable failed.")
+
+        scan_module.EPICS_MONITOR = ClosingMonitorGroupInterface
+        try:
+            settings = scan_settings(settling_band=0.01, settling_window=0.01, settling_time=0.1,
+                                     settling_monitors="PYSCAN:TEST:RBV")
+            scan(positioner=StaticPositioner(1), readables="PYSCAN:TEST:OBS1", settings=settings)
+            self.assertRaisesRegex(ValueError, "Readable failed.", scan, positioner=StaticPositioner(1),
+                                   readables=failing_readable, settings=settings)
+        finally:
+            scan_module.EPICS_MONITOR = MockMonitorGroupInterface
+        self.assertEqual(closed_monitors, [["PYSCAN:TEST:RBV"], ["PYSCAN:TEST:RBV"]])
+
+        # Without epics writables, the PVs to monitor have to be specified.
+        self.assertRaisesRegex(ValueError, "needs PVs to monitor", scan, positioner=StaticPositioner(1),
+                               readables="PYSCAN:TEST:OBS1", writables=move_motor,
+                               settings=scan_settings(settling_band=0.01))
+        self.assertRaisesRegex(ValueError, "cannot be longer", scan_settings, settling_band=0.01,
+                               settling_window=2, settling_time=1)
+
+    def test_estimate_scan(self):
+        self.assertEqual(get_move_time(10, 2), 5)
+        # Enough distance to reach the maximum velocity: 1 second to accelerate and 1 to decelerate.
+        self.assertEqual(get_move_time(-10, 2, 2), 6)
+        # Too short to reach the maximum velocity.
+        self.assertEqual(get_move_time(2, 2, 2), 2)
+
+        positioner = VectorPositioner([[0, 0], [4, 1], [4, 11]])
+        settings = scan_settings(settling_time=0.5, n_measurements=2, measurement_interval=0.1)
+        estimate = estimate_scan(positioner, settings=settings, axis_velocities=[2, 5], read_time=0.2)
+
+        self.assertEqual(estimate.n_positions, 3)
+        # The slowest axis defines the move time: 2 seconds for the first move, 2 seconds for the second.
+        self.assertEqual(estimate.move_time, 4)
+        self.assertEqual(estimate.settle_time, 1.5)
+        self.assertAlmostEqual(estimate.read_time, 1.2)
+        self.assertAlmostEqual(estimate.wait_time, 0.6)
+        self.assertAlmostEqual(estimate.total_time, 7.3)
+
+        # Move from the start position, the second axis moves instantly.
+        estimate = estimate_scan(positioner, axis_velocities=[2], start_position=[-4, 0])
+        self.assertEqual(estimate.move_time, 4)
+
+        # Time positioners wait for the rest of the time interval, except after the last position.
+        estimate = estimate_scan(TimePositioner(1, 5), read_time=0.2)
+        self.assertEqual(estimate.n_positions, 5)
+        self.assertAlmostEqual(estimate.read_time, 1)
+        self.assertAlmostEqual(estimate.wait_time, 3.2)
+        self.assertAlmostEqual(estimate.total_time, 4.2)
+
+        # The dry run goes through the scanner, in the order the positions are visited.
+        positioner = VectorPositioner([[0], [10], [1]], optimize_path=True)
+        estimate = estimate_scan(positioner, axis_velocities=[1])
+        self.assertEqual(estimate.n_positions, 3)
+        self.assertEqual(estimate.move_time, 10)
+
+        self.assertRaisesRegex(ValueError, "adaptive positioners", estimate_scan,
+                               AdaptiveLinePositioner(0, 1, max_positions=10))
+        self.assertRaisesRegex(ValueError, "velocities", estimate_scan, positioner, axis_velocities=[1, 2, 3])
+
+    def test_async_scan(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        settings = scan_settings(progress_callback=lambda current, total: None, acquisition_retry_delay=0)
+
+        def create_motor():
+            async def move(position):
+                await asyncio.sleep(0.01)
+                motor_position.append(position)
+
+            async def read():
+                await asyncio.sleep(0.01)
+                return motor_position[-1]
+
+            motor_position = []
+            return move, read
+
+        move_motor, read_motor = create_motor()
+        result = loop.run_until_complete(async_scan(positioner=VectorPositioner([1, 2, 3]),
+                                                    readables=[read_motor, "PYSCAN:TEST:OBS1"],
+                                                    writables=move_motor, settings=settings))
+        self.assertEqual(result, [[1, 1], [2, 1], [3, 1]])
+
+        # Epics writables.
+        result = loop.run_until_complete(async_scan(positioner=VectorPositioner([4, 5]),
+                                                    readables="PYSCAN:TEST:ASYNC:MOTOR",
+                                                    writables="PYSCAN:TEST:ASYNC:MOTOR", settings=settings))
+        self.assertEqual(result, [[4], [5]])
+
+        # Conditions with the wait action invalidate the data, which is acquired again when they are met.
+        condition_values = iter([False, False, True, True, True])
+        conditions = function_condition(lambda: next(condition_values), action="Wait")
+        move_motor, read_motor = create_motor()
+        scanner_instance = async_scanner(positioner=VectorPositioner([1, 2]), readables=read_motor,
+                                         writables=move_motor, conditions=conditions, settings=settings)
+        self.assertEqual(loop.run_until_complete(scanner_instance.discrete_scan()), [[1], [2]])
+        self.assertEqual(list(scanner_instance.get_condition_failures().values()), [1])
+
+        # With conditions_first, the data is not read while the conditions are not met.
+        reads = []
+        condition_values = iter([False, True, True, True])
+        conditions = function_condition(lambda: next(condition_values), action="Wait")
+        result = loop.run_until_complete(async_scan(positioner=VectorPositioner([1, 2]),
+                                                    readables=lambda: reads.append(True) or len(reads),
+                                                    conditions=conditions,
+                                                    settings=settings._replace(conditions_first=True)))
+        self.assertEqual(result, [[1], [2]])
+
+        # Epics conditions are monitored while waiting, without blocking the event loop.
+        cached_initial_values["PYSCAN:TEST:ASYNC:READY"] = 0
+        conditions = epics_condition("PYSCAN:TEST:ASYNC:READY", 1, action="WaitAndAbort")
+
+        async def run_monitored_scan():
+            async def set_ready():
+                await asyncio.sleep(0.1)
+                for pv in pv_cache["PYSCAN:TEST:ASYNC:READY"]:
+                    pv.put(1)
+
+            ready_task = loop.create_task(set_ready())
+            result = await async_scan(positioner=VectorPositioner([1]), readables=lambda: 1, conditions=conditions,
+                                      settings=settings._replace(acquisition_retry_delay=10))
+            await ready_task
+            return result
+
+        start_time = time()
+        self.assertEqual(loop.run_until_complete(run_monitored_scan()), [[1]])
+        self.assertLess(time() - start_time, 1, "The condition was not monitored.")
+
+        # The wait and abort action aborts the scan after the timeout.
+        cached_initial_values["PYSCAN:TEST:ASYNC:READY"] = 0
+        self.assertRaisesRegex(ValueError, "not met within", loop.run_until_complete,
+                               async_scan(positioner=VectorPositioner([1]), readables=lambda: 1, conditions=conditions,
+                                          settings=settings._replace(condition_wait_timeout=0.1)))
+
+        # Many scans can run concurrently in the same event loop.
+        scans = []
+        for _ in range(100):
+            move_motor, read_motor = create_motor()
+            scans.append(async_scan(positioner=VectorPositioner([1, 2, 3, 4, 5]), readables=read_motor,
+                                    writables=move_motor, settings=settings))
+
+        start_time = time()
+        async def run_scans():
+            return await asyncio.gather(*scans)
+
+        results = loop.run_until_complete(run_scans())
+        self.assertEqual(results, [[[1], [2], [3], [4], [5]]] * 100)
+        self.assertLess(time() - start_time, 2, "The scans did not run concurrently.")
+
+        # Time positioners wait for the ticks without blocking the event loop.
+        async def run_time_scan():
+            heartbeat_timestamps = []
+
+            async def heartbeat():
+                while True:
+                    heartbeat_timestamps.append(time())
+                    await asyncio.sleep(0.01)
+
+            heartbeat_task = loop.create_task(heartbeat())
+            result = await async_scan(positioner=TimePositioner(0.2, 3), readables=lambda: 1, settings=settings)
+            heartbeat_task.cancel()
+
+            return result, max(y - x for x, y in zip(heartbeat_timestamps, heartbeat_timestamps[1:]))
+
+        result, max_heartbeat_interval = loop.run_until_complete(run_time_scan())
+        self.assertEqual(result, [[1]] * 3)
+        self.assertLess(max_heartbeat_interval, 0.1, "The event loop was blocked while waiting for the ticks.")
+
+        # Cancelling the task aborts the scan, the finalization is still executed.
+        finalized = []
+        move_motor, read_motor = create_motor()
+        scanner_instance = async_scanner(positioner=StaticPositioner(1000), readables=read_motor,
+                                         writables=move_motor, finalization=lambda: finalized.append(True),
+                                         settings=settings)
+        task = loop.create_task(scanner_instance.discrete_scan())
+        loop.run_until_complete(asyncio.sleep(0.1))
+        task.cancel()
+        self.assertRaises(asyncio.CancelledError, loop.run_until_complete, task)
+        self.assertEqual(finalized, [True])
+        self.assertEqual(scanner_instance.get_status(), STATUS_ABORTED)
+
+    def test_sharded_scan(self):
+        progress = []
+        settings = scan_settings(progress_callback=lambda current, total: progress.append((current, total)))
+        positions = list(range(25))
+
+        result = sharded_scan(positioner=VectorPositioner(positions), readables=_read_shard_motor,
+                              writables=_move_shard_motor, settings=settings, n_processes=2, n_shards=4)
+
+        # The results of the shards are merged in the positions order.
+        self.assertEqual(result, [[position ** 2] for position in positions])
+        self.assertEqual(progress, [(0, 25), (7, 25), (13, 25), (19, 25), (25, 25)])
+
+        # More shards than positions.
+        result = sharded_scan(positioner=VectorPositioner([1, 2]), readables=_read_shard_motor,
+                              writables=_move_shard_motor, settings=settings, n_processes=2, n_shards=4)
+        self.assertEqual(result, [[1], [4]])
+
+        self.assertRaisesRegex(ValueError, "only function writables", sharded_scan, positioner=VectorPositioner([1]),
+                               readables=_read_shard_motor, writables="PYSCAN:TEST:MOTOR1:SET")
+
+    def test_scan_scheduler(self):
+        events = []
+
+        def create_motor(name):
+            def move(position):
+                events.append((name, position))
+                sleep(0.05)
+            return move
+
+        settings = scan_settings(progress_callback=lambda current, total: None)
+        motor_1 = create_motor("motor_1")
+        motor_2 = create_motor("motor_2")
+
+        scheduler = ScanScheduler()
+        alignment = scheduler.submit(VectorPositioner([1, 2, 3]), readables=lambda: 1, writables=motor_1,
+                                     settings=settings, name="alignment")
+        # Uses the same motor - needs to wait for the first scan to complete.
+        overlapping = scheduler.submit(VectorPositioner([[4, 40], [5, 50], [6, 60]]), readables=lambda: 2,
+                                       writables=[motor_2, motor_1], settings=settings, name="overlapping")
+        start_time = time()
+        diagnostics = scheduler.submit(TimePositioner(0.05, 3), readables=lambda: 3, settings=settings)
+
+        self.assertEqual(diagnostics.join(), [[3], [3], [3]])
+        # The scan without writables runs at the same time as the others.
+        self.assertLess(time() - start_time, 0.25)
+
+        self.assertEqual(scheduler.wait(), [[[1], [1], [1]], [[2], [2], [2]], [[3], [3], [3]]])
+        # The second scan moved the motors only after the first scan completed.
+        self.assertEqual(events[:3], [("motor_1", 1), ("motor_1", 2), ("motor_1", 3)])
+        self.assertEqual([position for name, position in events if name == "motor_1"], [1, 2, 3, 40, 50, 60])
+
+        wait_times = scheduler.get_wait_times()
+        self.assertEqual(list(wait_times.keys()), ["alignment", "overlapping", "scan_2"])
+        self.assertLess(wait_times["alignment"], 0.05)
+        self.assertGreater(wait_times["overlapping"], 0.1)
+        self.assertLess(wait_times["scan_2"], 0.05)
+
+        # Errors are raised when joining the scan, and release the writables.
+        def failing_read():
+            raise ValueError("Read failed.")
+
+        failing = scheduler.submit(VectorPositioner([1]), readables=failing_read, writables=motor_1,
+                                   settings=settings)
+        self.assertRaisesRegex(ValueError, "Read failed.", failing.join)
+        self.assertEqual(scheduler.submit(VectorPositioner([1]), readables=lambda: 4, writables=motor_1,
+                                          settings=settings).join(5), [[4]])
+
+        # Shared bs streams are disconnected when the last read group releases them.
+        class TestStream(object):
+            def connect(self):
+                self.connected = True
+
+            def disconnect(self):
+                self.connected = False
+
+        stream_pool = StreamPool()
+        stream_1 = stream_pool.get_stream(("channel",), TestStream)
+        stream_2 = stream_pool.get_stream(("channel",), TestStream)
+        self.assertIs(stream_1, stream_2)
+        self.assertEqual(stream_pool.get_n_streams(), 1)
+        stream_1.disconnect()
+        self.assertTrue(stream_2.stream.connected)
+        stream_2.disconnect()
+        self.assertFalse(stream_2.stream.connected)
+        self.assertEqual(stream_pool.get_n_streams(), 0)
+
+        # The scans release the shared streams when they finish.
+        class PooledBsReader(object):
+            def __init__(self, properties, conditions, filter_function, stream_pool):
+                self.stream = stream_pool.get_stream(("channel",), TestStream)
+
+            def read(self):
+                return [self.stream.stream.connected]
+
+            def read_cached_conditions(self):
+                return []
+
+            def close(self):
+                self.stream.disconnect()
+
+        original_bs_reader = scan_module.BS_READER
+        scan_module.BS_READER = PooledBsReader
+        try:
+            scheduler = ScanScheduler()
+            jobs = [scheduler.submit(VectorPositioner([1, 2]), readables=bs_property("CAMERA1:X"), settings=settings)
+                    for _ in range(3)]
+            self.assertEqual([job.join(5) for job in jobs], [[[True], [True]]] * 3)
+            self.assertEqual(scheduler.stream_pool.get_n_streams(), 0)
+        finally:
+            scan_module.BS_READER = original_bs_reader
+
+        # The writables are granted in submission order: a scan waiting for 2 motors is not overtaken by a later scan
+        # that needs only one of them.
+        del events[:]
+        motor_3 = create_motor("motor_3")
+        scheduler = ScanScheduler()
+        scheduler.submit(VectorPositioner([1, 2, 3]), readables=lambda: 1, writables=motor_1, settings=settings)
+        scheduler.submit(VectorPositioner([[4, 40]]), readables=lambda: 2, writables=[motor_1, motor_3],
+                         settings=settings)
+        scheduler.submit(VectorPositioner([5]), readables=lambda: 3, writables=motor_3, settings=settings)
+        scheduler.wait(5)
+        self.assertEqual([position for name, position in events if name == "motor_3"], [40, 5])
+
+    def test_metrics(self):
+        import io
+        import os
+        import tempfile
+        from collections import OrderedDict
+
+        read_values = iter([[1], None, [2], [3], [4]])
+        snapshots = []
+
+        # The metrics can be polled from another thread while the scan is running.
+        def progress(current_position, total_positions):
+            snapshots.append(scanner_instance.get_metrics())
+
+        settings = scan_settings(acquisition_retry_delay=0.01, progress_callback=progress)
+        scanner_instance = Scanner(VectorPositioner([1, 2, 3, 4]), SimpleDataProcessor(), lambda: next(read_values),
+                                   data_validator=lambda position, data: data is not None, settings=settings,
+                                   condition_failures=OrderedDict((("always_true", 0),)))
+
+        metrics_filename = os.path.join(tempfile.mkdtemp(), "scan.prom")
+        scanner_instance.metrics.export_to_file(metrics_filename, labels={"scan": "test"})
+
+        self.assertEqual(scanner_instance.discrete_scan(), [[1], [2], [3], [4]])
+
+        self.assertEqual([x.points_done for x in snapshots], [0, 1, 2, 3, 4])
+        metrics = scanner_instance.get_metrics()
+        self.assertEqual(metrics.total_points, 4)
+        self.assertEqual(metrics.retries, 1)
+        self.assertEqual(metrics.read_latency.count, 4)
+        self.assertEqual(metrics.read_latency.counts[-1], 4)
+        self.assertGreater(metrics.points_per_second, 0)
+        self.assertEqual(metrics.eta, 0)
+
+        metrics_text = open(metrics_filename).read()
+        os.remove(metrics_filename)
+        self.assertIn('pyscan_points_done_total{scan="test"} 4.0', metrics_text)
+        self.assertIn('pyscan_retries_total{scan="test"} 1.0', metrics_text)
+        self.assertIn('pyscan_condition_failures_total{scan="test",condition="always_true"} 0.0', metrics_text)
+        self.assertIn('pyscan_read_latency_seconds_bucket{scan="test",le="+Inf"} 4.0', metrics_text)
+        self.assertIn('pyscan_read_latency_seconds_count{scan="test"} 4.0', metrics_text)
+
+        # The finalization is not part of the scan time, and errors writing the metrics do not hide the scan error.
+        def failing_reader():
+            raise ValueError("Reader failed.")
+
+        scanner_instance = Scanner(VectorPositioner([1, 2]), SimpleDataProcessor(), failing_reader,
+                                   finalization_executor=lambda scanner: sleep(0.2))
+        scanner_instance.metrics.export_to_file(os.path.join(metrics_filename, "missing_directory", "scan.prom"))
+        self.assertIsInstance(scanner_instance.metrics.export_error, OSError)
+
+        self.assertRaisesRegex(ValueError, "Reader failed.", scanner_instance.discrete_scan)
+        self.assertLess(scanner_instance.get_metrics().elapsed_time, 0.2)
+
+        # The progress reporter prints the first and the last position, and at most one line per report interval.
+        output = io.StringIO()
+        reporter = ProgressReporter(report_interval=10, output=output)
+        for current_position in range(101):
+            reporter(current_position, 100)
+
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("Scan: 0.00 % completed (0/100)"))
+        self.assertTrue(lines[-1].startswith("Scan: 100.00 % completed (100/100)"))
+        self.assertIn("points/s, ETA 0:00:00", lines[-1])
@@ -0,0 +1,99 @@
+import sys
+import unittest
+from time import time, sleep
+
+from pyscan import config, scan, scan_settings, epics_pv, LinePositioner
+from pyscan.dal import epics_dal
+from pyscan.dal.sim_dal import simulation, get_trajectory_distance
+from pyscan.estimator import get_move_time
+
+scan_module = sys.modules["pyscan.scan"]
+
+
+class SimulatedDalTests(unittest.TestCase):
+    def setUp(self):
+        # Other tests replace the epics DAL with mocks.
+        self.original_dals = (scan_module.EPICS_WRITER, scan_module.EPICS_READER, scan_module.EPICS_MONITOR)
+        scan_module.EPICS_WRITER = epics_dal.WriteGroupInterface
+        scan_module.EPICS_READER = epics_dal.ReadGroupInterface
+        scan_module.EPICS_MONITOR = epics_dal.MonitorGroupInterface
+
+        config.epics_simulation = True
+        simulation.reset()
+
+    def tearDown(self):
+        config.epics_simulation = False
+        simulation.reset()
+
+        scan_module.EPICS_WRITER, scan_module.EPICS_READER, scan_module.EPICS_MONITOR = self.original_dals
+
+    def test_trajectory(self):
+        # Trapezoidal profile: 1 second to accelerate, 9 seconds at full speed, 1 second to decelerate.
+        self.assertEqual(get_trajectory_distance(10, 0.5, velocity=1, acceleration=1), 0.125)
+        self.assertEqual(get_trajectory_distance(10, 5, velocity=1, acceleration=1), 4.5)
+        self.assertEqual(get_trajectory_distance(10, 10.5, velocity=1, acceleration=1), 9.875)
+        self.assertEqual(get_trajectory_distance(10, 11, velocity=1, acceleration=1), 10)
+
+        # Triangular profile: the motor does not reach the maximum velocity.
+        self.assertEqual(get_trajectory_distance(1, 1, velocity=10, acceleration=1), 0.5)
+        self.assertEqual(get_trajectory_distance(1, 2, velocity=10, acceleration=1), 1)
+
+        # No acceleration, no velocity.
+        self.assertEqual(get_trajectory_distance(10, 2, velocity=1), 2)
+        self.assertEqual(get_trajectory_distance(10, 2), 10)
+
+        # The trajectory ends at the move time of the estimator.
+        for distance in [0.1, 1, 10]:
+            move_time = get_move_time(distance, velocity=2, acceleration=4)
+            self.assertAlmostEqual(get_trajectory_distance(distance, move_time - 0.001, 2, 4), distance, places=2)
+            self.assertLess(get_trajectory_distance(distance, move_time - 0.001, 2, 4), distance)
+
+    def test_motor(self):
+        motor = simulation.add_motor("PYSCAN:SIM:MOTOR", "PYSCAN:SIM:MOTOR:RBV", velocity=10, readback_lag=0.1)
+        setpoint_pv = epics_dal.ReadGroupInterface("PYSCAN:SIM:MOTOR")
+        readback_pv = epics_dal.MonitorGroupInterface("PYSCAN:SIM:MOTOR:RBV")
+
+        start_time = time()
+        simulation.put_value("PYSCAN:SIM:MOTOR", 1)
+
+        self.assertEqual(setpoint_pv.read(), [1])
+        # The readback follows with a lag.
+        self.assertEqual(readback_pv.read(), [0])
+
+        # The monitor is notified when the readback reaches the target.
+        self.assertTrue(readback_pv.wait_for(lambda values: values[0] == 1, timeout=1))
+        self.assertGreaterEqual(time() - start_time, 0.2 - config.max_time_tolerance)
+        self.assertLess(time() - start_time, 0.2 + config.max_time_tolerance)
+
+        # Moving from the middle of a move.
+        motor.move(0)
+        sleep(0.05)
+        motor.move(1)
+        self.assertAlmostEqual(motor.get_position(), 0.5, delta=0.1)
+
+    def test_scan(self):
+        simulation.add_motor("PYSCAN:SIM:MOTOR", velocity=100, acceleration=1000)
+        simulation.add_detector("PYSCAN:SIM:DETECTOR", lambda positions: positions["PYSCAN:SIM:MOTOR"] ** 2,
+                                latency=0.01)
+
+        positioner = LinePositioner(start=0, end=4, n_steps=4)
+        settings = scan_settings(progress_callback=lambda current_position, total_positions: None)
+
+        result = scan(positioner, ["PYSCAN:SIM:DETECTOR", "PYSCAN:SIM:MOTOR"], epics_pv("PYSCAN:SIM:MOTOR"),
+                      settings=settings)
+
+        self.assertEqual(result, [[0, 0], [1, 1], [4, 2], [9, 3], [16, 4]])
+
+    def test_noise_seed(self):
+        def scan_noisy_detector():
+            simulation.reset(seed=42)
+            simulation.add_detector("PYSCAN:SIM:DETECTOR", noise=0.1)
+            return scan(LinePositioner(start=0, end=4, n_steps=4), "PYSCAN:SIM:DETECTOR", "PYSCAN:SIM:VALUE",
+                        settings=scan_settings(progress_callback=lambda current_position, total_positions: None))
+
+        first_result = scan_noisy_detector()
+        self.assertNotEqual(first_result[0], first_result[1])
+        self.assertEqual(first_result, scan_noisy_detector())
+
+        # Plain values return the last written value.
+        self.assertEqual(simulation.get_value("PYSCAN:SIM:VALUE"), 4)